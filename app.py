@@ -3,12 +3,26 @@ import asyncio
 import sys
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 
 from config import load_config
 from services.instagram_api import InstagramAPI
+from services.rate_limiter import KeyPool
+from services.profile_cache import ProfileCache
+from services.database import FollowersDatabase
+from services.state_backend import create_state_backend
+from services.crawler import FollowerCrawler
+from services.scheduler import CrawlScheduler
+from services.freshness import FreshnessPolicy, parse_hours
+from services.refresher import SnapshotRefresher
+from services.snapshots import SnapshotStore
+from services.draw import DrawEngine
+from services.export import ExportEngine, ExportCache
 from bot.handlers import router
+from bot.webhook import run_webhook, serve_workers
+from middlewares.dedup import UpdateDedupMiddleware
 from middlewares.throttling import ThrottlingMiddleware
 
 # Настройка логирования
@@ -24,47 +38,168 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-# Функция инициализации бота
-async def main():
+# Функция инициализации бота; worker - номер процесса в режиме webhook с несколькими воркерами
+async def main(worker: int = 0):
     # Загружаем конфигурацию
     config = load_config()
+    webhook_mode = config.webhook.mode == "webhook"
+    if webhook_mode and config.webhook.workers > 1 and not config.redis_url:
+        logger.warning("WEBHOOK_WORKERS > 1 without REDIS_URL: FSM, limits and locks are per worker")
 
-    # Инициализируем экземпляр InstagramAPI
+    # Запускаем сервис базы данных (поток записи + пул чтения)
+    database = FollowersDatabase(
+        path=config.database.path,
+        read_pool_size=config.database.read_pool_size
+    )
+    await database.start()
+
+    # Инициализируем экземпляр InstagramAPI; запросы распределяются по пулу ключей RapidAPI
     instagram_api = InstagramAPI(
-        api_key=config.instagram.api_key,
-        api_host=config.instagram.api_host
+        api_host=config.instagram.api_host,
+        key_pool=KeyPool.from_keys(
+            config.instagram.api_keys,
+            quarantine_time=config.instagram.key_quarantine,
+            rate=config.instagram.rate_limit,
+            max_rate=config.instagram.max_rate_limit
+        ),
+        # Кэш профилей с хранением в SQLite, чтобы /start не ждал API
+        profile_cache=ProfileCache(
+            ttl=config.instagram.profile_cache_ttl,
+            stale_ttl=config.instagram.profile_cache_stale_ttl,
+            max_size=config.instagram.profile_cache_size,
+            store=database
+        )
+    )
+
+    # Общее состояние воркеров (FSM, лимиты, блокировки загрузок): Redis или память процесса
+    state_backend = create_state_backend(config.redis_url)
+
+    # Загрузчик подписчиков с контрольными точками; продолжаем прерванные загрузки
+    # Запросы страниц всех загрузок идут через общий планировщик: большой аккаунт
+    # не задерживает маленькие, доли задаются весами отслеживаемых аккаунтов
+    scheduler = CrawlScheduler(max_concurrent=config.instagram.crawl_concurrency)
+    crawler = FollowerCrawler(instagram_api, database, backend=state_backend, scheduler=scheduler)
+    await crawler.load_weights()
+    await crawler.resume_pending()
+
+    # Когда отвечать из сохраненного снимка, а когда обновлять (по времени и изменению числа подписчиков)
+    freshness = FreshnessPolicy(
+        max_age=config.freshness.max_age,
+        peak_max_age=config.freshness.peak_max_age,
+        peak_hours=parse_hours(config.freshness.peak_hours),
+        full_max_age=config.freshness.full_max_age,
+        drift_abs=config.freshness.drift_abs,
+        drift_ratio=config.freshness.drift_ratio,
+        incremental_max=config.freshness.incremental_max
+    )
+
+    # Фоновое обновление снимков отслеживаемых аккаунтов в часы низкой нагрузки,
+    # чтобы /start отвечал из базы; при нескольких воркерах обновляет только первый
+    refresher = None
+    if config.refresh.enabled and worker == 0:
+        refresher = SnapshotRefresher(
+            instagram_api,
+            database,
+            crawler,
+            check_interval=config.refresh.check_interval,
+            max_age=config.refresh.max_age,
+            hours=parse_hours(config.refresh.hours),
+            daily_pages=config.refresh.daily_pages,
+            quota_reserve=config.refresh.quota_reserve,
+            policy=freshness
+        )
+        refresher.start()
+
+    # Общие снимки списков подписчиков; в FSM state хранится только ссылка на снимок
+    snapshots = SnapshotStore(database)
+    draw_engine = DrawEngine(database, snapshots, crawler)
+
+    # Экспорт строится в отдельном пуле потоков/процессов, event loop не блокируется
+    export_engine = ExportEngine(
+        config.database.path,
+        max_workers=config.export.workers,
+        use_processes=config.export.use_processes,
+        directory=config.export.directory
+    )
+    # Готовые файлы экспорта и их Telegram file_id переиспользуются, пока снимок не изменился
+    export_cache = ExportCache(
+        database,
+        export_engine,
+        directory=config.export.directory,
+        max_bytes=config.export.cache_max_mb * 1024 * 1024,
+        max_age=config.export.cache_max_age
     )
 
     # Создаем хранилище состояний
-    storage = MemoryStorage()
+    storage = state_backend.fsm_storage()
 
     # Инициализируем бота и диспетчер
+    session = None
+    if config.telegram.api_url:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.telegram.api_url))
     bot = Bot(
         token=config.telegram.token,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
 
     dp = Dispatcher(storage=storage)
 
-    # Регистрируем middleware
-    dp.message.middleware(ThrottlingMiddleware())
+    # Telegram повторяет webhook-обновления; повтор может попасть в другой воркер
+    if webhook_mode:
+        dp.update.outer_middleware(UpdateDedupMiddleware(state_backend, ttl=config.webhook.dedup_ttl))
+
+    # Регистрируем middleware: один лимит на пользователя для сообщений и callback-запросов
+    throttling = ThrottlingMiddleware(backend=state_backend)
+    dp.message.middleware(throttling)
+    dp.callback_query.middleware(throttling)
 
     # Регистрируем обработчики
     dp.include_router(router)
 
-    # Регистрируем зависимость для InstagramAPI
-    dp.workflow_data.update({"instagram_api": instagram_api})
+    # Регистрируем зависимости для InstagramAPI и базы данных
+    dp.workflow_data.update({
+        "instagram_api": instagram_api,
+        "database": database,
+        "crawler": crawler,
+        "snapshots": snapshots,
+        "freshness": freshness,
+        "draw_engine": draw_engine,
+        "export_cache": export_cache,
+        "admin_ids": frozenset(config.telegram.admin_ids),
+        "default_account": config.instagram.default_account,
+    })
 
-    # Запускаем поллинг
+    # Запускаем поллинг или webhook (SIGTERM/SIGINT останавливают прием обновлений,
+    # webhook дожидается обработки принятых, затем срабатывает finally)
     try:
         logger.info("Starting bot")
-        await dp.start_polling(bot)
+        if webhook_mode:
+            await run_webhook(dp, bot, config.webhook, set_webhook=worker == 0)
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     finally:
+        # Незавершенные загрузки сохраняют контрольную точку до закрытия базы
+        if refresher:
+            await refresher.stop()
+        await crawler.shutdown()
         await bot.session.close()
         if hasattr(instagram_api, 'close') and callable(instagram_api.close):
             await instagram_api.close()  # Закрываем сессию API если метод существует
+        export_engine.close()
+        await database.close()
         await storage.close()
+        await state_backend.close()
+
+
+def run_worker(worker: int):
+    asyncio.run(main(worker))
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    config = load_config()
+    if config.webhook.mode == "webhook" and config.webhook.workers > 1:
+        serve_workers(run_worker, config.webhook.workers)
+    else:
+        asyncio.run(main())
\ No newline at end of file
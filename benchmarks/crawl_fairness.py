@@ -0,0 +1,134 @@
+"""
+Crawl completion times with one big and several small accounts: a slot per
+crawl, a FIFO slot per page, and the fair-share CrawlScheduler.
+
+    python -m benchmarks.crawl_fairness [big_pages] [--small N] [--small-pages P] [--concurrency C]
+
+The big crawl starts first, the small ones right after it. The API is a stub
+answering each page after --network-ms. With a slot per crawl the small
+crawls wait for the big one to finish; with page slots they take turns page
+by page. Only the fair scheduler honours weights: "big share" is the big
+account's part of the requests made while the small crawls were running.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+from services.crawler import FollowerCrawler
+from services.database import FollowersDatabase
+from services.instagram_api import InstagramAPI
+from services.records import FollowerRecord
+from services.scheduler import CrawlScheduler
+
+
+class StubAPI(InstagramAPI):
+    def __init__(self, pages: dict, latency: float):
+        super().__init__("benchmark", "localhost")
+        self.pages = pages
+        self.latency = latency
+        self.order = []
+
+    async def get_user_followers_batch(self, username_or_id: str, count: int = 100, pagination_token: str = None):
+        self.order.append(username_or_id)
+        await asyncio.sleep(self.latency)
+        page = int(pagination_token or 0)
+        next_token = str(page + 1) if page + 1 < self.pages[username_or_id] else None
+        followers = [
+            FollowerRecord.from_api({"id": str(page * 50 + i + 1), "username": f"{username_or_id}_{page * 50 + i}"})
+            for i in range(50)
+        ]
+        return {"followers": followers, "next_max_id": next_token, "has_more": bool(next_token), "count": 50}
+
+
+class FifoScheduler(CrawlScheduler):
+    """Page slots in arrival order, what a plain semaphore gives"""
+
+    def __init__(self, max_concurrent: int):
+        super().__init__(max_concurrent)
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    @asynccontextmanager
+    async def slot(self, account: str, cost: float = 1.0):
+        async with self._semaphore:
+            self.served[account] += 1
+            yield
+
+
+class NoScheduler(CrawlScheduler):
+    """Page requests are not limited, whole crawls are (run_once)"""
+
+    @asynccontextmanager
+    async def slot(self, account: str, cost: float = 1.0):
+        self.served[account] += 1
+        yield
+
+
+async def run_once(database, scheduler, pages: dict, latency: float, crawl_slots: int = 0):
+    api = StubAPI(pages, latency)
+    crawler = FollowerCrawler(api, database, scheduler=scheduler)
+    crawl_semaphore = asyncio.Semaphore(crawl_slots) if crawl_slots else None
+    started = time.perf_counter()
+    finished = {}
+
+    async def crawl(username: str):
+        if crawl_semaphore:
+            async with crawl_semaphore:
+                await crawler.crawl({"username": username, "followers_count": 0})
+        else:
+            await crawler.crawl({"username": username, "followers_count": 0})
+        finished[username] = time.perf_counter() - started
+
+    tasks = []
+    for username in pages:
+        tasks.append(asyncio.create_task(crawl(username)))
+        # Big crawl is already running when the small ones arrive
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return finished, api.order
+
+
+async def run(big_pages: int, small: int, small_pages: int, concurrency: int, network_ms: float):
+    with tempfile.TemporaryDirectory() as directory:
+        database = FollowersDatabase(os.path.join(directory, "fairness.db"))
+        await database.start()
+        try:
+            print(f"big: {big_pages} pages, {small} small: {small_pages} pages each, "
+                  f"{concurrency} slots, network {network_ms:.0f} ms")
+            for run_number, (name, scheduler, crawl_slots, big_weight) in enumerate([
+                ("crawl slots", NoScheduler(), concurrency, 1),
+                ("fifo page slots", FifoScheduler(concurrency), 0, 1),
+                ("fair", CrawlScheduler(concurrency), 0, 1),
+                ("fair, big weight 3", CrawlScheduler(concurrency), 0, 3),
+            ]):
+                # Crawls take their weights from the tracked accounts
+                await database.track_account(f"big{run_number}", big_weight)
+                pages = {f"big{run_number}": big_pages}
+                pages.update({f"small{run_number}_{i}": small_pages for i in range(small)})
+                finished, order = await run_once(database, scheduler, pages, network_ms / 1000, crawl_slots)
+                smalls = [elapsed for username, elapsed in finished.items() if username.startswith("small")]
+                # Requests up to the last page of a small crawl
+                last_small = max(i for i, username in enumerate(order) if username.startswith("small"))
+                head = order[:last_small + 1]
+                big_share = sum(1 for username in head if username.startswith("big")) / len(head)
+                print(f"{name:<20}small done {min(smalls):.2f}-{max(smalls):.2f}s, "
+                      f"big done {finished[f'big{run_number}']:.2f}s, big share while contended {big_share:.0%}")
+        finally:
+            await database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("big_pages", type=int, nargs="?", default=200)
+    parser.add_argument("--small", type=int, default=3)
+    parser.add_argument("--small-pages", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--network-ms", type=float, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.big_pages, args.small, args.small_pages, args.concurrency, args.network_ms))
+
+
+if __name__ == "__main__":
+    main()
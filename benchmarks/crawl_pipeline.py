@@ -0,0 +1,73 @@
+"""
+Crawl wall time: sequential pages vs the pipelined fetch stage.
+
+    python -m benchmarks.crawl_pipeline [pages] [--network-ms MS] [--save-ms MS]
+
+The API is a stub answering each page after --network-ms; every saved page
+also waits --save-ms (lock refresh, progress) on top of the real SQLite
+write. Pure network time is pages * network-ms.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from services.crawler import FollowerCrawler
+from services.database import FollowersDatabase
+from services.instagram_api import InstagramAPI
+from services.records import FollowerRecord
+
+
+class StubAPI(InstagramAPI):
+    def __init__(self, pages: int, latency: float):
+        super().__init__("benchmark", "localhost")
+        self.pages = pages
+        self.latency = latency
+
+    async def get_user_followers_batch(self, username_or_id: str, count: int = 100, pagination_token: str = None):
+        await asyncio.sleep(self.latency)
+        page = int(pagination_token or 0)
+        next_token = str(page + 1) if page + 1 < self.pages else None
+        followers = [
+            FollowerRecord.from_api({"id": str(page * 50 + i + 1), "username": f"user{page * 50 + i}"})
+            for i in range(50)
+        ]
+        return {"followers": followers, "next_max_id": next_token, "has_more": bool(next_token), "count": 50}
+
+
+async def run(pages: int, network_ms: float, save_ms: float):
+    with tempfile.TemporaryDirectory() as directory:
+        database = FollowersDatabase(os.path.join(directory, "crawl.db"))
+        await database.start()
+        save_crawl_page = database.save_crawl_page
+
+        async def slow_save(*args, **kwargs):
+            await asyncio.sleep(save_ms / 1000)
+            return await save_crawl_page(*args, **kwargs)
+
+        database.save_crawl_page = slow_save
+        try:
+            print(f"{pages} pages, network {network_ms:.0f} ms, save {save_ms:.0f} ms, "
+                  f"pure network {pages * network_ms / 1000:.2f}s")
+            for depth in (0, 1, 4):
+                crawler = FollowerCrawler(StubAPI(pages, network_ms / 1000), database, pipeline_depth=depth)
+                started = time.perf_counter()
+                result = await crawler.crawl({"username": f"account{depth}", "followers_count": 0})
+                elapsed = time.perf_counter() - started
+                print(f"pipeline_depth={depth}: {elapsed:.2f}s, {result.fetched} followers, complete={result.complete}")
+        finally:
+            await database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pages", type=int, nargs="?", default=100)
+    parser.add_argument("--network-ms", type=float, default=30)
+    parser.add_argument("--save-ms", type=float, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.pages, args.network_ms, args.save_ms))
+
+
+if __name__ == "__main__":
+    main()
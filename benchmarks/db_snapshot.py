@@ -0,0 +1,106 @@
+"""
+Load / read timings of a follower snapshot: legacy v1 schema vs schema v2.
+
+    python -m benchmarks.db_snapshot [followers] [other_accounts]
+
+Other accounts are loaded first so that lookups by account have to find
+the target rows in a shared table, like on a multi-account database.
+"""
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from services.database import FollowersDatabase
+from services.records import PROFILE_URL_PREFIX
+from services.migrations import _migrate_v1
+
+
+def make_followers(count, offset=0):
+    rng = random.Random(offset)
+    ids = rng.sample(range(1_000_000_000, 60_000_000_000), count)
+    return [
+        {
+            "id": str(user_id),
+            "username": f"user_{user_id}",
+            "full_name": f"User {user_id}",
+            "link": f"{PROFILE_URL_PREFIX}user_{user_id}",
+        }
+        for user_id in ids
+    ]
+
+
+def legacy_load(path, followers, account="bench"):
+    # Copy of the original save_followers_to_db: one execute() per follower
+    conn = sqlite3.connect(path)
+    _migrate_v1(conn)
+    conn.execute("BEGIN TRANSACTION")
+    conn.execute("DELETE FROM followers WHERE account_username = ?", (account,))
+    for follower in followers:
+        conn.execute(
+            "INSERT INTO followers (id, username, link, account_username) VALUES (?, ?, ?, ?)",
+            (follower["id"], follower["username"], follower["link"], account),
+        )
+    conn.commit()
+    conn.close()
+
+
+def legacy_read(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute(
+        "SELECT id, username, link FROM followers WHERE account_username = ?", ("bench",)
+    ).fetchall()
+    conn.close()
+    return [{"id": r[0], "username": r[1], "link": r[2]} for r in rows]
+
+
+async def v2_run(path, followers, others):
+    database = FollowersDatabase(path)
+    await database.start()
+    for number, other in enumerate(others):
+        await database.save_followers({"username": f"other_{number}", "followers_count": len(other)}, other)
+    user_info = {"username": "bench", "followers_count": len(followers)}
+
+    started = time.perf_counter()
+    await database.save_followers(user_info, followers)
+    load_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rows = await database.get_followers("bench")
+    read_time = time.perf_counter() - started
+
+    await database.close()
+    return load_time, read_time, len(rows)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    other_accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    followers = make_followers(count)
+    others = [make_followers(count, offset=number + 1) for number in range(other_accounts)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.db")
+        for number, other in enumerate(others):
+            legacy_load(legacy_path, other, account=f"other_{number}")
+        started = time.perf_counter()
+        legacy_load(legacy_path, followers)
+        legacy_load_time = time.perf_counter() - started
+        started = time.perf_counter()
+        legacy_rows = len(legacy_read(legacy_path))
+        legacy_read_time = time.perf_counter() - started
+
+        v2_load_time, v2_read_time, v2_rows = asyncio.run(v2_run(os.path.join(tmp, "v2.db"), followers, others))
+
+        print(f"{count} followers, {other_accounts} other accounts of the same size")
+        print(f"  v1 load: {legacy_load_time:.3f}s  read: {legacy_read_time:.3f}s  rows: {legacy_rows}  "
+              f"size: {os.path.getsize(legacy_path) / 1e6:.1f} MB")
+        print(f"  v2 load: {v2_load_time:.3f}s  read: {v2_read_time:.3f}s  rows: {v2_rows}  "
+              f"size: {os.path.getsize(os.path.join(tmp, 'v2.db')) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
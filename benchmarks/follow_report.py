@@ -0,0 +1,78 @@
+"""
+Mutual-follow report: Python scans over loaded lists vs the SQL join.
+
+    python -m benchmarks.follow_report [followers] [--following N]
+
+The account has `followers` stored followers and follows `--following`
+accounts (Instagram caps following at 7500), half of which follow back.
+The list scan does what a handler would do with get_followers() and
+get_user_following(): `in` over a list for every followed account. It is
+timed on a sample and extrapolated, the full scan is quadratic.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from services.database import FollowersDatabase
+from services.records import FollowerRecord
+
+
+def make_users(ids):
+    return [FollowerRecord.from_api({"id": str(user_id), "username": f"user{user_id}"}) for user_id in ids]
+
+
+async def run(followers: int, following: int):
+    with tempfile.TemporaryDirectory() as directory:
+        database = FollowersDatabase(os.path.join(directory, "report.db"))
+        await database.start()
+        try:
+            user_info = {"username": "account", "followers_count": followers, "following_count": following}
+            await database.save_followers(user_info, make_users(range(1, followers + 1)))
+            # Half of the followed accounts follow back
+            followed = list(range(1, following // 2 + 1)) + list(range(followers + 1, followers + 1 + following // 2))
+            run_at = int(time.time())
+            for start in range(0, len(followed), 50):
+                await database.save_following_page(user_info, make_users(followed[start:start + 50]), run_at)
+            await database.finish_following("account", run_at, complete=True)
+            print(f"{followers} followers, {len(followed)} following")
+
+            started = time.perf_counter()
+            report = await database.get_follow_report("account")
+            sql_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            follower_list = await database.get_followers("account")
+            load_time = time.perf_counter() - started
+
+            follower_ids = [follower.id for follower in follower_list]
+            sample = followed[::max(1, len(followed) // 200)]
+            started = time.perf_counter()
+            sum(1 for user_id in sample if user_id in follower_ids)
+            scan_time = (time.perf_counter() - started) * len(followed) / len(sample)
+
+            started = time.perf_counter()
+            follower_set = set(follower_ids)
+            mutual_set = sum(1 for user_id in followed if user_id in follower_set)
+            set_time = time.perf_counter() - started
+
+            assert report['mutual'] == mutual_set == len(followed) // 2, report
+            print(f"list scan (extrapolated) {load_time + scan_time:>10.3f}s  (load {load_time:.3f}s)")
+            print(f"set over loaded list     {load_time + set_time:>10.3f}s")
+            print(f"sql join                 {sql_time:>10.3f}s  mutual={report['mutual']} "
+                  f"not_following_back={report['not_following_back']} fans={report['fans']}")
+        finally:
+            await database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("followers", type=int, nargs="?", default=200_000)
+    parser.add_argument("--following", type=int, default=7500)
+    args = parser.parse_args()
+    asyncio.run(run(args.followers, args.following))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Export of a follower snapshot: legacy in-memory workbook vs the streaming
+exports (write-only xlsx, CSV, gzip JSONL).
+
+    python -m benchmarks.follower_export [followers ...] [--legacy-max N]
+
+The legacy export is only run up to --legacy-max rows (default 100000), a
+full openpyxl workbook of 1M rows needs several GB. Each export runs in a
+forked child; memory is the growth of its peak RSS during the export.
+"""
+import asyncio
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import openpyxl
+from openpyxl.styles import Font, Alignment, PatternFill
+
+from services.database import FollowersDatabase
+from services.export import EXPORT_FORMATS, export_followers
+from services.records import FollowerRecord
+
+
+def legacy_export(followers_list, file_path):
+    # Copy of the original create_excel_file
+    workbook = openpyxl.Workbook()
+    worksheet = workbook.active
+    worksheet.title = "Obunachilar"
+
+    header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
+    header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
+    header_alignment = Alignment(horizontal='center', vertical='center')
+
+    headers = ["№", "Username", "Instagram Link", "ID"]
+    for col_num, header in enumerate(headers, 1):
+        cell = worksheet.cell(row=1, column=col_num)
+        cell.value = header
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+
+    for row_num, follower in enumerate(followers_list, 2):
+        worksheet.cell(row=row_num, column=1).value = row_num - 1
+        worksheet.cell(row=row_num, column=2).value = follower['username']
+        worksheet.cell(row=row_num, column=3).value = follower['link']
+        worksheet.cell(row=row_num, column=4).value = follower['id']
+
+    for column_cells in worksheet.columns:
+        length = max(len(str(cell.value)) for cell in column_cells)
+        worksheet.column_dimensions[column_cells[0].column_letter].width = length + 5
+
+    workbook.save(file_path)
+
+
+def _child(func, args, results):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux
+    results.put((elapsed, (peak - baseline) * 1024))
+
+
+def measure(func, *args):
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    process = context.Process(target=_child, args=(func, args, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+async def load(path, count):
+    database = FollowersDatabase(path)
+    await database.start()
+    user_info = {"username": "bench", "full_name": "", "followers_count": count,
+                 "following_count": 0, "posts_count": 0, "bio": ""}
+    await database.save_followers(
+        user_info, (FollowerRecord(40_000_000_000 + i, f"user.name_{i:07d}") for i in range(count))
+    )
+    followers = await database.get_followers("bench")
+    await database.close()
+    return followers
+
+
+def main():
+    args = sys.argv[1:]
+    legacy_max = 100_000
+    if "--legacy-max" in args:
+        index = args.index("--legacy-max")
+        legacy_max = int(args[index + 1])
+        del args[index:index + 2]
+    counts = [int(arg) for arg in args] or [10_000, 100_000, 1_000_000]
+
+    for count in counts:
+        with tempfile.TemporaryDirectory() as directory:
+            db_path = os.path.join(directory, "bench.db")
+            followers = asyncio.run(load(db_path, count))
+
+            for export_format, (_, suffix) in EXPORT_FORMATS.items():
+                out = os.path.join(directory, "streaming" + suffix)
+                elapsed, peak = measure(export_followers, db_path, "bench", out, export_format)
+                print(f"{count:>9} rows  {export_format:>9}: {elapsed:7.2f}s  +{peak / 1e6:8.1f} MB RSS  "
+                      f"file {os.path.getsize(out) / 1e6:6.1f} MB")
+
+            if count <= legacy_max:
+                out = os.path.join(directory, "legacy.xlsx")
+                elapsed, peak = measure(legacy_export, followers, out)
+                print(f"{count:>9} rows  {'legacy':>9}: {elapsed:7.2f}s  +{peak / 1e6:8.1f} MB RSS  "
+                      f"file {os.path.getsize(out) / 1e6:6.1f} MB")
+            del followers
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Retained memory of a follower list: legacy 7-key dicts vs FollowerRecord.
+
+    python -m benchmarks.follower_memory [followers]
+
+Each list is built from freshly decoded API JSON which is dropped
+afterwards, as in a crawl, so only what the list keeps alive is counted.
+"""
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from services.records import FollowerRecord
+
+
+def make_api_items(count):
+    # Shape of Instagram Social API /v1/followers items
+    return [
+        {
+            "id": str(40_000_000_000 + i),
+            "username": f"user.name_{i:07d}",
+            "full_name": f"Full Name {i}",
+            "is_verified": i % 97 == 0,
+            "is_private": i % 3 == 0,
+            "profile_pic_url": f"https://scontent-ams2-1.cdninstagram.com/v/t51.2885-19/{i:09d}_n.jpg"
+                               f"?stp=dst-jpg_s150x150&_nc_ht=scontent&_nc_ohc=abcdefg&oh=00_{i:012d}",
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_dicts(items):
+    # Copy of the original per-follower dict from get_user_followers_batch
+    return [
+        {
+            "username": user.get("username", ""),
+            "id": str(user.get("id", "")),
+            "full_name": user.get("full_name", ""),
+            "link": f"https://www.instagram.com/{user.get('username', '')}",
+            "is_verified": user.get("is_verified", False),
+            "is_private": user.get("is_private", False),
+            "profile_pic_url": user.get("profile_pic_url", "")
+        }
+        for user in items
+    ]
+
+
+def records(items):
+    return [FollowerRecord.from_api(user) for user in items]
+
+
+def measure(builder, raw):
+    gc.collect()
+    tracemalloc.start()
+    items = json.loads(raw)
+    started = time.perf_counter()
+    result = builder(items)
+    elapsed = time.perf_counter() - started
+    del items
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    raw = json.dumps(make_api_items(count))
+
+    for name, builder in (("dict", legacy_dicts), ("FollowerRecord", records)):
+        result, retained, elapsed = measure(builder, raw)
+        print(f"{name:>15}: {retained / 1e6:7.1f} MB retained, "
+              f"{retained / count:6.0f} B/follower, build {elapsed:.3f}s")
+        del result
+
+
+if __name__ == "__main__":
+    main()
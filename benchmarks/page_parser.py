@@ -0,0 +1,118 @@
+"""
+Parsing of 50-item /v1/followers pages: the legacy loops vs services.parser.
+
+    python -m benchmarks.page_parser [pages]
+
+Pages have the shape of recorded Instagram Social API responses (every
+field of a user item, most of which we drop). The body bytes are decoded
+and parsed from scratch on every iteration, as for a fetched page.
+"""
+import gc
+import json
+import sys
+import time
+
+from services import parser
+from services.records import FollowerRecord
+
+
+def make_page(page: int) -> bytes:
+    items = []
+    for i in range(50):
+        n = page * 50 + i
+        items.append({
+            "fbid_v2": str(17841400000000000 + n),
+            "full_name": f"Full Name {n} ✨",
+            "has_anonymous_profile_picture": n % 11 == 0,
+            "id": str(40_000_000_000 + n),
+            "is_private": n % 3 == 0,
+            "is_verified": n % 97 == 0,
+            "latest_reel_media": 1718000000 + n if n % 4 == 0 else 0,
+            "pk": str(40_000_000_000 + n),
+            "pk_id": str(40_000_000_000 + n),
+            "profile_pic_id": f"{3300000000000000000 + n}_{40_000_000_000 + n}",
+            "profile_pic_url": f"https://scontent-ams2-1.cdninstagram.com/v/t51.2885-19/{n:09d}_n.jpg"
+                               f"?stp=dst-jpg_s150x150&_nc_ht=scontent&_nc_ohc=abcdefg&oh=00_{n:012d}",
+            "strong_id__": str(40_000_000_000 + n),
+            "third_party_downloads_enabled": 0,
+            "username": f"user.name_{n:07d}",
+            "account_badges": [],
+            "is_possible_scammer": False,
+        })
+    return json.dumps({
+        "data": {"count": 50, "items": items, "total": 120000},
+        "pagination_token": f"QVFD{page:08d}" + "x" * 120,
+    }).encode()
+
+
+def legacy_dicts(body: bytes):
+    # get_user_following before the parser: response.json() and a dict per user
+    data = json.loads(body.decode())
+    following = []
+    if "data" in data and "items" in data["data"]:
+        for user in data["data"]["items"]:
+            if user.get("username"):
+                following.append({
+                    "username": user.get("username", ""),
+                    "id": str(user.get("id", "")),
+                    "full_name": user.get("full_name", ""),
+                    "link": f"https://www.instagram.com/{user.get('username', '')}",
+                    "is_verified": user.get("is_verified", False),
+                    "is_private": user.get("is_private", False)
+                })
+    return following, data.get("pagination_token")
+
+
+def legacy_records(body: bytes):
+    # get_user_followers_batch before the parser: response.json() and from_api
+    data = json.loads(body.decode())
+    followers = []
+    if "data" in data and "items" in data["data"]:
+        for user in data["data"]["items"]:
+            if user.get("username"):
+                followers.append(FollowerRecord.from_api(user))
+    return followers, data.get("pagination_token")
+
+
+def measure(func, bodies, repeat=15):
+    # Best of several runs, timings on a shared machine are noisy
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        for body in bodies:
+            func(body)
+        best = min(best, time.perf_counter() - started)
+    return best / len(bodies) * 1e6
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    bodies = [make_page(page) for page in range(pages)]
+    print(f"{pages} pages of 50 items, {len(bodies[0])} bytes each")
+
+    candidates = [
+        ("legacy dicts (json)", legacy_dicts),
+        ("legacy from_api (json)", legacy_records),
+        ("parser (json)", lambda body: parser.parse_users_page(body, json.loads)),
+    ]
+    if parser.orjson is not None:
+        candidates.append(("parser (orjson)", lambda body: parser.parse_users_page(body, parser.orjson.loads)))
+    else:
+        print("orjson is not installed, skipping it")
+
+    # Same records from every parser
+    expected = [(r.id, r.username, r.full_name, r.is_verified, r.is_private) for r in legacy_records(bodies[0])[0]]
+    for name, func in candidates[1:]:
+        records, token = func(bodies[0])
+        assert [(r.id, r.username, r.full_name, r.is_verified, r.is_private) for r in records] == expected, name
+
+    baseline = None
+    for name, func in candidates:
+        per_page = measure(func, bodies)
+        baseline = baseline or per_page
+        print(f"{name:<26}{per_page:>8.1f} us/page{baseline / per_page:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
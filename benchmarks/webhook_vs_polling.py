@@ -0,0 +1,244 @@
+"""
+Update latency and throughput: long polling vs webhook (1..N workers).
+
+    python -m benchmarks.webhook_vs_polling [--updates N] [--concurrency C]
+                                            [--handler-ms MS] [--workers W ...]
+
+A fake Bot API server runs in this process. It queues updates for getUpdates
+or POSTs them to the webhook (C requests in flight, like Telegram's
+max_connections), and records when the echo bot's sendMessage for each update
+arrives. Latency is update injected -> reply received. Webhook workers are
+separate processes sharing one port, started the same way as the bot; the
+polling bot is a separate process too. At most C updates wait for their reply
+at a time. "dupes" counts replies to re-delivered updates: with W > 1 and the
+in-process backend a re-delivery landing on another worker is answered again,
+the shared Redis backend closes that gap.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import statistics
+import time
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+from aiohttp import ClientSession, web
+
+from bot.webhook import run_webhook, serve_workers
+from config import WebhookConfig
+from middlewares.dedup import UpdateDedupMiddleware
+from services.state_backend import MemoryStateBackend
+
+TOKEN = "42:benchmark"
+API_PORT = 8765
+WEBHOOK_PORT = 8766
+
+
+def make_update(update_id: int) -> dict:
+    user = {"id": update_id % 1000 + 1, "is_bot": False, "first_name": "bench"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user["id"], "type": "private"},
+            "from": user,
+            "text": str(update_id),
+        },
+    }
+
+
+class FakeTelegram:
+    """Just enough of the Bot API for an echo bot"""
+
+    def __init__(self, expected: int, concurrency: int):
+        self.expected = expected
+        # Updates injected and not answered yet
+        self.slots = asyncio.Semaphore(concurrency)
+        self.updates: "asyncio.Queue[dict]" = asyncio.Queue()
+        self.sent_at = {}
+        self.replied_at = {}
+        self.duplicates = 0
+        self.done = asyncio.Event()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        if method == "getMe":
+            result = {"id": 42, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif method == "getUpdates":
+            result = await self.get_updates(float(params.get("timeout", 0)))
+        elif method == "sendMessage":
+            result = self.reply(int(params["chat_id"]), params["text"])
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    def reply(self, chat_id: int, text: str) -> dict:
+        update_id = int(text)
+        if update_id in self.replied_at:
+            self.duplicates += 1
+        else:
+            self.replied_at[update_id] = time.perf_counter()
+            self.slots.release()
+            if len(self.replied_at) >= self.expected:
+                self.done.set()
+        return {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": text,
+        }
+
+    async def get_updates(self, timeout: float) -> list:
+        try:
+            batch = [await asyncio.wait_for(self.updates.get(), timeout=timeout or 0.01)]
+        except asyncio.TimeoutError:
+            return []
+        while len(batch) < 100 and not self.updates.empty():
+            batch.append(self.updates.get_nowait())
+        return batch
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+
+def echo_dispatcher(handler_ms: float) -> Dispatcher:
+    dp = Dispatcher()
+
+    @dp.message()
+    async def echo(message: Message):
+        if handler_ms:
+            await asyncio.sleep(handler_ms / 1000)
+        await message.answer(message.text)
+
+    return dp
+
+
+def make_bot() -> Bot:
+    return Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{API_PORT}")))
+
+
+class PollingWorker:
+    def __init__(self, handler_ms: float):
+        self.handler_ms = handler_ms
+
+    def __call__(self):
+        # SIGTERM stops polling and closes the bot session
+        asyncio.run(echo_dispatcher(self.handler_ms).start_polling(make_bot()))
+
+
+class WebhookWorker:
+    """webhook_worker(index) for serve_workers"""
+
+    def __init__(self, workers: int, handler_ms: float):
+        self.workers = workers
+        self.handler_ms = handler_ms
+
+    def __call__(self, index: int):
+        asyncio.run(self.serve(index))
+
+    async def serve(self, index: int):
+        bot = make_bot()
+        dp = echo_dispatcher(self.handler_ms)
+        # Per process: with several workers a re-delivery only dedups on the same worker, see REDIS_URL
+        dp.update.outer_middleware(UpdateDedupMiddleware(MemoryStateBackend()))
+        config = WebhookConfig(mode="webhook", url="http://127.0.0.1", host="127.0.0.1",
+                               port=WEBHOOK_PORT, workers=self.workers)
+        try:
+            await run_webhook(dp, bot, config, set_webhook=index == 0)
+        finally:
+            await bot.session.close()
+
+
+async def wait_for_port(port: int):
+    for _ in range(200):
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError(f"port {port} did not open")
+
+
+async def post_update(http: ClientSession, update_id: int):
+    async with http.post(f"http://127.0.0.1:{WEBHOOK_PORT}/webhook", json=make_update(update_id)) as response:
+        await response.read()
+
+
+async def run(mode: str, updates: int, concurrency: int, handler_ms: float, workers: int = 1) -> dict:
+    fake = FakeTelegram(updates, concurrency)
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", API_PORT).start()
+
+    if mode == "polling":
+        process = multiprocessing.Process(target=PollingWorker(handler_ms))
+    else:
+        process = multiprocessing.Process(target=serve_workers, args=(WebhookWorker(workers, handler_ms), workers))
+    process.start()
+    http = ClientSession()
+    try:
+        if mode == "webhook":
+            await wait_for_port(WEBHOOK_PORT)
+            # Let every worker bind the port
+            await asyncio.sleep(0.5)
+
+        # Closed loop: at most `concurrency` updates wait for their reply
+        posts = []
+        started = time.perf_counter()
+        for update_id in range(1, updates + 1):
+            await fake.slots.acquire()
+            fake.sent_at[update_id] = time.perf_counter()
+            if mode == "polling":
+                fake.updates.put_nowait(make_update(update_id))
+            else:
+                posts.append(asyncio.create_task(post_update(http, update_id)))
+        await asyncio.wait_for(fake.done.wait(), timeout=120)
+        elapsed = time.perf_counter() - started
+        await asyncio.gather(*posts)
+
+        if mode == "webhook":
+            # Re-deliveries, as Telegram sends after a timeout, must not be answered twice
+            await asyncio.gather(*(post_update(http, update_id) for update_id in range(1, min(updates, 200) + 1)))
+            await asyncio.sleep(0.5)
+    finally:
+        await http.close()
+        process.terminate()
+        process.join()
+        await runner.cleanup()
+
+    latencies = sorted((fake.replied_at[i] - fake.sent_at[i]) * 1000 for i in fake.replied_at)
+    return {
+        "throughput": updates / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "replies": len(fake.replied_at),
+        "duplicates": fake.duplicates,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=40)
+    parser.add_argument("--handler-ms", type=float, default=0)
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 4])
+    args = parser.parse_args()
+
+    runs = [("polling", 1)] + [("webhook", workers) for workers in args.workers]
+    print(f"{args.updates} updates, {args.concurrency} in flight, handler {args.handler_ms:.0f} ms")
+    print(f"{'mode':<12}{'workers':>8}{'upd/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'replies':>10}{'dupes':>8}")
+    for mode, workers in runs:
+        result = asyncio.run(run(mode, args.updates, args.concurrency, args.handler_ms, workers))
+        print(f"{mode:<12}{workers:>8}{result['throughput']:>10.0f}{result['p50']:>10.1f}"
+              f"{result['p95']:>10.1f}{result['replies']:>10}{result['duplicates']:>8}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
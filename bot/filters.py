@@ -0,0 +1,11 @@
+from typing import FrozenSet
+
+from aiogram.filters import BaseFilter
+from aiogram.types import Message
+
+
+class IsAdmin(BaseFilter):
+    """Passes messages from the operators in ADMIN_IDS (workflow data `admin_ids`)"""
+
+    async def __call__(self, message: Message, admin_ids: FrozenSet[int]) -> bool:
+        return message.from_user is not None and message.from_user.id in admin_ids
@@ -1,211 +1,252 @@
-import sqlite3
-import json
 import asyncio
 import random
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill
+import re
+import time
+from typing import List, Optional
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, FSInputFile
-from aiogram.filters import Command, StateFilter
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 
-from bot.states import InstagramStates
-from bot.keyboards import get_followers_keyboard, get_winner_keyboard, get_export_keyboard
+from bot.filters import IsAdmin
+from bot.keyboards import get_accounts_keyboard, get_winner_keyboard, get_export_keyboard
+from bot.progress import ProgressReporter
 from services.instagram_api import InstagramAPI
+from services.database import FollowersDatabase
+from services.crawler import FollowerCrawler
+from services.snapshots import SnapshotStore
+from services.freshness import FreshnessPolicy, SERVE, INCREMENTAL, FULL
+from services.draw import DrawEngine
+from services.export import EXPORT_FORMATS, ExportCache
 
 router = Router()
 
-# Путь к файлу базы данных SQLite
-DATABASE_PATH = "instagram_followers.db"
-
-# Фиксированный Instagram username
-FIXED_INSTAGRAM_USERNAME = "zayd.catlover"
-
-
-# Функции для работы с базой данных SQLite
-async def initialize_database():
-    """Инициализация базы данных SQLite"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
-    # Создаем таблицу для хранения информации об аккаунтах
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS accounts (
-        username TEXT PRIMARY KEY,
-        followers_count INTEGER,
-        full_name TEXT,
-        following_count INTEGER,
-        posts_count INTEGER,
-        bio TEXT,
-        update_timestamp INTEGER
-    )
-    ''')
-
-    # Создаем таблицу для хранения подписчиков
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS followers (
-        id TEXT,
-        username TEXT,
-        link TEXT,
-        account_username TEXT,
-        PRIMARY KEY (id, account_username),
-        FOREIGN KEY (account_username) REFERENCES accounts (username)
-    )
-    ''')
+# Instagram username: harflar, raqamlar, nuqta va pastki chiziq
+USERNAME_RE = re.compile(r"^[a-z0-9._]{1,30}$")
 
-    conn.commit()
-    conn.close()
 
+# Throttling costs (ThrottlingMiddleware): crawls and exports take more of the per-user budget
+CRAWL_COST = {"throttling_cost": 3}
+EXPORT_COST = {"throttling_cost": 5}
 
-async def save_followers_to_db(user_info, followers_list):
-    """Сохранить данные о подписчиках в базе данных SQLite"""
-    username = user_info['username']
-    followers_count = user_info['followers_count']
 
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+def normalize_username(text: Optional[str]) -> Optional[str]:
+    """'@Name' -> 'name', None if it is not a valid Instagram username"""
+    username = (text or "").strip().lstrip("@").lower()
+    return username if USERNAME_RE.match(username) else None
 
-    # Начинаем транзакцию
-    conn.execute("BEGIN TRANSACTION")
 
-    try:
-        # Удаляем старые данные об аккаунте, если они есть
-        cursor.execute("DELETE FROM accounts WHERE username = ?", (username,))
-
-        # Вставляем новую информацию об аккаунте
-        cursor.execute('''
-        INSERT INTO accounts (username, followers_count, full_name, following_count, posts_count, bio, update_timestamp)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            username,
-            followers_count,
-            user_info.get('full_name', ''),
-            user_info.get('following_count', 0),
-            user_info.get('posts_count', 0),
-            user_info.get('bio', ''),
-            int(asyncio.get_event_loop().time())
-        ))
-
-        # Удаляем старых подписчиков этого аккаунта
-        cursor.execute("DELETE FROM followers WHERE account_username = ?", (username,))
-
-        # Вставляем новых подписчиков
-        for follower in followers_list:
-            cursor.execute('''
-            INSERT INTO followers (id, username, link, account_username)
-            VALUES (?, ?, ?, ?)
-            ''', (
-                follower['id'],
-                follower['username'],
-                follower['link'],
-                username
-            ))
-
-        # Завершаем транзакцию
-        conn.commit()
-        return True
+async def get_account_choices(database: FollowersDatabase, default_account: str) -> List[str]:
+    """Tracked accounts, the default account while none is registered"""
+    tracked = [account['username'] for account in await database.get_tracked_accounts()]
+    return tracked or [default_account]
 
-    except Exception as e:
-        # Откатываем транзакцию в случае ошибки
-        conn.rollback()
-        print(f"Ошибка при сохранении данных в базу: {e}")
-        return False
-
-    finally:
-        conn.close()
-
-
-async def get_account_info_from_db(username):
-    """Получить информацию об аккаунте из базы данных"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute('''
-    SELECT username, followers_count, full_name, following_count, posts_count, bio, update_timestamp
-    FROM accounts
-    WHERE username = ?
-    ''', (username,))
-
-    result = cursor.fetchone()
-    conn.close()
-
-    if not result:
-        return None
-
-    return {
-        'username': result[0],
-        'followers_count': result[1],
-        'full_name': result[2],
-        'following_count': result[3],
-        'posts_count': result[4],
-        'bio': result[5],
-        'update_timestamp': result[6]
-    }
-
-
-async def get_followers_from_db(username):
-    """Получить список подписчиков аккаунта из базы данных"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute('''
-    SELECT id, username, link
-    FROM followers
-    WHERE account_username = ?
-    ''', (username,))
-
-    followers = []
-    for row in cursor.fetchall():
-        followers.append({
-            'id': row[0],
-            'username': row[1],
-            'link': row[2]
-        })
-
-    conn.close()
-    return followers
-
-
-@router.message(Command("start"))
-async def cmd_start(message: Message, state: FSMContext, instagram_api: InstagramAPI):
+
+@router.message(Command("start"), flags=CRAWL_COST)
+async def cmd_start(message: Message, state: FSMContext, command: CommandObject, instagram_api: InstagramAPI,
+                    database: FollowersDatabase, crawler: FollowerCrawler, snapshots: SnapshotStore,
+                    freshness: FreshnessPolicy, default_account: str):
     """
-    Начало работы бота. Теперь сразу используется фиксированный пользователь.
+    Начало работы бота. Один отслеживаемый аккаунт открывается сразу,
+    из нескольких пользователь выбирает (или передает username: /start <username>).
     """
-    # Инициализируем базу данных при первом запуске
-    await initialize_database()
+    accounts = await get_account_choices(database, default_account)
+    requested = normalize_username(command.args)
+    if requested in accounts:
+        username = requested
+    elif len(accounts) == 1:
+        username = accounts[0]
+    else:
+        await message.answer(
+            "👋 Assalomu alaykum! Instagram follower bot'ga xush kelibsiz!\n\n"
+            "🔍 Qaysi profil obunachilari orasidan g'olib aniqlanadi?",
+            reply_markup=get_accounts_keyboard(accounts)
+        )
+        return
 
     # Показываем приветственное сообщение
     await message.answer(
         f"👋 Assalomu alaykum! Instagram follower bot'ga xush kelibsiz!\n\n"
-        f"🔍 Bot faqat @{FIXED_INSTAGRAM_USERNAME} profilidan ma'lumot oladi."
+        f"🔍 Bot @{username} profilidan ma'lumot oladi."
     )
 
-    # Передаем instagram_api в функцию
-    await process_fixed_user(message, state, instagram_api)
+    await process_account(message, state, username, instagram_api, database, crawler, snapshots,
+                          freshness)
+
+
+@router.callback_query(F.data.startswith("account:"), flags=CRAWL_COST)
+async def choose_account(callback: CallbackQuery, state: FSMContext, instagram_api: InstagramAPI,
+                         database: FollowersDatabase, crawler: FollowerCrawler, snapshots: SnapshotStore,
+                         freshness: FreshnessPolicy, default_account: str):
+    """
+    Аккаунт выбран на клавиатуре /start
+    """
+    username = normalize_username(callback.data.split(":", 1)[1])
+    if username not in await get_account_choices(database, default_account):
+        await callback.answer("❌ Bu profil endi kuzatilmaydi", show_alert=True)
+        return
+
+    await callback.answer()
+    await process_account(callback.message, state, username, instagram_api, database, crawler, snapshots,
+                          freshness)
 
 
-@router.message(Command("followers"))
-async def cmd_followers(message: Message, state: FSMContext, instagram_api: InstagramAPI):
+@router.message(Command("followers"), flags=CRAWL_COST)
+async def cmd_followers(message: Message, state: FSMContext, instagram_api: InstagramAPI,
+                        database: FollowersDatabase, crawler: FollowerCrawler, snapshots: SnapshotStore,
+                        freshness: FreshnessPolicy, default_account: str):
     """
-    Команда для повторного получения подписчиков
+    Команда для повторного получения подписчиков выбранного аккаунта
     """
-    # Передаем instagram_api в функцию
-    await process_fixed_user(message, state, instagram_api)
+    data = await state.get_data()
+    accounts = await get_account_choices(database, default_account)
+    username = (data.get('instagram_user') or {}).get('username')
+    if username not in accounts:
+        if len(accounts) > 1:
+            await message.answer(
+                "🔍 Profilni tanlang:",
+                reply_markup=get_accounts_keyboard(accounts)
+            )
+            return
+        username = accounts[0]
+
+    await process_account(message, state, username, instagram_api, database, crawler, snapshots,
+                          freshness)
 
 
-async def process_fixed_user(message: Message, state: FSMContext, instagram_api: InstagramAPI):
+@router.message(Command("mutual"), flags=CRAWL_COST)
+async def cmd_mutual(message: Message, state: FSMContext, instagram_api: InstagramAPI,
+                     database: FollowersDatabase, crawler: FollowerCrawler, freshness: FreshnessPolicy,
+                     default_account: str):
     """
-    API limit bo'lsa avval bazadan ma'lumot olish
+    O'zaro obunalar: profil kimlarga obuna bo'lgan va ulardan kim qaytarib obuna bo'lgan
+    """
+    data = await state.get_data()
+    accounts = await get_account_choices(database, default_account)
+    username = (data.get('instagram_user') or {}).get('username')
+    if username not in accounts:
+        username = accounts[0]
+
+    db_user_info = await database.get_account_info(username)
+    if not db_user_info or not db_user_info['synced_at']:
+        await message.answer("⚠️ Avval obunachilarni yuklang: /start")
+        return
+
+    # Obunalar ro'yxati kam o'zgaradi, to'liq yuklash chegarasi bo'yicha yangilanadi
+    following_age = time.time() - (db_user_info['following_synced_at'] or 0)
+    if following_age > freshness.full_max_age:
+        user_info = await instagram_api.get_user_info(username) or db_user_info
+        status_message = await message.answer("🔄 Obunalar yuklanmoqda...")
+
+        def format_progress(total_fetched, estimated_total, batch_count):
+            return f"🔄 Obunalar yuklanmoqda... {total_fetched}/{estimated_total} - Batch {batch_count}"
+
+        async with ProgressReporter(message.bot, message.chat.id, status_message.message_id) as progress:
+            result = await crawler.crawl_following(user_info, progress_callback=progress.callback(format_progress))
+            if result.remote:
+                progress.update("⏳ Obunalar boshqa so'rov bo'yicha yuklanmoqda, keyinroq qayta urinib ko'ring.")
+                return
+            progress.update("✅ Obunalar yuklandi" if result.complete else "⚠️ Obunalar to'liq yuklanmadi")
+
+    # Hisob SQL join bilan: ro'yxatlar xotiraga yuklanmaydi
+    report = await database.get_follow_report(username, limit=20)
+    if not report or not report['following']:
+        await message.answer(f"❌ @{username} obunalari topilmadi.")
+        return
+
+    text = (
+        f"🤝 @{username} o'zaro obunalar:\n\n"
+        f"- Obunachilar: {report['followers']}\n"
+        f"- Obuna bo'lganlar: {report['following']}\n"
+        f"- O'zaro obuna: {report['mutual']}\n"
+        f"- Qaytarib obuna bo'lmaganlar: {report['not_following_back']}\n"
+        f"- Javob obunasi berilmaganlar: {report['fans']}"
+    )
+    if report['not_following_back_users']:
+        text += "\n\n➡️ Qaytarib obuna bo'lmaganlar:\n" + "\n".join(
+            f"• @{name}" for name in report['not_following_back_users']
+        )
+        if report['not_following_back'] > len(report['not_following_back_users']):
+            text += f"\n... va yana {report['not_following_back'] - len(report['not_following_back_users'])} ta"
+    await message.answer(text)
+
+
+@router.message(Command("track"), IsAdmin())
+async def cmd_track(message: Message, command: CommandObject, database: FollowersDatabase,
+                    crawler: FollowerCrawler):
+    """
+    /track <username> [weight] - profilni kuzatishga qo'shish (yoki ulushini o'zgartirish)
+    """
+    args = (command.args or "").split()
+    username = normalize_username(args[0]) if args else None
+    try:
+        weight = float(args[1]) if len(args) > 1 else 1.0
+    except ValueError:
+        weight = 0
+    if not username or not 0 < weight <= 100:
+        await message.answer("ℹ️ Foydalanish: /track <username> [ulush 0-100, odatda 1]")
+        return
+
+    await database.track_account(username, weight, message.from_user.id)
+    # Navbatdagi ulush: katta profil kichiklarini to'sib qo'ymaydi
+    crawler.scheduler.set_weight(username, weight)
+    await message.answer(f"✅ @{username} kuzatilmoqda (ulush: {weight:g})")
+
+
+@router.message(Command("untrack"), IsAdmin())
+async def cmd_untrack(message: Message, command: CommandObject, database: FollowersDatabase,
+                      crawler: FollowerCrawler):
+    """
+    /untrack <username> - profilni kuzatishdan olib tashlash, saqlangan ma'lumotlar qoladi
     """
-    username = FIXED_INSTAGRAM_USERNAME
+    username = normalize_username(command.args)
+    if not username:
+        await message.answer("ℹ️ Foydalanish: /untrack <username>")
+        return
 
+    if await database.untrack_account(username):
+        # Boshqa workerlar keyingi yuklashda ulushni bazadan oladi
+        crawler.scheduler.reset_weight(username)
+        await message.answer(f"✅ @{username} kuzatishdan olib tashlandi")
+    else:
+        await message.answer(f"❌ @{username} kuzatilmaydi")
+
+
+@router.message(Command("accounts"))
+async def cmd_accounts(message: Message, database: FollowersDatabase, crawler: FollowerCrawler,
+                       default_account: str):
+    """
+    Kuzatilayotgan profillar ro'yxati
+    """
+    accounts = await database.get_tracked_accounts()
+    if not accounts:
+        await message.answer(f"📋 Kuzatilayotgan profillar yo'q, @{default_account} ishlatiladi.")
+        return
+
+    lines = []
+    for account in accounts:
+        saved = account['active_followers'] if account['active_followers'] is not None else "—"
+        status = " 🔄" if crawler.is_crawling(account['username']) else ""
+        lines.append(f"• @{account['username']}: {saved} obunachi saqlangan, ulush {account['weight']:g}{status}")
+    await message.answer("📋 Kuzatilayotgan profillar:\n\n" + "\n".join(lines))
+
+
+async def process_account(message: Message, state: FSMContext, username: str, instagram_api: InstagramAPI,
+                          database: FollowersDatabase, crawler: FollowerCrawler, snapshots: SnapshotStore,
+                          freshness: FreshnessPolicy):
+    """
+    API limit bo'lsa avval bazadan ma'lumot olish
+    """
     # Показываем, что бот начал работу
     await message.answer(f"🔍 @{username} profili tekshirilmoqda...")
     await message.bot.send_chat_action(chat_id=message.chat.id, action="typing")
 
     # Avval bazadan ma'lumot olishga harakat qilamiz
-    db_user_info = await get_account_info_from_db(username)
-    db_followers = await get_followers_from_db(username)
+    db_user_info = await database.get_account_info(username)
+    # Список подписчиков общий для всех пользователей, в state храним только ссылку на снимок
+    snapshot = await snapshots.get(username)
 
     user_info = None
     api_working = False
@@ -252,14 +293,14 @@ async def process_fixed_user(message: Message, state: FSMContext, instagram_api:
         )
 
         # Agar bazada followers ham bo'lsa
-        if db_followers:
-            print(f"Found {len(db_followers)} followers in database")
+        if snapshot:
+            print(f"Found {len(snapshot)} followers in database")
 
             # State ga ma'lumotlarni saqlash
             await state.update_data(
                 instagram_user=user_info,
-                followers_list=db_followers,
-                total_fetched=len(db_followers),
+                snapshot=snapshot.handle(),
+                total_fetched=len(snapshot),
                 total_followers=user_info['followers_count'],
                 is_database_data=True
             )
@@ -267,13 +308,13 @@ async def process_fixed_user(message: Message, state: FSMContext, instagram_api:
             # Haqiqiydek yuklash simulyatsiyasi
             status_message = await message.answer("🔄 Obunachilar yuklanmoqda... 0/0")
             await simulate_database_loading_realistic(
-                message, status_message.message_id, len(db_followers), user_info['followers_count']
+                message, status_message.message_id, len(snapshot), user_info['followers_count']
             )
 
-            # G'olib tanlash tugmasi
+            # G'olib tanlash va eksport tugmalari
             await message.answer(
-                "G'olibni aniqlash uchun tugmani bosing:",
-                reply_markup=get_winner_keyboard()
+                "G'olibni aniqlash yoki ro'yxatni yuklab olish uchun tugmani bosing:",
+                reply_markup=get_export_keyboard()
             )
             return
         else:
@@ -300,18 +341,22 @@ async def process_fixed_user(message: Message, state: FSMContext, instagram_api:
         # Сохраняем информацию о пользователе
         await state.update_data(instagram_user=user_info)
 
-        # Проверяем, нужно ли обновлять данные
-        need_update = False
+        # Отвечаем из снимка, догружаем новых подписчиков или загружаем заново
+        # (возраст снимка по настенным часам, изменение числа подписчиков, время суток)
+        decision = freshness.decide(db_user_info, user_info, has_snapshot=bool(snapshot))
 
-        if not db_user_info:
-            need_update = True
-        else:
-            followers_diff = abs(db_user_info['followers_count'] - user_info['followers_count'])
-            if followers_diff >= 1000:
-                need_update = True
+        refreshing = crawler.is_crawling(username)
+        if refreshing and decision in (SERVE, INCREMENTAL):
+            # Идет фоновое обновление, а снимок еще годится: отвечаем из него,
+            # новых подписчиков принесет идущая загрузка
+            decision = SERVE
+        elif refreshing or await database.get_crawl_checkpoint(username):
+            # Незавершенную загрузку продолжаем с контрольной точки,
+            # к уже идущей загрузке этого аккаунта присоединяемся с ее прогрессом
+            decision = FULL
 
         # Если обновление не требуется, используем кэшированные данные
-        if not need_update and db_user_info and db_followers:
+        if decision == SERVE:
             await message.answer(
                 f"👤 *{user_info['full_name']}* (@{user_info['username']})\n"
                 f"📊 Statistika:\n"
@@ -323,23 +368,29 @@ async def process_fixed_user(message: Message, state: FSMContext, instagram_api:
             )
 
             await state.update_data(
-                followers_list=db_followers,
-                total_fetched=len(db_followers),
+                snapshot=snapshot.handle(),
+                total_fetched=len(snapshot),
                 total_followers=db_user_info['followers_count']
             )
 
+            if refreshing:
+                await message.answer("🔄 Ma'lumotlar yangilanmoqda, hozircha saqlangan ro'yxat ishlatiladi.")
+
             await message.answer(
-                "G'olibni aniqlash uchun tugmani bosing:",
-                reply_markup=get_winner_keyboard()
+                "G'olibni aniqlash yoki ro'yxatni yuklab olish uchun tugmani bosing:",
+                reply_markup=get_export_keyboard()
             )
         else:
             # Yangi ma'lumot yuklash kerak
             if db_user_info:
                 followers_diff = abs(db_user_info['followers_count'] - user_info['followers_count'])
-                await message.answer(
-                    f"🔄 Obunachilar soni {followers_diff} ta o'zgargan, yangi ma'lumotlar yuklanmoqda...",
-                    parse_mode="Markdown"
-                )
+                if followers_diff:
+                    await message.answer(
+                        f"🔄 Obunachilar soni {followers_diff} ta o'zgargan, yangi ma'lumotlar yuklanmoqda...",
+                        parse_mode="Markdown"
+                    )
+                else:
+                    await message.answer("🔄 Ma'lumotlar yangilanmoqda...")
 
             await message.answer(
                 f"✅ Ma'lumotlar topildi!\n\n"
@@ -357,14 +408,14 @@ async def process_fixed_user(message: Message, state: FSMContext, instagram_api:
 
             await state.update_data(
                 current_user_id=user_info['id'],
-                followers_list=[],
+                snapshot=None,
                 next_max_id=None,
                 total_fetched=0,
                 total_followers=user_info['followers_count'],
                 status_message_id=status_message.message_id
             )
 
-            await fetch_all_followers(message, state, instagram_api)
+            await fetch_all_followers(message, state, crawler, snapshots, incremental=decision == INCREMENTAL)
 
 
 async def simulate_database_loading_realistic(message, status_message_id: int, actual_count: int,
@@ -375,62 +426,48 @@ async def simulate_database_loading_realistic(message, status_message_id: int, a
     # Katta batch lar ishlatish - tezroq yuklash uchun
     batch_size = 200  # 50 dan 200 ga ko'tarildi
     loaded = 0
-    batch_count = 0
-
-    # Kamroq qadam bilan yuklash
-    while loaded < actual_count:
-        batch_count += 1
-        await asyncio.sleep(random.uniform(0.1, 0.3))  # 0.5-1.0 dan 0.1-0.3 ga kamaytirildi
-
-        remaining = actual_count - loaded
-        current_batch_size = min(batch_size, remaining)
-        loaded += current_batch_size
-
-        # target_followers ga nisbatan percentage ko'rsatish
-        percentage = min(100, int((loaded / target_followers) * 100))
-
-        # Har 3-batch da bir marta status yangilash (tezroq)
-        if batch_count % 3 == 0 or loaded >= actual_count:
-            try:
-                await message.bot.edit_message_text(
-                    text=f"🔄 Obunachilar yuklanmoqda... {loaded}/{target_followers} ({percentage}%)",
-                    chat_id=message.chat.id,
-                    message_id=status_message_id
-                )
-            except Exception:
-                pass
-
-        # Kamroq typing action
-        if batch_count % 5 == 0:  # Har 5-batch da bir marta
-            await message.bot.send_chat_action(chat_id=message.chat.id, action="typing")
-
-        batch_size = random.randint(150, 250)  # Katta batch hajmi
-
-    # Final status
-    final_percentage = min(100, int((loaded / target_followers) * 100))
-    try:
-        await message.bot.edit_message_text(
-            text=f"✅ Obunachilar yuklandi",
-            chat_id=message.chat.id,
-            message_id=status_message_id
-        )
-    except Exception:
-        pass
+
+    # Status va typing action ProgressReporter orqali, Telegram limitlarini tejash uchun
+    async with ProgressReporter(message.bot, message.chat.id, status_message_id) as progress:
+        # Kamroq qadam bilan yuklash
+        while loaded < actual_count:
+            await asyncio.sleep(random.uniform(0.1, 0.3))  # 0.5-1.0 dan 0.1-0.3 ga kamaytirildi
+
+            remaining = actual_count - loaded
+            current_batch_size = min(batch_size, remaining)
+            loaded += current_batch_size
+
+            # target_followers ga nisbatan percentage ko'rsatish
+            percentage = min(100, int((loaded / target_followers) * 100))
+            progress.update(f"🔄 Obunachilar yuklanmoqda... {loaded}/{target_followers} ({percentage}%)")
+
+            batch_size = random.randint(150, 250)  # Katta batch hajmi
+
+        # Final status
+        progress.update(f"✅ Obunachilar yuklandi")
 
 
 @router.callback_query(F.data == "select_winner")
-async def select_winner(callback: CallbackQuery, state: FSMContext):
+async def select_winner(callback: CallbackQuery, state: FSMContext, draw_engine: DrawEngine):
     """
     G'olib tanlash - bazadagi ma'lumot bilan ham ishlaydi
     """
     await callback.answer("🎲 G'olib tanlanmoqda...")
 
     data = await state.get_data()
-    followers_list = data.get('followers_list', [])
-    total_fetched = data.get('total_fetched', 0)
+    handle = data.get('snapshot')
+    user_info = data.get('instagram_user')
     is_database_data = data.get('is_database_data', False)
 
-    if not followers_list:
+    if draw_engine.needs_stream(user_info, handle):
+        # Saqlangan ro'yxat to'liq emas: g'olib butun ro'yxatdan oqim orqali tanlanadi
+        await callback.message.answer("🔄 Profil katta, g'olib barcha obunachilar orasidan aniqlanmoqda. "
+                                      "Bu biroz vaqt oladi...")
+
+    # Tasodifiy tartib raqami bo'yicha tanlash, ro'yxat to'liq yuklanmaydi; seed qayta tekshirish uchun saqlanadi
+    draw = await draw_engine.draw_account(user_info, handle)
+
+    if not draw:
         await callback.message.answer("❌ G'olibni aniqlash uchun obunachilar ro'yxati mavjud emas!")
         return
 
@@ -438,8 +475,8 @@ async def select_winner(callback: CallbackQuery, state: FSMContext):
     await callback.bot.send_chat_action(chat_id=callback.message.chat.id, action="typing")
     await asyncio.sleep(1.5)
 
-    winner = random.choice(followers_list)
-    winner_index = followers_list.index(winner) + 1
+    winner = draw.winner
+    winner_index = draw.ordinal
 
     dots_message = await callback.message.answer("🎲 G'olib tanlanmoqda...")
 
@@ -461,7 +498,8 @@ async def select_winner(callback: CallbackQuery, state: FSMContext):
     winner_text = (
         f"🎉 *G'OLIB ANIQLANDI!* 🎉\n\n"
         f"🏆 G'olib: [{winner['username']}]({winner['link']})\n"
-        f"🔢 G'olibning tartib raqami: {winner_index} \n\n"
+        f"🔢 G'olibning tartib raqami: {winner_index} \n"
+        f"🔑 Seed: `{draw.seed}`\n\n"
         f"Tabriklaymiz! 🎊"
     )
 
@@ -483,192 +521,119 @@ async def select_winner(callback: CallbackQuery, state: FSMContext):
     )
 
 
-async def fetch_all_followers(message: Message, state: FSMContext, instagram_api: InstagramAPI):
+async def fetch_all_followers(message: Message, state: FSMContext, crawler: FollowerCrawler,
+                              snapshots: SnapshotStore, incremental: bool = False):
     """
-    Haqiqiy API bilan followers yuklash
+    Haqiqiy API bilan followers yuklash (incremental: faqat yangi obunachilar)
     """
     data = await state.get_data()
-    username = data.get('instagram_user', {}).get('username', '')
     status_message_id = data.get('status_message_id')
     total_followers = data.get('total_followers')
     user_info = data.get('instagram_user')
+    username = user_info['username']
 
-    followers_list = []
-    pagination_token = None
-    total_fetched = 0
-    last_status_text = ""
-    batch_count = 0
-
-    # Функция безопасного обновления сообщения
-    async def update_status_safely(text):
-        nonlocal last_status_text
-        if text == last_status_text:
-            return
-        last_status_text = text
-        await safe_edit_message(message.bot, message.chat.id, status_message_id, text)
-
-    # Начинаем загрузку
-    while total_fetched < total_followers:
-        batch_count += 1
-        await message.bot.send_chat_action(chat_id=message.chat.id, action="typing")
-
-        try:
-            batch_result = await instagram_api.get_user_followers_batch(
-                username, 50, pagination_token
-            )
-
-            if not batch_result or not batch_result.get('followers'):
-                await update_status_safely("⚠️ Obunachilarni yuklashda xatolik yuz berdi.")
-                break
-
-            new_followers = batch_result.get('followers', [])
-            followers_list.extend(new_followers)
-            total_fetched = len(followers_list)
-            pagination_token = batch_result.get('next_max_id')
-
-            percentage = min(100, int((total_fetched / total_followers) * 100))
-            await update_status_safely(
-                f"🔄 Obunachilar yuklanmoqda... {total_fetched}/{total_followers} ({percentage}%) - Batch {batch_count}")
-
-            if not pagination_token or not new_followers or not batch_result.get('has_more', True):
-                await update_status_safely(f"✅ Barcha obunachilar yuklandi")
-                break
-
-            await asyncio.sleep(0.8)
+    def format_progress(total_fetched, estimated_total, batch_count):
+        if incremental:
+            return f"🔄 Yangi obunachilar tekshirilmoqda... {total_fetched} - Batch {batch_count}"
+        percentage = min(100, int((total_fetched / total_followers) * 100))
+        return f"🔄 Obunachilar yuklanmoqda... {total_fetched}/{total_followers} ({percentage}%) - Batch {batch_count}"
+
+    # Статус обновляется в отдельной задаче не чаще раза в min_interval,
+    # промежуточные состояния схлопываются, загрузка не ждет Telegram
+    async with ProgressReporter(message.bot, message.chat.id, status_message_id) as progress:
+        # Загрузка идет постранично с контрольной точкой после каждой страницы,
+        # прерванная загрузка продолжится с последней сохраненной страницы
+        result = await crawler.crawl(user_info, progress_callback=progress.callback(format_progress),
+                                     incremental=incremental)
+
+        if result.resumed:
+            print(f"Crawl of {username} resumed from checkpoint")
+
+        if result.complete:
+            progress.update(f"✅ Barcha obunachilar yuklandi")
+        elif result.pages >= crawler.max_pages:
+            progress.update(f"⚠️ Xavfsizlik chegarasiga yetdi: {result.fetched} ta obunachi yuklandi")
+        elif result.error:
+            progress.update("⚠️ Obunachilarni yuklashda xatolik yuz berdi.")
+        else:
+            progress.update(f"✅ Obunachilar yuklandi")
 
-            if batch_count > 2000:
-                await update_status_safely(f"⚠️ Xavfsizlik chegarasiga yetdi: {total_fetched} ta obunachi yuklandi")
-                break
-
-        except Exception as e:
-            print(f"Error fetching followers: {e}")
-            await asyncio.sleep(3)
-            continue
+    # Страницы уже сохранены в базе, берем актуальный снимок оттуда
+    snapshot = await snapshots.get(username)
 
     # Сохраняем результаты
     await state.update_data(
-        followers_list=followers_list,
-        total_fetched=total_fetched,
+        snapshot=snapshot.handle() if snapshot else None,
+        total_fetched=len(snapshot) if snapshot else 0,
         is_database_data=False
     )
 
-    # Сохраняем в базу
-    if user_info and followers_list:
-        save_success = await save_followers_to_db(user_info, followers_list)
-        if save_success:
-            print(f"Successfully saved {len(followers_list)} followers to database")
-
-    # Показываем итоговый статус
-    final_percentage = min(100, int((total_fetched / total_followers) * 100))
-    await update_status_safely(f"✅ Obunachilar yuklandi")
-
-    # Предлагаем выбрать победителя
-    if followers_list:
+    # Предлагаем выбрать победителя или выгрузить список
+    if snapshot:
         await message.answer(
-            "G'olibni aniqlash uchun tugmani bosing:",
-            reply_markup=get_winner_keyboard()
+            "G'olibni aniqlash yoki ro'yxatni yuklab olish uchun tugmani bosing:",
+            reply_markup=get_export_keyboard()
         )
     else:
         await message.answer("❌ Obunachilar ro'yxatini olib bo'lmadi.")
 
 
-@router.callback_query(F.data == "export_excel")
-async def export_to_excel(callback: CallbackQuery, state: FSMContext):
+# callback data -> (export format, progress text)
+EXPORT_CALLBACKS = {
+    "export_excel": ("xlsx", "📊 Excel fayl tayyorlanmoqda..."),
+    "export_csv": ("csv", "📄 CSV fayl tayyorlanmoqda..."),
+    "export_jsonl": ("jsonl", "🗜 JSONL fayl tayyorlanmoqda..."),
+}
+
+
+@router.callback_query(F.data.in_(EXPORT_CALLBACKS), flags=EXPORT_COST)
+async def export_followers(callback: CallbackQuery, state: FSMContext, export_cache: ExportCache):
     """
-    Export followers list to Excel file
+    Export followers list to Excel, CSV or gzip-compressed JSONL file
     """
-    await callback.answer("📊 Excel fayl tayyorlanmoqda...")
+    export_format, progress_text = EXPORT_CALLBACKS[callback.data]
+    await callback.answer(progress_text)
 
-    # Get the followers list from state
     data = await state.get_data()
-    followers_list = data.get('followers_list', [])
-    total_fetched = data.get('total_fetched', 0)
+    handle = data.get('snapshot')
 
-    if not followers_list:
+    if not handle:
         await callback.message.answer("❌ Eksport qilish uchun obunachilar ro'yxati mavjud emas!")
         return
 
     # Show typing action to indicate processing
     await callback.bot.send_chat_action(chat_id=callback.message.chat.id, action="upload_document")
 
-    # Create Excel file in memory
-    excel_file = await create_excel_file(followers_list, FIXED_INSTAGRAM_USERNAME)
+    # Same snapshot and format: the cached file (or its file_id) is sent again without rebuilding
+    artifact = await export_cache.get(handle['account'], export_format)
 
-    # Send the file to user
-    await callback.message.answer_document(
-        FSInputFile(
-            excel_file,
-            filename=f"{FIXED_INSTAGRAM_USERNAME}_followers.xlsx"
-        ),
-        caption=f"📊 {FIXED_INSTAGRAM_USERNAME} uchun {total_fetched} ta obunachi ma'lumotlari."
-    )
+    if not artifact or not artifact['rows']:
+        await callback.message.answer("❌ Eksport qilish uchun obunachilar ro'yxati mavjud emas!")
+        return
+
+    caption = f"📊 {handle['account']} uchun {artifact['rows']} ta obunachi ma'lumotlari."
+
+    if artifact['file_id']:
+        try:
+            await callback.message.answer_document(artifact['file_id'], caption=caption)
+        except TelegramBadRequest:
+            # file_id is no longer accepted, upload the file again
+            await export_cache.remember_file_id(artifact, None)
+            artifact = await export_cache.get(handle['account'], export_format)
+
+    if not artifact['file_id']:
+        # Send the file to user
+        sent = await callback.message.answer_document(
+            FSInputFile(
+                artifact['path'],
+                filename=f"{handle['account']}_followers{EXPORT_FORMATS[export_format][1]}"
+            ),
+            caption=caption
+        )
+        await export_cache.remember_file_id(artifact, sent.document.file_id)
 
     # Allow selecting a winner
     await callback.message.answer(
         "🎲 G'olibni aniqlash uchun tugmani bosing:",
         reply_markup=get_winner_keyboard()
     )
-
-
-async def create_excel_file(followers_list, account_username):
-    """
-    Create Excel file with followers data
-    """
-    # Create a workbook and select active worksheet
-    workbook = openpyxl.Workbook()
-    worksheet = workbook.active
-    worksheet.title = "Obunachilar"
-
-    # Define header style
-    header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
-    header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-    header_alignment = Alignment(horizontal='center', vertical='center')
-
-    # Add headers
-    headers = ["№", "Username", "Instagram Link", "ID"]
-    for col_num, header in enumerate(headers, 1):
-        cell = worksheet.cell(row=1, column=col_num)
-        cell.value = header
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-
-    # Add data
-    for row_num, follower in enumerate(followers_list, 2):
-        worksheet.cell(row=row_num, column=1).value = row_num - 1  # № (counter)
-        worksheet.cell(row=row_num, column=2).value = follower['username']
-        worksheet.cell(row=row_num, column=3).value = follower['link']
-        worksheet.cell(row=row_num, column=4).value = follower['id']
-
-    # Auto-adjust column width
-    for column_cells in worksheet.columns:
-        length = max(len(str(cell.value)) for cell in column_cells)
-        worksheet.column_dimensions[column_cells[0].column_letter].width = length + 5
-
-    # Save to in-memory file
-    file_path = f"temp_{account_username}_followers.xlsx"
-    workbook.save(file_path)
-
-    return file_path
-
-
-async def safe_edit_message(bot, chat_id, message_id, text, **kwargs):
-    """
-    Безопасно обновляет сообщение, игнорируя ошибки "message is not modified"
-    """
-    try:
-        await bot.edit_message_text(
-            text=text,
-            chat_id=chat_id,
-            message_id=message_id,
-            **kwargs
-        )
-        return True
-    except Exception as e:
-        # Игнорируем ошибку "message is not modified"
-        if "message is not modified" in str(e).lower():
-            return True  # Сообщение уже содержит нужный текст
-
-        # Для других ошибок просто логируем и продолжаем
-        print(f"Ошибка при обновлении сообщения: {e}")
-        return False
\ No newline at end of file
@@ -1,3 +1,5 @@
+from typing import List
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 
@@ -22,6 +24,26 @@ def get_followers_keyboard(user_id: str, followers_count: int) -> InlineKeyboard
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+def get_accounts_keyboard(usernames: List[str]) -> InlineKeyboardMarkup:
+    """
+    Create a keyboard with one button per tracked Instagram account.
+
+    Args:
+        usernames: Tracked account usernames
+
+    Returns:
+        InlineKeyboardMarkup: Keyboard with account buttons
+    """
+    keyboard = [
+        [InlineKeyboardButton(
+            text=f"📷 @{username}",
+            callback_data=f"account:{username}"
+        )]
+        for username in usernames
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
 def get_winner_keyboard() -> InlineKeyboardMarkup:
     """
     Create a keyboard with a button to select a random winner.
@@ -40,7 +62,7 @@ def get_winner_keyboard() -> InlineKeyboardMarkup:
 
 def get_export_keyboard() -> InlineKeyboardMarkup:
     """
-    Create a keyboard with buttons for exporting to Excel and selecting a winner.
+    Create a keyboard with buttons for exporting (Excel, CSV, JSONL) and selecting a winner.
 
     Returns:
         InlineKeyboardMarkup: Keyboard with export and winner buttons
@@ -50,6 +72,16 @@ def get_export_keyboard() -> InlineKeyboardMarkup:
             text="📊 Excel formatida yuklash",
             callback_data="export_excel"
         )],
+        [
+            InlineKeyboardButton(
+                text="📄 CSV",
+                callback_data="export_csv"
+            ),
+            InlineKeyboardButton(
+                text="🗜 JSONL (.gz)",
+                callback_data="export_jsonl"
+            )
+        ],
         [InlineKeyboardButton(
             text="🎲 G'olibni aniqlash",
             callback_data="select_winner"
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from typing import Callable, Optional
+
+from aiogram import Bot
+
+
+class ProgressReporter:
+    """
+    Debounced status message for long operations.
+
+    Producers call `update()` as often as they like; it only stores the
+    latest text and never waits on Telegram. A separate task edits the
+    status message at most once per `min_interval`, skipping intermediate
+    states, and sends the chat action at most once per `action_interval`.
+    `close()` always renders the final state.
+
+        async with ProgressReporter(bot, chat_id, message_id) as progress:
+            await crawler.crawl(user_info, progress_callback=progress.callback(format_progress))
+            progress.update("✅ Done")
+    """
+
+    def __init__(self, bot: Bot, chat_id: int, message_id: int, min_interval: float = 2.0,
+                 action: Optional[str] = "typing", action_interval: float = 4.5):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.min_interval = min_interval
+        self.action = action
+        # Chat actions are shown for about 5 seconds
+        self.action_interval = action_interval
+
+        self._text: Optional[str] = None
+        self._rendered: Optional[str] = None
+        self._changed = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._last_action = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> "ProgressReporter":
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    def update(self, text: str):
+        """Set the latest status text, rendered on the next tick"""
+        self._text = text
+        self._changed.set()
+
+    def callback(self, formatter: Callable[[int, int, int], str]) -> Callable:
+        """
+        Progress callback for FollowerCrawler.crawl and InstagramAPI.get_all_followers_with_progress
+
+        Args:
+            formatter: Builds the status text from (current_count, estimated_total, batch_count)
+        """
+        async def on_progress(current_count: int, estimated_total: int, batch_count: int):
+            self.update(formatter(current_count, estimated_total, batch_count))
+
+        return on_progress
+
+    async def close(self, final_text: Optional[str] = None):
+        """Stop the reporter and render the final state right away"""
+        if final_text is not None:
+            self._text = final_text
+        self._closing.set()
+        self._changed.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self._render()
+
+    async def __aenter__(self) -> "ProgressReporter":
+        return self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _run(self):
+        while True:
+            await self._changed.wait()
+            if self._closing.is_set():
+                break
+            self._changed.clear()
+
+            await self._send_action()
+            await self._render()
+
+            # Updates arriving meanwhile are coalesced into the next edit
+            try:
+                await asyncio.wait_for(self._closing.wait(), timeout=self.min_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _send_action(self):
+        if not self.action:
+            return
+        now = time.monotonic()
+        if now - self._last_action < self.action_interval:
+            return
+        self._last_action = now
+        try:
+            await self.bot.send_chat_action(chat_id=self.chat_id, action=self.action)
+        except Exception as e:
+            print(f"Chat action failed: {e}")
+
+    async def _render(self):
+        text = self._text
+        if text is None or text == self._rendered:
+            return
+        self._rendered = text
+        await safe_edit_message(self.bot, self.chat_id, self.message_id, text)
+
+
+async def safe_edit_message(bot, chat_id, message_id, text, **kwargs):
+    """
+    Безопасно обновляет сообщение, игнорируя ошибки "message is not modified"
+    """
+    try:
+        await bot.edit_message_text(
+            text=text,
+            chat_id=chat_id,
+            message_id=message_id,
+            **kwargs
+        )
+        return True
+    except Exception as e:
+        # Игнорируем ошибку "message is not modified"
+        if "message is not modified" in str(e).lower():
+            return True  # Сообщение уже содержит нужный текст
+
+        # Для других ошибок просто логируем и продолжаем
+        print(f"Ошибка при обновлении сообщения: {e}")
+        return False
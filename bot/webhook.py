@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+from typing import Callable, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from config import WebhookConfig
+
+logger = logging.getLogger(__name__)
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """
+    Webhook handler that answers Telegram at once and handles the update in
+    a background task (Telegram does not wait for the handler, so slow
+    handlers cause no re-deliveries). On shutdown it waits up to
+    `drain_timeout` seconds for the updates in flight before closing the
+    bot session, instead of dropping them.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, drain_timeout: float = 30.0, **kwargs):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, **kwargs)
+        self.drain_timeout = drain_timeout
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def drain(self):
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return
+        logger.info("Draining %d updates in flight", len(tasks))
+        _, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+        if pending:
+            logger.warning("Cancelling %d updates still running after %.0fs", len(pending), self.drain_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def close(self):
+        await self.drain()
+        await super().close()
+
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, path: str = "/webhook", secret: Optional[str] = None,
+                      drain_timeout: float = 30.0) -> web.Application:
+    """aiohttp application serving `dp` on POST `path`"""
+    app = web.Application()
+    handler = DrainingRequestHandler(dp, bot, drain_timeout=drain_timeout, secret_token=secret)
+    handler.register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, config: WebhookConfig, set_webhook: bool = True):
+    """
+    Serve updates over a webhook until SIGTERM/SIGINT
+
+    Every worker binds the same port with SO_REUSEPORT and the kernel spreads
+    connections between them. Only one worker (`set_webhook`) registers the
+    webhook with Telegram. Shutdown stops accepting connections first, then
+    drains the updates in flight, then returns so the caller closes services.
+    """
+    app = build_webhook_app(dp, bot, path=config.path, secret=config.secret,
+                            drain_timeout=config.drain_timeout)
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    site = web.TCPSite(runner, config.host, config.port, reuse_port=config.workers > 1)
+    await site.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    try:
+        if set_webhook:
+            if not config.url:
+                raise RuntimeError("BOT_MODE=webhook needs WEBHOOK_URL")
+            await bot.set_webhook(
+                url=config.url.rstrip("/") + config.path,
+                secret_token=config.secret,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+        logger.info("Serving webhook on %s:%s%s (pid %d)", config.host, config.port, config.path, os.getpid())
+        await stop.wait()
+    finally:
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(signum)
+        await runner.cleanup()
+
+
+def serve_workers(target: Callable[[int], None], workers: int):
+    """
+    Run `target(worker_index)` in `workers` processes and wait for them.
+    SIGTERM/SIGINT are forwarded so every worker drains before exiting.
+    """
+    processes = [
+        multiprocessing.Process(target=target, args=(index,), name=f"bot-worker-{index}")
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
@@ -1,24 +1,105 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from environs import Env
-from typing import Optional
+from typing import List, Optional
 
 
 @dataclass
 class TelegramConfig:
     token: str
+    # Telegram user ids allowed to register accounts (/track, /untrack)
+    admin_ids: List[int] = field(default_factory=list)
+    # Local Bot API server (or a fake one for benchmarks), api.telegram.org when not set
+    api_url: Optional[str] = None
 
 
 @dataclass
 class InstagramConfig:
-    api_key: str
+    # One or more RapidAPI keys, requests are spread over them
+    api_keys: List[str]
     api_host: str
     follower_count: int = 50
+    # Used while no account is registered with /track
+    default_account: str = "zayd.catlover"
+    # Page requests in flight over all crawls
+    crawl_concurrency: int = 3
+    # Per key
+    rate_limit: float = 2.0
+    max_rate_limit: float = 10.0
+    key_quarantine: int = 300
+    profile_cache_ttl: int = 300
+    profile_cache_stale_ttl: int = 3600
+    profile_cache_size: int = 1024
+
+
+@dataclass
+class DatabaseConfig:
+    path: str = "instagram_followers.db"
+    read_pool_size: int = 3
+
+
+@dataclass
+class ExportConfig:
+    workers: int = 2
+    use_processes: bool = False
+    directory: str = "exports"
+    cache_max_mb: int = 512
+    cache_max_age: int = 7 * 24 * 3600
+
+
+@dataclass
+class FreshnessConfig:
+    # Snapshot age served without a refresh, longer in the peak hours
+    max_age: int = 3600
+    peak_max_age: int = 6 * 3600
+    peak_hours: str = "18-23"
+    # Full crawl (finds unfollows) at least this often
+    full_max_age: int = 24 * 3600
+    # Follower count change that triggers a refresh: this many or this share, whichever is smaller
+    drift_abs: int = 500
+    drift_ratio: float = 0.05
+    # Growth above this is crawled in full instead of incrementally
+    incremental_max: int = 5000
+
+
+@dataclass
+class RefreshConfig:
+    enabled: bool = True
+    check_interval: int = 600
+    # Snapshots older than this are re-crawled in the off-peak hours
+    max_age: int = 6 * 3600
+    # Local hours "start-end", may wrap midnight
+    hours: str = "1-7"
+    # Spare quota: page requests a day for refreshes, and requests kept in reserve
+    daily_pages: int = 2000
+    quota_reserve: int = 500
+
+
+@dataclass
+class WebhookConfig:
+    # "polling" or "webhook"
+    mode: str = "polling"
+    # Public base URL Telegram posts updates to, e.g. https://bot.example.com
+    url: Optional[str] = None
+    path: str = "/webhook"
+    host: str = "0.0.0.0"
+    port: int = 8080
+    secret: Optional[str] = None
+    workers: int = 1
+    dedup_ttl: int = 3600
+    drain_timeout: float = 30.0
 
 
 @dataclass
 class Config:
     telegram: TelegramConfig
     instagram: InstagramConfig
+    database: DatabaseConfig
+    export: ExportConfig
+    freshness: FreshnessConfig
+    refresh: RefreshConfig
+    webhook: WebhookConfig
+    # Shared state for several bot workers, in-process state when not set
+    redis_url: Optional[str] = None
 
 
 def load_config(path: Optional[str] = None) -> Config:
@@ -28,11 +109,62 @@ def load_config(path: Optional[str] = None) -> Config:
     return Config(
         telegram=TelegramConfig(
             token=env.str("BOT_TOKEN"),
+            admin_ids=env.list("ADMIN_IDS", [], subcast=int),
+            api_url=env.str("TELEGRAM_API_URL", None),
         ),
         instagram=InstagramConfig(
-            api_key=env.str("RAPIDAPI_KEY"),
+            api_keys=[key.strip() for key in env.list("RAPIDAPI_KEYS", []) if key.strip()]
+            or [env.str("RAPIDAPI_KEY")],
             api_host=env.str("RAPIDAPI_HOST"),
             follower_count=env.int("DEFAULT_FOLLOWER_COUNT", 50),
+            default_account=env.str("DEFAULT_INSTAGRAM_USERNAME", "zayd.catlover"),
+            crawl_concurrency=env.int("CRAWL_CONCURRENCY", 3),
+            rate_limit=env.float("RAPIDAPI_RATE_LIMIT", 2.0),
+            max_rate_limit=env.float("RAPIDAPI_MAX_RATE_LIMIT", 10.0),
+            key_quarantine=env.int("RAPIDAPI_KEY_QUARANTINE", 300),
+            profile_cache_ttl=env.int("PROFILE_CACHE_TTL", 300),
+            profile_cache_stale_ttl=env.int("PROFILE_CACHE_STALE_TTL", 3600),
+            profile_cache_size=env.int("PROFILE_CACHE_SIZE", 1024),
+        ),
+        database=DatabaseConfig(
+            path=env.str("DATABASE_PATH", "instagram_followers.db"),
+            read_pool_size=env.int("DATABASE_READ_POOL_SIZE", 3),
+        ),
+        export=ExportConfig(
+            workers=env.int("EXPORT_WORKERS", 2),
+            use_processes=env.bool("EXPORT_USE_PROCESSES", False),
+            directory=env.str("EXPORT_DIR", "exports"),
+            cache_max_mb=env.int("EXPORT_CACHE_MAX_MB", 512),
+            cache_max_age=env.int("EXPORT_CACHE_MAX_AGE", 7 * 24 * 3600),
+        ),
+        freshness=FreshnessConfig(
+            max_age=env.int("FRESHNESS_MAX_AGE", 3600),
+            peak_max_age=env.int("FRESHNESS_PEAK_MAX_AGE", 6 * 3600),
+            peak_hours=env.str("FRESHNESS_PEAK_HOURS", "18-23"),
+            full_max_age=env.int("FRESHNESS_FULL_MAX_AGE", 24 * 3600),
+            drift_abs=env.int("FRESHNESS_DRIFT_ABS", 500),
+            drift_ratio=env.float("FRESHNESS_DRIFT_RATIO", 0.05),
+            incremental_max=env.int("FRESHNESS_INCREMENTAL_MAX", 5000),
+        ),
+        refresh=RefreshConfig(
+            enabled=env.bool("REFRESH_ENABLED", True),
+            check_interval=env.int("REFRESH_CHECK_INTERVAL", 600),
+            max_age=env.int("REFRESH_MAX_AGE", 6 * 3600),
+            hours=env.str("REFRESH_HOURS", "1-7"),
+            daily_pages=env.int("REFRESH_DAILY_PAGES", 2000),
+            quota_reserve=env.int("REFRESH_QUOTA_RESERVE", 500),
+        ),
+        webhook=WebhookConfig(
+            mode=env.str("BOT_MODE", "polling"),
+            url=env.str("WEBHOOK_URL", None),
+            path=env.str("WEBHOOK_PATH", "/webhook"),
+            host=env.str("WEBAPP_HOST", "0.0.0.0"),
+            port=env.int("WEBAPP_PORT", 8080),
+            secret=env.str("WEBHOOK_SECRET", None),
+            workers=env.int("WEBHOOK_WORKERS", 1),
+            dedup_ttl=env.int("WEBHOOK_DEDUP_TTL", 3600),
+            drain_timeout=env.float("WEBHOOK_DRAIN_TIMEOUT", 30.0),
         ),
+        redis_url=env.str("REDIS_URL", None),
     )
 
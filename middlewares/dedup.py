@@ -0,0 +1,32 @@
+from typing import Dict, Any, Callable, Awaitable
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from services.state_backend import StateBackend
+
+
+class UpdateDedupMiddleware(BaseMiddleware):
+    """
+    Drops updates that were already handled.
+
+    Telegram re-delivers a webhook update when the response is late or the
+    connection breaks, and with several workers the retry may land on a
+    different process. The first worker to claim `update_id` in the state
+    backend handles it, every other delivery within `ttl` seconds is dropped.
+    Register as an outer middleware on `dp.update`.
+    """
+
+    def __init__(self, backend: StateBackend, ttl: float = 3600):
+        self.backend = backend
+        self.ttl = ttl
+
+    async def __call__(
+            self,
+            handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any]
+    ) -> Any:
+        if not await self.backend.claim_once(f"update:{event.update_id}", self.ttl):
+            return None
+        return await handler(event, data)
@@ -1,28 +1,48 @@
-import time
-from typing import Dict, Any, Callable, Awaitable
+from typing import Dict, Any, Callable, Awaitable, Optional, Union
 from aiogram import BaseMiddleware
-from aiogram.types import Message
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import Message, CallbackQuery
+
+from services.state_backend import StateBackend, MemoryStateBackend
+
+THROTTLED_TEXT = "Iltmos sabr bilan botni ishlating siz juda ko'p so'rov yubordingiz"
 
 
 class ThrottlingMiddleware(BaseMiddleware):
-    def __init__(self, rate_limit: int = 1):
+    """
+    Per-user token bucket for messages and callback queries.
+
+    Every user gets `burst` tokens that refill at one token per `rate_limit`
+    seconds. A handler costs one token unless it sets the `throttling_cost`
+    flag (e.g. exports and crawls). Buckets are kept in the state backend,
+    so every bot worker sees the same budget; they expire once full again.
+    """
+
+    def __init__(self, rate_limit: float = 1, burst: int = 5, backend: Optional[StateBackend] = None):
         self.rate_limit = rate_limit
-        self.users: Dict[int, float] = {}
+        self.burst = burst
+        self.backend = backend or MemoryStateBackend()
 
     async def __call__(
             self,
-            handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
-            event: Message,
+            handler: Callable[[Union[Message, CallbackQuery], Dict[str, Any]], Awaitable[Any]],
+            event: Union[Message, CallbackQuery],
             data: Dict[str, Any]
     ) -> Any:
-        user_id = event.from_user.id
-
-        current_time = time.time()
-
-        if user_id in self.users and current_time - self.users[user_id] < self.rate_limit:
-            await event.answer("Iltmos sabr bilan botni ishlating siz juda ko'p so'rov yubordingiz")
-            return
+        user = event.from_user
+        if user is None:
+            return await handler(event, data)
 
-        self.users[user_id] = current_time
+        # Costs above the burst would never pass
+        cost = min(get_flag(data, "throttling_cost", default=1), self.burst)
+        allowed, first_rejection = await self.backend.take_tokens(
+            f"throttle:{user.id}", cost, self.burst, self.rate_limit
+        )
+        if allowed:
+            return await handler(event, data)
 
-        return await handler(event, data)
\ No newline at end of file
+        # Warn once per throttled streak, further events are dropped silently
+        if isinstance(event, CallbackQuery):
+            await event.answer(THROTTLED_TEXT, show_alert=first_rejection)
+        elif first_rejection:
+            await event.answer(THROTTLED_TEXT)
@@ -0,0 +1,426 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Callable, Set, List, Tuple
+
+from services.instagram_api import InstagramAPI
+from services.database import FollowersDatabase
+from services.state_backend import StateBackend, MemoryStateBackend
+from services.scheduler import CrawlScheduler
+
+
+@dataclass
+class CrawlResult:
+    username: str
+    fetched: int = 0
+    pages: int = 0
+    complete: bool = False
+    resumed: bool = False
+    # Stopped at the first page without new followers, nothing was tombstoned
+    incremental: bool = False
+    stopped: bool = False
+    # Crawled by another worker, this one only waited for it
+    remote: bool = False
+    error: Optional[str] = None
+
+
+class CrawlFlight:
+    """One running crawl and the callers waiting on it"""
+
+    def __init__(self, username: str):
+        self.username = username
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers: List[Callable] = []
+        self.last_progress: Optional[Tuple[int, int, int]] = None
+
+    async def subscribe(self, progress_callback: Callable):
+        self.subscribers.append(progress_callback)
+        # A late joiner sees the current state right away
+        if self.last_progress:
+            await self._notify(progress_callback, self.last_progress)
+
+    def unsubscribe(self, progress_callback: Callable):
+        if progress_callback in self.subscribers:
+            self.subscribers.remove(progress_callback)
+
+    async def publish(self, current_count: int, estimated_total: int, batch_count: int):
+        self.last_progress = (current_count, estimated_total, batch_count)
+        if self.subscribers:
+            await asyncio.gather(*(
+                self._notify(callback, self.last_progress) for callback in list(self.subscribers)
+            ))
+
+    @staticmethod
+    async def _notify(progress_callback: Callable, progress: Tuple[int, int, int]):
+        try:
+            await progress_callback(*progress)
+        except Exception as e:
+            print(f"Error in progress callback: {e}")
+
+
+class FollowerCrawler:
+    """
+    Checkpointed follower crawls.
+
+    Every page is saved together with a checkpoint (pagination token, pages
+    and rows done), so a crawl interrupted by a restart, a deploy or a quota
+    cutoff continues from the last saved page instead of starting over.
+
+    Fetching and saving are separate stages: the next page is requested as
+    soon as the previous token is known, while earlier pages are saved,
+    checkpointed and reported, so a crawl takes about its network time.
+
+    Page requests of all crawls go through one CrawlScheduler: bounded
+    concurrency, weighted fair queuing between accounts, so a big account
+    does not hold up the crawls of small ones.
+
+    An incremental crawl only fetches the head of the list: followers come
+    newest first, so it stops at the first page that adds nobody new. It
+    does not tombstone followers who left, that takes a full crawl.
+
+    Crawls are single-flight: only one crawl runs per account, later callers
+    attach to it, get its progress and share its result. Across workers a
+    crawl lock in the state backend does the same; a worker that finds the
+    lock taken follows the other crawl through its checkpoints.
+    """
+
+    def __init__(self, instagram_api: InstagramAPI, database: FollowersDatabase,
+                 page_size: int = 50, page_delay: float = 0, max_pages: int = 2000, pipeline_depth: int = 4,
+                 error_delay: float = 3, max_errors: int = 5, checkpoint_ttl: int = 24 * 3600,
+                 backend: Optional[StateBackend] = None, lock_ttl: float = 120, lock_poll: float = 2,
+                 scheduler: Optional[CrawlScheduler] = None):
+        self.instagram_api = instagram_api
+        self.database = database
+        self.page_size = page_size
+        # Pacing is done by the API rate limiter, page_delay is an optional extra pause
+        self.page_delay = page_delay
+        self.max_pages = max_pages
+        # Pages fetched ahead of the one being saved, 0 fetches only after each save
+        self.pipeline_depth = pipeline_depth
+        self.error_delay = error_delay
+        self.max_errors = max_errors
+        # Pagination tokens expire, older checkpoints start over
+        self.checkpoint_ttl = checkpoint_ttl
+        self.backend = backend or MemoryStateBackend()
+        # A lock not refreshed for lock_ttl (dead worker) is free again
+        self.lock_ttl = lock_ttl
+        self.lock_poll = lock_poll
+        self.scheduler = scheduler or CrawlScheduler()
+        self._tasks: Set[asyncio.Task] = set()
+        self._flights: Dict[str, CrawlFlight] = {}
+        self._stopping = asyncio.Event()
+
+    async def crawl(self, user_info: Dict[str, Any], progress_callback: Optional[Callable] = None,
+                    incremental: bool = False) -> CrawlResult:
+        """
+        Crawl all followers of an account, resuming from a checkpoint if there is one
+
+        If a crawl of the same account is already running, the caller attaches
+        to it instead of starting another one. The crawl runs in its own task,
+        so cancelling a caller does not stop it for the others.
+
+        Args:
+            user_info: Account info as returned by InstagramAPI.get_user_info
+            progress_callback: Function to call with progress updates (current_count, estimated_total, batch_count)
+            incremental: Stop at the first page without new followers. Ignored
+                when resuming from a checkpoint or attaching to a running crawl.
+
+        Returns:
+            CrawlResult of the crawl
+        """
+        flight = self._start(user_info, incremental=incremental)
+        try:
+            if progress_callback:
+                await flight.subscribe(progress_callback)
+            return await asyncio.shield(flight.task)
+        finally:
+            if progress_callback:
+                flight.unsubscribe(progress_callback)
+
+    def is_crawling(self, username: str) -> bool:
+        """Whether a crawl of the account is running"""
+        return username in self._flights
+
+    def _start(self, user_info: Dict[str, Any], wait_for_lock: bool = True, incremental: bool = False) -> CrawlFlight:
+        username = user_info['username']
+        flight = self._flights.get(username)
+        if flight:
+            return flight
+
+        flight = CrawlFlight(username)
+        flight.task = asyncio.create_task(self._run(user_info, flight, wait_for_lock, incremental))
+        self._flights[username] = flight
+        self._tasks.add(flight.task)
+
+        def on_done(task: asyncio.Task):
+            self._tasks.discard(task)
+            if self._flights.get(username) is flight:
+                del self._flights[username]
+
+        flight.task.add_done_callback(on_done)
+        return flight
+
+    async def crawl_following(self, user_info: Dict[str, Any],
+                              progress_callback: Optional[Callable] = None) -> CrawlResult:
+        """
+        Crawl the accounts an account follows and store them
+
+        Pages are fetched like follower pages (pipelined, retried, through the
+        scheduler) and saved as they arrive. There is no checkpoint: Instagram
+        caps following at 7500 accounts, an interrupted crawl starts over.
+        Edges the crawl did not see are dropped only when it completes.
+
+        Args:
+            user_info: Account info as returned by InstagramAPI.get_user_info
+            progress_callback: Function to call with progress updates (current_count, estimated_total, batch_count)
+
+        Returns:
+            CrawlResult of the crawl, `remote` if another crawl of the list is running
+        """
+        username = user_info['username']
+        result = CrawlResult(username=username)
+        lock_name = f"following:{username}"
+        token = await self.backend.acquire_lock(lock_name, self.lock_ttl)
+        if token is None:
+            result.remote = True
+            return result
+
+        total = user_info.get('following_count') or 0
+        try:
+            run_at = await self.database.begin_following(username)
+            if 'following_count' in user_info and not total:
+                # Follows nobody, nothing to fetch
+                result.complete = True
+                await self.database.save_following_page(user_info, [], run_at)
+                await self.database.finish_following(username, run_at, complete=True)
+                return result
+
+            with self.scheduler.session(username):
+                pages = self.instagram_api.iter_following_pages(
+                    username, max_pages=self.max_pages, prefetch=self.pipeline_depth,
+                    page_size=self.page_size, page_delay=self.page_delay,
+                    slot=lambda: self.scheduler.slot(username)
+                )
+                try:
+                    async for page in pages:
+                        result.pages += 1
+                        result.fetched += len(page['followers'])
+                        await self.database.save_following_page(user_info, page['followers'], run_at)
+                        await self.backend.refresh_lock(lock_name, token, self.lock_ttl)
+                        if progress_callback:
+                            await CrawlFlight._notify(progress_callback, (result.fetched, total, result.pages))
+                        if not page.get('next_max_id') or not page.get('has_more', True):
+                            result.complete = True
+                        if self._stopping.is_set():
+                            result.stopped = True
+                            break
+                except Exception as e:
+                    print(f"Error fetching following: {e}")
+                    result.error = str(e)
+                finally:
+                    await pages.aclose()
+
+            removed = await self.database.finish_following(username, run_at, result.complete)
+            print(f"Following crawl of {username} finished: {result.fetched} accounts in {result.pages} batches, "
+                  f"{removed} dropped")
+            return result
+        finally:
+            await self.backend.release_lock(lock_name, token)
+
+    async def load_weights(self):
+        """Take the scheduler weights from the tracked accounts"""
+        self.scheduler.load_weights(await self.database.get_crawl_weights())
+
+    async def resume_pending(self):
+        """Start background crawls for every checkpoint left by a previous run"""
+        for checkpoint in await self.database.get_crawl_checkpoints():
+            if not checkpoint['pagination_token']:
+                # Last page was saved, only finishing was interrupted
+                await self.database.finish_crawl(checkpoint['username'], complete=True)
+                continue
+            user_info = await self.database.get_account_info(checkpoint['username'])
+            if not user_info:
+                continue
+            print(f"Resuming crawl of {checkpoint['username']} from page {checkpoint['pages_done']}")
+            # Another worker may be resuming it already
+            self._start(user_info, wait_for_lock=False)
+
+    async def shutdown(self, timeout: float = 10):
+        """
+        Stop in-flight crawls after their current page is checkpointed
+
+        Args:
+            timeout: Seconds to wait before cancelling crawls that are still running
+        """
+        self._stopping.set()
+        if not self._tasks:
+            return
+        done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+    async def _sleep(self, delay: float):
+        # Wakes up early on shutdown
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self, user_info: Dict[str, Any], flight: CrawlFlight, wait_for_lock: bool,
+                   incremental: bool = False) -> CrawlResult:
+        username = user_info['username']
+        result = CrawlResult(username=username)
+        lock_name = f"crawl:{username}"
+
+        token = await self.backend.acquire_lock(lock_name, self.lock_ttl)
+        if token is None:
+            if not wait_for_lock:
+                result.remote = True
+                return result
+            token = await self._follow_remote(user_info, flight, lock_name)
+            if token is None:
+                result.remote = True
+                result.stopped = self._stopping.is_set()
+                return result
+
+        try:
+            # Weights are changed by /track on any worker, the database has the current ones
+            await self.load_weights()
+            # The crawl keeps its place in the scheduler between page requests
+            with self.scheduler.session(username):
+                return await self._crawl(user_info, flight, result, lock_name, token, incremental)
+        finally:
+            await self.backend.release_lock(lock_name, token)
+
+    async def _follow_remote(self, user_info: Dict[str, Any], flight: CrawlFlight, lock_name: str) -> Optional[str]:
+        """
+        Wait for the crawl running in another worker, publishing its checkpoints
+        as progress. Returns a lock token when the crawl has to be continued
+        here (the other worker died mid-crawl), None when it finished.
+        """
+        username = user_info['username']
+        total_followers = user_info.get('followers_count') or 0
+        while not self._stopping.is_set():
+            await self._sleep(self.lock_poll)
+            checkpoint = await self.database.get_crawl_checkpoint(username)
+            if checkpoint:
+                await flight.publish(checkpoint['rows_saved'], total_followers, checkpoint['pages_done'])
+
+            token = await self.backend.acquire_lock(lock_name, self.lock_ttl)
+            if token is None:
+                continue
+            # Read again under the lock, the crawl may have finished meanwhile
+            checkpoint = await self.database.get_crawl_checkpoint(username)
+            if checkpoint and checkpoint['pagination_token']:
+                return token
+            await self.backend.release_lock(lock_name, token)
+            return None
+        return None
+
+    @staticmethod
+    def _reached_total(result: CrawlResult, total_followers: int) -> bool:
+        # Stopped early at the expected count: unseen followers are not tombstoned
+        return bool(total_followers) and result.fetched >= total_followers
+
+    async def _crawl(self, user_info: Dict[str, Any], flight: CrawlFlight, result: CrawlResult,
+                     lock_name: str, token: str, incremental: bool = False) -> CrawlResult:
+        username = user_info['username']
+        total_followers = user_info.get('followers_count') or 0
+
+        pagination_token = None
+        checkpoint = await self.database.get_crawl_checkpoint(username)
+        if checkpoint and checkpoint['pagination_token']:
+            if time.time() - checkpoint['updated_at'] <= self.checkpoint_ttl:
+                pagination_token = checkpoint['pagination_token']
+                result.pages = checkpoint['pages_done']
+                result.fetched = checkpoint['rows_saved']
+                result.resumed = True
+            else:
+                await self.database.discard_crawl_checkpoint(username)
+
+        # An interrupted crawl is finished as a full one
+        result.incremental = incremental and not result.resumed
+        # Pages fetched ahead of an incremental crawl would mostly be wasted
+        prefetch = 0 if result.incremental else self.pipeline_depth
+        caught_up = False
+        errors = 0
+        while True:
+            if self._stopping.is_set():
+                result.stopped = True
+                return result
+
+            if result.pages >= self.max_pages:
+                print(f"Reached safety limit of {result.pages} batches for {username}")
+                break
+
+            # The fetch stage requests the next page as soon as its token is
+            # parsed; up to pipeline_depth pages wait here to be saved. It does
+            # not run ahead past the expected count, those requests cost quota.
+            budget = self.max_pages - result.pages
+            if total_followers > result.fetched:
+                budget = min(budget, -(-(total_followers - result.fetched) // self.page_size))
+            pages = self.instagram_api.iter_follower_pages(
+                username, pagination_token, max_pages=budget,
+                prefetch=prefetch, page_size=self.page_size, page_delay=self.page_delay,
+                slot=lambda: self.scheduler.slot(username)
+            )
+            consumed = 0
+            try:
+                async for page in pages:
+                    errors = 0
+                    consumed += 1
+                    new_followers = page['followers']
+                    next_token = page.get('next_max_id')
+                    has_more = bool(next_token) and page.get('has_more', True)
+
+                    saved = await self.database.save_crawl_page(
+                        user_info, new_followers, next_token if has_more else None,
+                        result.pages + 1, result.fetched + len(new_followers)
+                    )
+                    # Advance only past a saved page: a failed save is retried
+                    # from the last saved token instead of being skipped
+                    pagination_token = next_token
+                    result.pages += 1
+                    result.fetched += len(new_followers)
+                    # Older followers are already stored
+                    caught_up = result.incremental and not (saved['added'] or saved['revived'])
+
+                    if not await self.backend.refresh_lock(lock_name, token, self.lock_ttl):
+                        # Lock expired and another worker took over from the checkpoint
+                        result.error = "crawl lock lost"
+                        return result
+
+                    await flight.publish(result.fetched, total_followers, result.pages)
+
+                    if not has_more:
+                        result.complete = True
+                    if not has_more or caught_up or self._reached_total(result, total_followers) \
+                            or self._stopping.is_set():
+                        break
+            except Exception as e:
+                errors += 1
+                print(f"Error fetching followers: {e}")
+                if errors >= self.max_errors:
+                    result.error = str(e)
+                    return result
+                await self._sleep(self.error_delay)
+                continue
+            finally:
+                # Stops the fetch stage; pages fetched ahead are fetched again on resume
+                await pages.aclose()
+
+            if result.complete or caught_up or self._reached_total(result, total_followers):
+                break
+            if self._stopping.is_set() or consumed >= budget:
+                continue
+            # Checkpoint is kept, the next crawl continues from here
+            result.error = "empty batch"
+            return result
+
+        # Only a crawl that reached the end of the list is a full sync
+        removed = await self.database.finish_crawl(username, result.complete)
+        print(f"Crawl of {username} finished: {result.fetched} followers in {result.pages} batches, "
+              f"{removed} removed")
+        return result
@@ -0,0 +1,970 @@
+import asyncio
+import json
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, List, Optional, Any, Callable, Iterable, Tuple
+
+from services.migrations import migrate
+from services.records import FollowerRecord
+
+# Rows per executemany() call in the bulk loader
+BULK_CHUNK_SIZE = 5000
+
+
+class FollowersDatabase:
+    """
+    Async storage service for accounts and followers.
+
+    All writes go through a single writer thread that owns one persistent
+    connection, reads are served by a small pool of reader threads with
+    their own connections. Handlers only ever await the public methods,
+    so big snapshot writes never block the event loop.
+    """
+
+    def __init__(self, path: str, read_pool_size: int = 3, mmap_size: int = 256 * 1024 * 1024,
+                 cache_size_kb: int = 64 * 1024):
+        self.path = path
+        self.read_pool_size = read_pool_size
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self._write_queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._readers: Optional[ThreadPoolExecutor] = None
+        self._reader_local = threading.local()
+        self._reader_connections: List[sqlite3.Connection] = []
+        self._reader_lock = threading.Lock()
+
+    def _connect(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=check_same_thread)
+        # WAL lets the reader pool run while the writer commits
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kb)}")
+        return conn
+
+    async def start(self):
+        """Start the writer thread and the reader pool, create the schema"""
+        if self._writer is not None:
+            return
+
+        self._writer = threading.Thread(target=self._writer_loop, name="db-writer", daemon=True)
+        self._writer.start()
+        self._readers = ThreadPoolExecutor(
+            max_workers=self.read_pool_size,
+            thread_name_prefix="db-reader",
+            initializer=self._init_reader
+        )
+
+        await self._write(self._create_schema)
+
+    async def close(self):
+        """Drain pending writes and close every connection"""
+        if self._writer is None:
+            return
+
+        self._write_queue.put(None)
+        await asyncio.get_running_loop().run_in_executor(None, self._writer.join)
+        self._writer = None
+
+        self._readers.shutdown(wait=True)
+        self._readers = None
+        with self._reader_lock:
+            for conn in self._reader_connections:
+                conn.close()
+            self._reader_connections.clear()
+
+    # --- Thread plumbing ---
+
+    def _writer_loop(self):
+        conn = self._connect()
+        try:
+            while True:
+                item = self._write_queue.get()
+                if item is None:
+                    break
+
+                func, args, future = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    result = func(conn, *args)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            conn.close()
+
+    def _init_reader(self):
+        conn = self._connect(check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        self._reader_local.conn = conn
+        with self._reader_lock:
+            self._reader_connections.append(conn)
+
+    def _run_reader(self, func: Callable, args: tuple):
+        return func(self._reader_local.conn, *args)
+
+    async def _write(self, func: Callable, *args) -> Any:
+        if self._writer is None:
+            raise RuntimeError("FollowersDatabase is not started")
+        future: Future = Future()
+        self._write_queue.put((func, args, future))
+        return await asyncio.wrap_future(future)
+
+    async def _read(self, func: Callable, *args) -> Any:
+        if self._readers is None:
+            raise RuntimeError("FollowersDatabase is not started")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._run_reader, func, args)
+
+    # --- Schema ---
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection):
+        migrate(conn)
+
+        # Sync staging lives in the writer's in-memory temp schema,
+        # so it costs no main-db or WAL writes
+        conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS sync_page (user_id INTEGER PRIMARY KEY, seq INTEGER NOT NULL)"
+        )
+        conn.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS sync_seen (
+            account_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            PRIMARY KEY (account_id, user_id)
+        ) WITHOUT ROWID
+        ''')
+        # Accounts whose seen set was started by this process
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS sync_runs (account_id INTEGER PRIMARY KEY)")
+
+    # --- Writes ---
+
+    async def save_followers(self, user_info: Dict[str, Any], followers_list: Iterable[Dict[str, Any]]) -> bool:
+        """
+        Replace the stored snapshot of an account with a fresh one
+
+        Args:
+            user_info: Account info as returned by InstagramAPI.get_user_info
+            followers_list: Followers of the account
+
+        Returns:
+            True if the snapshot was saved, False otherwise
+        """
+        now = int(time.time())
+        return await self._write(self._save_followers, user_info, followers_list, now, now)
+
+    @staticmethod
+    def _upsert_account(conn: sqlite3.Connection, user_info: Dict[str, Any], timestamp: int) -> int:
+        conn.execute('''
+        INSERT INTO accounts (username, followers_count, full_name, following_count, posts_count, bio, update_timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (username) DO UPDATE SET
+            followers_count = excluded.followers_count,
+            full_name = excluded.full_name,
+            following_count = excluded.following_count,
+            posts_count = excluded.posts_count,
+            bio = excluded.bio,
+            update_timestamp = excluded.update_timestamp
+        ''', (
+            user_info['username'],
+            user_info['followers_count'],
+            user_info.get('full_name', ''),
+            user_info.get('following_count', 0),
+            user_info.get('posts_count', 0),
+            user_info.get('bio', ''),
+            timestamp
+        ))
+        return conn.execute(
+            "SELECT id FROM accounts WHERE username = ?", (user_info['username'],)
+        ).fetchone()[0]
+
+    @staticmethod
+    def _iter_chunks(followers: Iterable[Dict[str, Any]], chunk_size: int = BULK_CHUNK_SIZE):
+        """Yield (users, ids) chunks of unique followers, ids in crawl order"""
+        seen = set()
+        iterator = iter(followers)
+
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                break
+
+            users = []
+            ids = []
+            for follower in chunk:
+                user_id = int(follower['id'])
+                if user_id in seen:
+                    continue
+                seen.add(user_id)
+                users.append((user_id, follower['username'], follower.get('full_name', '')))
+                ids.append(user_id)
+
+            # Key order inserts touch each b-tree page once per chunk instead of at random
+            users.sort()
+            yield users, ids
+
+    @staticmethod
+    def _upsert_users(conn: sqlite3.Connection, users: List[tuple]):
+        # Unchanged users are not rewritten
+        conn.executemany('''
+        INSERT INTO users (id, username, full_name) VALUES (?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET username = excluded.username, full_name = excluded.full_name
+        WHERE username IS NOT excluded.username OR full_name IS NOT excluded.full_name
+        ''', users)
+
+    @classmethod
+    def _bulk_load_followers(cls, conn: sqlite3.Connection, account_id: int, followers: Iterable[Dict[str, Any]],
+                             start_position: int = 1, chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        """Insert followers in executemany() chunks, skipping duplicate ids. Returns rows written."""
+        position = start_position
+
+        for users, ids in cls._iter_chunks(followers, chunk_size):
+            edges = [(account_id, user_id, position + offset) for offset, user_id in enumerate(ids)]
+            position += len(ids)
+            edges.sort()
+
+            cls._upsert_users(conn, users)
+            conn.executemany(
+                "INSERT INTO followers (account_id, user_id, position) VALUES (?, ?, ?)", edges
+            )
+
+        return position - start_position
+
+    @classmethod
+    def _save_followers(cls, conn: sqlite3.Connection, user_info, followers_list, timestamp, synced_at) -> bool:
+        try:
+            with conn:
+                account_id = cls._upsert_account(conn, user_info, timestamp)
+
+                # Удаляем старых подписчиков этого аккаунта и загружаем новых
+                conn.execute("DELETE FROM followers WHERE account_id = ?", (account_id,))
+                cls._bulk_load_followers(conn, account_id, followers_list)
+                conn.execute(
+                    "UPDATE accounts SET synced_at = ?, full_synced_at = ? WHERE id = ?",
+                    (synced_at, synced_at, account_id)
+                )
+                cls._bump_snapshot_version(conn, account_id)
+            return True
+
+        except Exception as e:
+            print(f"Ошибка при сохранении данных в базу: {e}")
+            return False
+
+    @classmethod
+    def _stage_followers(cls, conn: sqlite3.Connection, account_id: int,
+                         followers: Iterable[Dict[str, Any]]) -> Tuple[int, int]:
+        """
+        Apply one batch of crawled followers: append new ones, revive returning
+        ones and remember the ids in the per-account seen set. Returns (added, revived).
+        """
+        conn.execute("DELETE FROM temp.sync_page")
+
+        seq = 0
+        for users, ids in cls._iter_chunks(followers):
+            cls._upsert_users(conn, users)
+            conn.executemany(
+                "INSERT OR IGNORE INTO temp.sync_page (user_id, seq) VALUES (?, ?)",
+                ((user_id, seq + offset) for offset, user_id in enumerate(ids))
+            )
+            seq += len(ids)
+
+        max_position = conn.execute(
+            "SELECT COALESCE(MAX(position), 0) FROM followers WHERE account_id = ?", (account_id,)
+        ).fetchone()[0]
+
+        added = conn.execute('''
+        INSERT INTO followers (account_id, user_id, position)
+        SELECT ?, p.user_id, ? + ROW_NUMBER() OVER (ORDER BY p.seq)
+        FROM temp.sync_page p
+        WHERE NOT EXISTS (
+            SELECT 1 FROM followers f WHERE f.account_id = ? AND f.user_id = p.user_id
+        )
+        ''', (account_id, max_position, account_id)).rowcount
+
+        revived = conn.execute('''
+        UPDATE followers SET removed_at = NULL, last_seen = NULL
+        WHERE account_id = ? AND removed_at IS NOT NULL
+          AND user_id IN (SELECT user_id FROM temp.sync_page)
+        ''', (account_id,)).rowcount
+
+        conn.execute(
+            "INSERT OR IGNORE INTO temp.sync_seen (account_id, user_id) SELECT ?, user_id FROM temp.sync_page",
+            (account_id,)
+        )
+        if added or revived:
+            cls._bump_snapshot_version(conn, account_id, added + revived)
+        return added, revived
+
+    @staticmethod
+    def _bump_snapshot_version(conn: sqlite3.Connection, account_id: int, delta: Optional[int] = None):
+        """
+        Mark the follower set of an account as changed and keep its active
+        follower count in step: adjusted by `delta`, or recounted when None.
+        """
+        if delta is None:
+            conn.execute('''
+            UPDATE accounts SET snapshot_version = snapshot_version + 1,
+                active_followers = (
+                    SELECT COUNT(*) FROM followers WHERE account_id = ? AND removed_at IS NULL
+                )
+            WHERE id = ?
+            ''', (account_id, account_id))
+        else:
+            conn.execute(
+                "UPDATE accounts SET snapshot_version = snapshot_version + 1, "
+                "active_followers = active_followers + ? WHERE id = ?",
+                (delta, account_id)
+            )
+
+    @staticmethod
+    def _begin_sync(conn: sqlite3.Connection, account_id: int):
+        conn.execute("DELETE FROM temp.sync_seen WHERE account_id = ?", (account_id,))
+        conn.execute("INSERT OR REPLACE INTO temp.sync_runs (account_id) VALUES (?)", (account_id,))
+
+    @staticmethod
+    def _finish_sync(conn: sqlite3.Connection, account_id: int, complete: bool, synced_at: int) -> Optional[int]:
+        """
+        Tombstone followers missing from the seen set and close the sync.
+        Returns the number of tombstoned rows, or None when the seen set was
+        started by another process (resumed crawl) and can not be trusted.
+        """
+        seen_intact = conn.execute(
+            "SELECT 1 FROM temp.sync_runs WHERE account_id = ?", (account_id,)
+        ).fetchone() is not None
+
+        removed = 0 if seen_intact else None
+        if complete and seen_intact:
+            removed = conn.execute('''
+            UPDATE followers
+            SET removed_at = ?, last_seen = (SELECT synced_at FROM accounts WHERE id = ?)
+            WHERE account_id = ? AND removed_at IS NULL
+              AND user_id NOT IN (SELECT user_id FROM temp.sync_seen WHERE account_id = ?)
+            ''', (synced_at, account_id, account_id, account_id)).rowcount
+            if removed:
+                FollowersDatabase._bump_snapshot_version(conn, account_id, -removed)
+            # Only a complete crawl with its whole seen set has tombstoned who left;
+            # one cut short (expected count, page limit) leaves full_synced_at as it was
+            conn.execute("UPDATE accounts SET full_synced_at = ? WHERE id = ?", (synced_at, account_id))
+
+        conn.execute("UPDATE accounts SET synced_at = ? WHERE id = ?", (synced_at, account_id))
+        conn.execute("DELETE FROM temp.sync_seen WHERE account_id = ?", (account_id,))
+        conn.execute("DELETE FROM temp.sync_runs WHERE account_id = ?", (account_id,))
+        return removed
+
+    # --- Crawl checkpoints ---
+
+    async def save_crawl_page(self, user_info: Dict[str, Any], followers: List[Dict[str, Any]],
+                              pagination_token: Optional[str], pages_done: int, rows_saved: int) -> Dict[str, int]:
+        """
+        Persist one crawled page together with the crawl checkpoint.
+
+        The page and the checkpoint are written in the same transaction, so
+        after a restart the crawl continues exactly after the last saved page.
+
+        Args:
+            user_info: Account info of the crawled account
+            followers: Followers from the page
+            pagination_token: Token of the next page (None if this was the last one)
+            pages_done: Number of pages crawled so far, 1 starts a new crawl
+            rows_saved: Number of followers crawled so far
+
+        Returns:
+            Dict with 'added' and 'revived' counts for the page
+        """
+        now = int(time.time())
+        return await self._write(
+            self._save_crawl_page, user_info, followers, pagination_token, pages_done, rows_saved, now, now
+        )
+
+    @classmethod
+    def _save_crawl_page(cls, conn: sqlite3.Connection, user_info, followers, pagination_token,
+                         pages_done, rows_saved, timestamp, updated_at) -> Dict[str, int]:
+        with conn:
+            account_id = cls._upsert_account(conn, user_info, timestamp)
+            if pages_done == 1:
+                cls._begin_sync(conn, account_id)
+            added, revived = cls._stage_followers(conn, account_id, followers)
+
+            conn.execute('''
+            INSERT INTO crawl_checkpoints (account_id, pagination_token, pages_done, rows_saved, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (account_id) DO UPDATE SET
+                pagination_token = excluded.pagination_token,
+                pages_done = excluded.pages_done,
+                rows_saved = excluded.rows_saved,
+                updated_at = excluded.updated_at
+            ''', (account_id, pagination_token, pages_done, rows_saved, updated_at))
+
+        return {'added': added, 'revived': revived}
+
+    async def finish_crawl(self, username: str, complete: bool) -> Optional[int]:
+        """
+        Close a checkpointed crawl and drop its checkpoint
+
+        Args:
+            username: Crawled Instagram username
+            complete: Whether the crawl reached the end of the list
+
+        Returns:
+            Number of followers tombstoned, None if tombstoning was skipped
+            because the crawl was resumed from another process
+        """
+        return await self._write(self._finish_crawl, username, complete, int(time.time()))
+
+    @classmethod
+    def _finish_crawl(cls, conn: sqlite3.Connection, username, complete, synced_at) -> Optional[int]:
+        with conn:
+            row = conn.execute("SELECT id FROM accounts WHERE username = ?", (username,)).fetchone()
+            if not row:
+                return None
+            account_id = row[0]
+            removed = cls._finish_sync(conn, account_id, complete, synced_at)
+            conn.execute("DELETE FROM crawl_checkpoints WHERE account_id = ?", (account_id,))
+        return removed
+
+    async def discard_crawl_checkpoint(self, username: str):
+        """Drop a crawl checkpoint without touching the snapshot"""
+        await self._write(self._discard_crawl_checkpoint, username)
+
+    @staticmethod
+    def _discard_crawl_checkpoint(conn: sqlite3.Connection, username: str):
+        with conn:
+            conn.execute('''
+            DELETE FROM crawl_checkpoints
+            WHERE account_id = (SELECT id FROM accounts WHERE username = ?)
+            ''', (username,))
+
+    # --- Export artifacts ---
+
+    ARTIFACT_COLUMNS = ('username', 'format', 'snapshot_version', 'path', 'rows', 'size', 'file_id',
+                        'created_at', 'last_used')
+
+    async def store_export_artifact(self, artifact: Dict[str, Any]):
+        """
+        Insert or update a cached export file
+
+        Args:
+            artifact: Dict with the keys of ARTIFACT_COLUMNS
+        """
+        await self._write(self._store_export_artifact, artifact)
+
+    @staticmethod
+    def _store_export_artifact(conn: sqlite3.Connection, artifact: Dict[str, Any]):
+        with conn:
+            conn.execute('''
+            INSERT INTO export_artifacts
+                (account_id, format, snapshot_version, path, rows, size, file_id, created_at, last_used)
+            SELECT id, :format, :snapshot_version, :path, :rows, :size, :file_id, :created_at, :last_used
+            FROM accounts WHERE username = :username
+            ON CONFLICT (account_id, format, snapshot_version) DO UPDATE SET
+                path = excluded.path, rows = excluded.rows, size = excluded.size,
+                file_id = excluded.file_id, last_used = excluded.last_used
+            ''', artifact)
+
+    async def delete_export_artifact(self, username: str, export_format: str, snapshot_version: int):
+        """Forget a cached export file"""
+        await self._write(self._delete_export_artifact, username, export_format, snapshot_version)
+
+    @staticmethod
+    def _delete_export_artifact(conn: sqlite3.Connection, username: str, export_format: str,
+                                snapshot_version: int):
+        with conn:
+            conn.execute('''
+            DELETE FROM export_artifacts
+            WHERE account_id = (SELECT id FROM accounts WHERE username = ?)
+              AND format = ? AND snapshot_version = ?
+            ''', (username, export_format, snapshot_version))
+
+    async def get_export_artifacts(self, username: Optional[str] = None, export_format: Optional[str] = None,
+                                   snapshot_version: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Get cached export files, all of them when no filter is given
+
+        Returns:
+            List of dicts with the keys of ARTIFACT_COLUMNS and 'current_version',
+            the current snapshot version of the account, least recently used first
+        """
+        return await self._read(self._get_export_artifacts, username, export_format, snapshot_version)
+
+    @classmethod
+    def _get_export_artifacts(cls, conn: sqlite3.Connection, username, export_format,
+                              snapshot_version) -> List[Dict[str, Any]]:
+        cursor = conn.execute('''
+        SELECT a.username, e.format, e.snapshot_version, e.path, e.rows, e.size, e.file_id,
+               e.created_at, e.last_used, a.snapshot_version
+        FROM export_artifacts e
+        JOIN accounts a ON a.id = e.account_id
+        WHERE (:username IS NULL OR a.username = :username)
+          AND (:format IS NULL OR e.format = :format)
+          AND (:version IS NULL OR e.snapshot_version = :version)
+        ORDER BY e.last_used
+        ''', {'username': username, 'format': export_format, 'version': snapshot_version})
+
+        return [dict(zip(cls.ARTIFACT_COLUMNS + ('current_version',), row)) for row in cursor]
+
+    # --- Following ---
+
+    async def begin_following(self, username: str) -> int:
+        """
+        Start a following crawl
+
+        Returns:
+            run_at for save_following_page: the current time, or later than
+            every stored edge of the account when crawls follow each other
+            within a second, so the crawl's edges are always its own
+        """
+        return await self._read(self._begin_following, username, int(time.time()))
+
+    @staticmethod
+    def _begin_following(conn: sqlite3.Connection, username: str, now: int) -> int:
+        last = conn.execute('''
+        SELECT MAX(g.synced_at)
+        FROM following g
+        JOIN accounts a ON a.id = g.account_id
+        WHERE a.username = ?
+        ''', (username,)).fetchone()[0]
+        return max(now, (last or 0) + 1)
+
+    async def save_following_page(self, user_info: Dict[str, Any], following: List[Dict[str, Any]],
+                                  run_at: int) -> int:
+        """
+        Store one crawled page of the accounts an account follows
+
+        Args:
+            user_info: Account info of the crawled account
+            following: Followed accounts from the page
+            run_at: Stamp from begin_following, marks the edges the crawl has seen
+
+        Returns:
+            Number of edges written
+        """
+        return await self._write(self._save_following_page, user_info, following, run_at, int(time.time()))
+
+    @classmethod
+    def _save_following_page(cls, conn: sqlite3.Connection, user_info, following, run_at, timestamp) -> int:
+        written = 0
+        with conn:
+            account_id = cls._upsert_account(conn, user_info, timestamp)
+            for users, ids in cls._iter_chunks(following):
+                cls._upsert_users(conn, users)
+                conn.executemany('''
+                INSERT INTO following (account_id, user_id, synced_at) VALUES (?, ?, ?)
+                ON CONFLICT (account_id, user_id) DO UPDATE SET synced_at = excluded.synced_at
+                ''', [(account_id, user_id, run_at) for user_id in sorted(ids)])
+                written += len(ids)
+        return written
+
+    async def finish_following(self, username: str, run_at: int, complete: bool) -> Optional[int]:
+        """
+        Close a following crawl
+
+        Args:
+            username: Crawled Instagram username
+            run_at: Stamp of the crawl, as passed to save_following_page
+            complete: Whether the crawl reached the end of the list. Edges it
+                did not see are only dropped after a complete crawl.
+
+        Returns:
+            Number of edges dropped, None if the account is not stored
+        """
+        return await self._write(self._finish_following, username, run_at, complete)
+
+    @staticmethod
+    def _finish_following(conn: sqlite3.Connection, username: str, run_at: int, complete: bool) -> Optional[int]:
+        with conn:
+            row = conn.execute("SELECT id FROM accounts WHERE username = ?", (username,)).fetchone()
+            if not row:
+                return None
+            if not complete:
+                return 0
+            removed = conn.execute(
+                "DELETE FROM following WHERE account_id = ? AND synced_at < ?", (row[0], run_at)
+            ).rowcount
+            conn.execute("UPDATE accounts SET following_synced_at = ? WHERE id = ?", (run_at, row[0]))
+        return removed
+
+    async def get_follow_report(self, username: str, limit: int = 20) -> Optional[Dict[str, Any]]:
+        """
+        Mutual follows of an account from the stored followers and following
+
+        Both edge tables are keyed by (account_id, user_id), so the report is
+        a primary key join: one index probe per followed account, no list
+        scans, however many followers the account has.
+
+        Args:
+            username: Instagram username
+            limit: Usernames listed per group
+
+        Returns:
+            Dict with 'followers', 'following', 'mutual', 'not_following_back'
+            (followed but not following back) and 'fans' (following but not
+            followed back) counts, plus 'not_following_back_users' and
+            'fans_users' lists of up to `limit` usernames; None if the account
+            is not stored
+        """
+        return await self._read(self._get_follow_report, username, limit)
+
+    @staticmethod
+    def _get_follow_report(conn: sqlite3.Connection, username: str, limit: int) -> Optional[Dict[str, Any]]:
+        row = conn.execute(
+            "SELECT id, COALESCE(active_followers, 0) FROM accounts WHERE username = ?", (username,)
+        ).fetchone()
+        if not row:
+            return None
+        account_id, followers = row
+
+        following, mutual = conn.execute('''
+        SELECT COUNT(*), COUNT(f.user_id)
+        FROM following g
+        LEFT JOIN followers f
+          ON f.account_id = g.account_id AND f.user_id = g.user_id AND f.removed_at IS NULL
+        WHERE g.account_id = ?
+        ''', (account_id,)).fetchone()
+
+        not_following_back_users = [row[0] for row in conn.execute('''
+        SELECT u.username
+        FROM following g
+        JOIN users u ON u.id = g.user_id
+        WHERE g.account_id = ? AND NOT EXISTS (
+            SELECT 1 FROM followers f
+            WHERE f.account_id = g.account_id AND f.user_id = g.user_id AND f.removed_at IS NULL
+        )
+        ORDER BY u.username
+        LIMIT ?
+        ''', (account_id, limit))]
+
+        # Followers in crawl order (newest first), stops after `limit` matches
+        fans_users = [row[0] for row in conn.execute('''
+        SELECT u.username
+        FROM followers f
+        JOIN users u ON u.id = f.user_id
+        WHERE f.account_id = ? AND f.removed_at IS NULL AND NOT EXISTS (
+            SELECT 1 FROM following g WHERE g.account_id = f.account_id AND g.user_id = f.user_id
+        )
+        ORDER BY f.position
+        LIMIT ?
+        ''', (account_id, limit))]
+
+        return {
+            'followers': followers,
+            'following': following,
+            'mutual': mutual,
+            'not_following_back': following - mutual,
+            'fans': max(0, followers - mutual),
+            'not_following_back_users': not_following_back_users,
+            'fans_users': fans_users,
+        }
+
+    # --- Tracked accounts ---
+
+    async def track_account(self, username: str, weight: float = 1.0, added_by: Optional[int] = None):
+        """Register an account (or change its crawl weight)"""
+        await self._write(self._track_account, username, weight, added_by, int(time.time()))
+
+    @staticmethod
+    def _track_account(conn: sqlite3.Connection, username: str, weight: float, added_by: Optional[int],
+                       added_at: int):
+        with conn:
+            conn.execute('''
+            INSERT INTO tracked_accounts (username, weight, added_by, added_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (username) DO UPDATE SET weight = excluded.weight
+            ''', (username, weight, added_by, added_at))
+
+    async def untrack_account(self, username: str) -> bool:
+        """
+        Unregister an account, its snapshot stays in the database
+
+        Returns:
+            False if the account was not tracked
+        """
+        return await self._write(self._untrack_account, username)
+
+    @staticmethod
+    def _untrack_account(conn: sqlite3.Connection, username: str) -> bool:
+        with conn:
+            return conn.execute("DELETE FROM tracked_accounts WHERE username = ?", (username,)).rowcount > 0
+
+    async def get_crawl_weights(self) -> Dict[str, float]:
+        """Crawl scheduler weights of the registered accounts"""
+        return await self._read(self._get_crawl_weights)
+
+    @staticmethod
+    def _get_crawl_weights(conn: sqlite3.Connection) -> Dict[str, float]:
+        return dict(conn.execute("SELECT username, weight FROM tracked_accounts"))
+
+    async def get_tracked_accounts(self) -> List[Dict[str, Any]]:
+        """
+        Registered accounts in registration order
+
+        Returns:
+            List of dicts with username, weight, added_at, followers_count,
+            active_followers and synced_at (None before the first crawl)
+        """
+        return await self._read(self._get_tracked_accounts)
+
+    @staticmethod
+    def _get_tracked_accounts(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+        cursor = conn.execute('''
+        SELECT t.username, t.weight, t.added_at, a.followers_count, a.active_followers, a.synced_at
+        FROM tracked_accounts t
+        LEFT JOIN accounts a ON a.username = t.username
+        ORDER BY t.added_at, t.username
+        ''')
+        columns = ('username', 'weight', 'added_at', 'followers_count', 'active_followers', 'synced_at')
+        return [dict(zip(columns, row)) for row in cursor]
+
+    # --- Profile cache store ---
+
+    async def store_profile(self, username: str, profile: Dict[str, Any], fetched_at: float):
+        """Persist a cached profile (ProfileCache store)"""
+        await self._write(self._store_profile, username, json.dumps(profile), fetched_at)
+
+    @staticmethod
+    def _store_profile(conn: sqlite3.Connection, username: str, profile_json: str, fetched_at: float):
+        with conn:
+            conn.execute('''
+            INSERT INTO profile_cache (username, profile, fetched_at) VALUES (?, ?, ?)
+            ON CONFLICT (username) DO UPDATE SET profile = excluded.profile, fetched_at = excluded.fetched_at
+            ''', (username, profile_json, fetched_at))
+
+    async def load_profile(self, username: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Load a cached profile and its fetch time (ProfileCache store)"""
+        row = await self._read(self._load_profile, username)
+        if not row:
+            return None
+        return json.loads(row[0]), row[1]
+
+    @staticmethod
+    def _load_profile(conn: sqlite3.Connection, username: str):
+        return conn.execute(
+            "SELECT profile, fetched_at FROM profile_cache WHERE username = ?", (username,)
+        ).fetchone()
+
+    # --- Reads ---
+
+    async def get_account_info(self, username: str) -> Optional[Dict[str, Any]]:
+        """
+        Get stored account info
+
+        Args:
+            username: Instagram username
+
+        Returns:
+            Dict with account info or None if the account is not stored
+        """
+        return await self._read(self._get_account_info, username)
+
+    @staticmethod
+    def _get_account_info(conn: sqlite3.Connection, username: str) -> Optional[Dict[str, Any]]:
+        result = conn.execute('''
+        SELECT username, followers_count, full_name, following_count, posts_count, bio, update_timestamp,
+               synced_at, full_synced_at, following_synced_at
+        FROM accounts
+        WHERE username = ?
+        ''', (username,)).fetchone()
+
+        if not result:
+            return None
+
+        return {
+            'username': result[0],
+            'followers_count': result[1],
+            'full_name': result[2],
+            'following_count': result[3],
+            'posts_count': result[4],
+            'bio': result[5],
+            'update_timestamp': result[6],
+            'synced_at': result[7],
+            'full_synced_at': result[8],
+            'following_synced_at': result[9]
+        }
+
+    async def get_followers(self, username: str) -> List[FollowerRecord]:
+        """
+        Get stored followers of an account
+
+        Args:
+            username: Instagram username
+
+        Returns:
+            List of FollowerRecord in crawl order
+        """
+        return await self._read(self._get_followers, username)
+
+    async def get_snapshot_version(self, username: str) -> Optional[int]:
+        """
+        Get the current snapshot version of an account
+
+        Args:
+            username: Instagram username
+
+        Returns:
+            Version that changes whenever the stored follower set changes,
+            None if the account is not stored
+        """
+        return await self._read(self._get_snapshot_version, username)
+
+    @staticmethod
+    def _get_snapshot_version(conn: sqlite3.Connection, username: str) -> Optional[int]:
+        row = conn.execute("SELECT snapshot_version FROM accounts WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+
+    async def get_snapshot(self, username: str) -> Optional[Tuple[int, List[FollowerRecord]]]:
+        """
+        Get the current snapshot version and followers of an account, read consistently
+
+        Args:
+            username: Instagram username
+
+        Returns:
+            Tuple of (snapshot version, list of FollowerRecord) or None if the account is not stored
+        """
+        return await self._read(self._get_snapshot, username)
+
+    @classmethod
+    def _get_snapshot(cls, conn: sqlite3.Connection, username: str) -> Optional[Tuple[int, List[FollowerRecord]]]:
+        # One read transaction, so the version matches the rows under WAL
+        conn.execute("BEGIN")
+        try:
+            version = cls._get_snapshot_version(conn, username)
+            if version is None:
+                return None
+            return version, cls._get_followers(conn, username)
+        finally:
+            conn.execute("COMMIT")
+
+    async def get_follower_at(self, username: str, ordinal: Callable[[int], int]
+                              ) -> Optional[Tuple[int, int, int, FollowerRecord]]:
+        """
+        Pick one active follower by its ordinal without loading the list
+
+        Args:
+            username: Instagram username
+            ordinal: Function mapping the active follower count to a 0-based ordinal,
+                called inside the read transaction
+
+        Returns:
+            Tuple of (snapshot version, active follower count, ordinal, FollowerRecord)
+            or None if the account has no active followers
+        """
+        return await self._read(self._get_follower_at, username, ordinal)
+
+    @staticmethod
+    def _get_follower_at(conn: sqlite3.Connection, username: str, ordinal: Callable[[int], int]):
+        conn.execute("BEGIN")
+        try:
+            account = conn.execute(
+                "SELECT id, snapshot_version, active_followers FROM accounts WHERE username = ?", (username,)
+            ).fetchone()
+            if not account or not account[2]:
+                return None
+            account_id, version, total = account
+            index = ordinal(total)
+
+            # Without tombstones positions are dense: one index seek on idx_followers_active.
+            # Otherwise skip over the covering index, which never touches the table.
+            first, last = conn.execute(
+                "SELECT MIN(position), MAX(position) FROM followers WHERE account_id = ? AND removed_at IS NULL",
+                (account_id,)
+            ).fetchone()
+            if last - first + 1 == total:
+                row = conn.execute('''
+                SELECT u.id, u.username, u.full_name
+                FROM followers f
+                JOIN users u ON u.id = f.user_id
+                WHERE f.account_id = ? AND f.position = ? AND f.removed_at IS NULL
+                ''', (account_id, first + index)).fetchone()
+            else:
+                row = conn.execute('''
+                SELECT u.id, u.username, u.full_name
+                FROM followers f
+                JOIN users u ON u.id = f.user_id
+                WHERE f.account_id = ? AND f.removed_at IS NULL
+                ORDER BY f.position
+                LIMIT 1 OFFSET ?
+                ''', (account_id, index)).fetchone()
+            if not row:
+                return None
+            return version, total, index, FollowerRecord(*row)
+        finally:
+            conn.execute("COMMIT")
+
+    async def record_draw(self, username: str, draw: Dict[str, Any]):
+        """
+        Record a winner draw so that it can be replayed from its seed
+
+        Args:
+            username: Instagram username
+            draw: Dict with 'seed', 'method', 'snapshot_version', 'total', 'ordinal', 'user_id', 'drawn_at'
+        """
+        await self._write(self._record_draw, username, draw)
+
+    @staticmethod
+    def _record_draw(conn: sqlite3.Connection, username: str, draw: Dict[str, Any]):
+        with conn:
+            # A stream draw may come before the account was ever stored
+            conn.execute("INSERT OR IGNORE INTO accounts (username) VALUES (?)", (username,))
+            conn.execute('''
+            INSERT INTO draws (account_id, seed, method, snapshot_version, total, ordinal, user_id, drawn_at)
+            SELECT id, ?, ?, ?, ?, ?, ?, ? FROM accounts WHERE username = ?
+            ''', (draw['seed'], draw['method'], draw['snapshot_version'], draw['total'], draw['ordinal'],
+                  draw['user_id'], draw['drawn_at'], username))
+
+    @staticmethod
+    def _get_followers(conn: sqlite3.Connection, username: str) -> List[FollowerRecord]:
+        cursor = conn.execute('''
+        SELECT u.id, u.username, u.full_name
+        FROM accounts a
+        JOIN followers f ON f.account_id = a.id
+        JOIN users u ON u.id = f.user_id
+        WHERE a.username = ? AND f.removed_at IS NULL
+        ORDER BY f.position
+        ''', (username,))
+
+        return [FollowerRecord(*row) for row in cursor]
+
+    async def get_crawl_checkpoint(self, username: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the checkpoint of an unfinished crawl
+
+        Args:
+            username: Instagram username
+
+        Returns:
+            Dict with 'username', 'pagination_token', 'pages_done', 'rows_saved',
+            'updated_at' or None if there is no unfinished crawl
+        """
+        checkpoints = await self._read(self._get_crawl_checkpoints, username)
+        return checkpoints[0] if checkpoints else None
+
+    async def get_crawl_checkpoints(self) -> List[Dict[str, Any]]:
+        """Get checkpoints of all unfinished crawls"""
+        return await self._read(self._get_crawl_checkpoints, None)
+
+    @staticmethod
+    def _get_crawl_checkpoints(conn: sqlite3.Connection, username: Optional[str]) -> List[Dict[str, Any]]:
+        cursor = conn.execute('''
+        SELECT a.username, c.pagination_token, c.pages_done, c.rows_saved, c.updated_at
+        FROM crawl_checkpoints c
+        JOIN accounts a ON a.id = c.account_id
+        WHERE ? IS NULL OR a.username = ?
+        ''', (username, username))
+
+        return [
+            {
+                'username': row[0],
+                'pagination_token': row[1],
+                'pages_done': row[2],
+                'rows_saved': row[3],
+                'updated_at': row[4]
+            }
+            for row in cursor
+        ]
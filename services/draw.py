@@ -0,0 +1,230 @@
+import math
+import random
+import secrets
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, Dict, Generic, List, Optional, TypeVar
+
+from services.crawler import FollowerCrawler
+from services.database import FollowersDatabase
+from services.records import FollowerRecord
+from services.snapshots import SnapshotStore
+
+T = TypeVar('T')
+
+
+@dataclass
+class Draw:
+    account: str
+    seed: int
+    method: str
+    total: int
+    # 1-based position of the winner in the snapshot or stream
+    ordinal: int
+    winner: FollowerRecord
+    snapshot_version: Optional[int] = None
+    drawn_at: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'seed': self.seed,
+            'method': self.method,
+            'snapshot_version': self.snapshot_version,
+            'total': self.total,
+            'ordinal': self.ordinal,
+            'user_id': self.winner.id,
+            'drawn_at': self.drawn_at,
+        }
+
+
+class ReservoirSampler(Generic[T]):
+    """
+    Uniform sample of `k` items from a stream of unknown length in O(k) memory.
+
+    Uses Algorithm L: after the reservoir is full, the number of items to
+    skip until the next replacement is drawn directly, so most items of a
+    long stream cost one comparison. The sample only depends on the seed
+    and the order of the stream.
+    """
+
+    def __init__(self, k: int = 1, rng: Optional[random.Random] = None):
+        self.k = k
+        self.rng = rng or random.Random()
+        self.seen = 0
+        self.items: List[T] = []
+        # 0-based stream positions of the sampled items
+        self.ordinals: List[int] = []
+        self._weight = 1.0
+        self._next = 0
+
+    def _schedule(self):
+        self._weight *= math.exp(math.log(self._random()) / self.k)
+        self._next += int(math.log(self._random()) / math.log(1 - self._weight)) + 1
+
+    def _random(self) -> float:
+        # random() may return 0.0, log needs a positive value
+        return self.rng.random() or 1e-300
+
+    def add(self, item: T):
+        if self.seen < self.k:
+            self.items.append(item)
+            self.ordinals.append(self.seen)
+            self.seen += 1
+            if self.seen == self.k:
+                self._next = self.k - 1
+                self._schedule()
+            return
+
+        if self.seen == self._next:
+            slot = self.rng.randrange(self.k)
+            self.items[slot] = item
+            self.ordinals[slot] = self.seen
+            self._schedule()
+        self.seen += 1
+
+    def extend(self, items: List[T]):
+        start = 0
+        # Jump straight to the next replacement inside the page
+        while self.seen >= self.k and start < len(items):
+            skip = self._next - self.seen
+            if skip >= len(items) - start:
+                self.seen += len(items) - start
+                return
+            start += skip
+            self.seen += skip
+            self.add(items[start])
+            start += 1
+        for item in items[start:]:
+            self.add(item)
+
+
+class DrawEngine:
+    """
+    Winner draws.
+
+    A draw picks a 0-based ordinal with `random.Random(seed).randrange(total)`
+    and takes the follower at that ordinal: from the shared snapshot when it
+    is in memory, otherwise with an index lookup in the database. Accounts
+    the snapshot can not cover (none stored, or more followers than a crawl
+    keeps within its page limit) are drawn from a follower stream with
+    reservoir sampling when a crawler is given. Every draw is recorded with
+    its seed, so it can be replayed.
+    """
+
+    def __init__(self, database: FollowersDatabase, snapshots: SnapshotStore,
+                 crawler: Optional[FollowerCrawler] = None):
+        self.database = database
+        self.snapshots = snapshots
+        # Streams follower pages with the crawl's API, page size and scheduler
+        self.crawler = crawler
+
+    @staticmethod
+    def new_seed() -> int:
+        return secrets.randbits(63)
+
+    @staticmethod
+    def replay_ordinal(seed: int, total: int) -> int:
+        """1-based ordinal a snapshot draw with this seed picks out of `total` followers"""
+        return random.Random(seed).randrange(total) + 1
+
+    def needs_stream(self, user_info: Optional[Dict[str, Any]], handle: Optional[Dict[str, Any]]) -> bool:
+        """Whether a draw has to stream the followers: no snapshot, or one cut short by the crawl page limit"""
+        if self.crawler is None or not user_info:
+            return False
+        limit = self.crawler.max_pages * self.crawler.page_size
+        return handle is None or (user_info.get('followers_count') or 0) > limit
+
+    async def draw_account(self, user_info: Optional[Dict[str, Any]], handle: Optional[Dict[str, Any]] = None,
+                           seed: Optional[int] = None) -> Optional[Draw]:
+        """
+        Draw a winner from the whole follower list of an account
+
+        Args:
+            user_info: Account info as returned by InstagramAPI.get_user_info
+            handle: Snapshot handle from FSM state
+            seed: Seed to reproduce a draw, a new one is generated when None
+
+        Returns:
+            Draw or None if there are no followers to draw from
+        """
+        if self.needs_stream(user_info, handle):
+            return await self.draw_from_stream(user_info['username'], self._stream_pages(user_info), seed)
+        if not handle:
+            return None
+        return await self.draw(handle['account'], handle, seed)
+
+    def _stream_pages(self, user_info: Dict[str, Any]) -> AsyncIterable[Dict[str, Any]]:
+        crawler = self.crawler
+        username = user_info['username']
+        # The list may grow while it is streamed
+        max_pages = -(-(user_info.get('followers_count') or 0) * 11 // 10 // crawler.page_size) + 1
+        return crawler.instagram_api.iter_follower_pages(
+            username, max_pages=max_pages, prefetch=crawler.pipeline_depth,
+            page_size=crawler.page_size, page_delay=crawler.page_delay,
+            slot=lambda: crawler.scheduler.slot(username)
+        )
+
+    async def draw(self, account: str, handle: Optional[Dict[str, Any]] = None,
+                   seed: Optional[int] = None) -> Optional[Draw]:
+        """
+        Draw a winner from the stored followers of an account
+
+        Args:
+            account: Instagram username
+            handle: Snapshot handle from FSM state, draws from the snapshot the user saw
+                while it is still in memory
+            seed: Seed to reproduce a draw, a new one is generated when None
+
+        Returns:
+            Draw or None if the account has no stored followers
+        """
+        seed = self.new_seed() if seed is None else seed
+        rng = random.Random(seed)
+
+        snapshot = self.snapshots.peek(account, handle['version']) if handle else None
+        if snapshot is not None and len(snapshot):
+            index = rng.randrange(len(snapshot))
+            draw = Draw(account, seed, 'snapshot', len(snapshot), index + 1, snapshot.followers[index],
+                        snapshot.version)
+        else:
+            row = await self.database.get_follower_at(account, rng.randrange)
+            if row is None:
+                return None
+            version, total, index, winner = row
+            draw = Draw(account, seed, 'snapshot', total, index + 1, winner, version)
+
+        return await self._record(draw)
+
+    async def draw_from_stream(self, account: str, pages: AsyncIterable[Dict[str, Any]],
+                               seed: Optional[int] = None) -> Optional[Draw]:
+        """
+        Draw a winner while streaming followers, without keeping them
+
+        Args:
+            account: Instagram username
+            pages: Follower pages, e.g. InstagramAPI.iter_follower_pages
+            seed: Seed to reproduce a draw over the same stream
+
+        Returns:
+            Draw or None if the stream was empty
+        """
+        seed = self.new_seed() if seed is None else seed
+        sampler: ReservoirSampler = ReservoirSampler(1, random.Random(seed))
+        async for page in pages:
+            sampler.extend(page['followers'])
+
+        if not sampler.items:
+            return None
+        winner = sampler.items[0]
+        if not isinstance(winner, FollowerRecord):
+            winner = FollowerRecord.from_api(winner)
+        draw = Draw(account, seed, 'stream', sampler.seen, sampler.ordinals[0] + 1, winner)
+        return await self._record(draw)
+
+    async def _record(self, draw: Draw) -> Draw:
+        draw.drawn_at = time.time()
+        try:
+            await self.database.record_draw(draw.account, draw.to_dict())
+        except Exception as e:
+            print(f"Error recording draw: {e}")
+        return draw
@@ -0,0 +1,372 @@
+import asyncio
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from services.database import FollowersDatabase
+from services.records import PROFILE_URL_PREFIX
+
+XLSX_HEADERS = ["№", "Username", "Instagram Link", "ID"]
+
+# Write-only sheets need column widths before any row is written. The
+# values are bounded: Instagram usernames have at most 30 characters, the
+# link is the profile prefix plus the username, ids are 64-bit.
+USERNAME_MAX_LENGTH = 30
+XLSX_COLUMN_WIDTHS = [
+    len("10000000"),
+    USERNAME_MAX_LENGTH,
+    len(PROFILE_URL_PREFIX) + USERNAME_MAX_LENGTH,
+    len(str(2 ** 63)),
+]
+WIDTH_PADDING = 5
+
+# Rows fetched from the cursor and written per step
+EXPORT_CHUNK_SIZE = 5000
+
+
+def iter_follower_chunks(conn: sqlite3.Connection, username: str, arraysize: int = EXPORT_CHUNK_SIZE
+                         ) -> Iterator[List[Tuple[int, str]]]:
+    """Stream (id, username) of the active followers of an account in crawl order, in chunks"""
+    cursor = conn.execute('''
+    SELECT u.id, u.username
+    FROM accounts a
+    JOIN followers f ON f.account_id = a.id
+    JOIN users u ON u.id = f.user_id
+    WHERE a.username = ? AND f.removed_at IS NULL
+    ORDER BY f.position
+    ''', (username,))
+    while True:
+        rows = cursor.fetchmany(arraysize)
+        if not rows:
+            break
+        yield rows
+
+
+def _table_rows(rows: Iterator[Tuple[int, str]]) -> Iterator[list]:
+    for number, (user_id, username) in enumerate(rows, 1):
+        yield [number, username, PROFILE_URL_PREFIX + username, user_id]
+
+
+def write_followers_xlsx(rows: Iterator[Tuple[int, str]], file_path: str) -> int:
+    """
+    Write followers to an .xlsx file in openpyxl write-only mode
+
+    Rows are streamed to the file, memory stays flat whatever the row count.
+    Column widths come from the bounds of the values (XLSX_COLUMN_WIDTHS).
+
+    Args:
+        rows: (id, username) tuples in export order
+        file_path: Destination path
+
+    Returns:
+        Number of exported followers
+    """
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Obunachilar")
+
+    for index, (title, width) in enumerate(zip(XLSX_HEADERS, XLSX_COLUMN_WIDTHS), 1):
+        worksheet.column_dimensions[get_column_letter(index)].width = max(len(title), width) + WIDTH_PADDING
+
+    header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
+    header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
+    header_alignment = Alignment(horizontal='center', vertical='center')
+    header = []
+    for title in XLSX_HEADERS:
+        cell = WriteOnlyCell(worksheet, value=title)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        header.append(cell)
+    worksheet.append(header)
+
+    count = 0
+    for row in _table_rows(rows):
+        worksheet.append(row)
+        count += 1
+
+    workbook.save(file_path)
+    return count
+
+
+def write_followers_csv(chunks: Iterator[List[Tuple[int, str]]], file_path: str) -> int:
+    """
+    Write followers to a CSV file, one chunk at a time
+
+    UTF-8 with a BOM so that Excel opens it with the right encoding.
+
+    Returns:
+        Number of exported followers
+    """
+    count = 0
+    with open(file_path, "w", newline="", encoding="utf-8-sig") as file:
+        writer = csv.writer(file)
+        writer.writerow(XLSX_HEADERS)
+        for chunk in chunks:
+            writer.writerows(
+                (count + number, username, PROFILE_URL_PREFIX + username, user_id)
+                for number, (user_id, username) in enumerate(chunk, 1)
+            )
+            count += len(chunk)
+    return count
+
+
+def write_followers_jsonl_gz(chunks: Iterator[List[Tuple[int, str]]], file_path: str) -> int:
+    """
+    Write followers to gzip-compressed JSON Lines, one object per follower
+
+    Returns:
+        Number of exported followers
+    """
+    count = 0
+    dumps = json.dumps
+    with gzip.open(file_path, "wt", encoding="utf-8", compresslevel=6) as file:
+        for chunk in chunks:
+            file.write("".join(
+                f'{{"n":{count + number},"id":{user_id},"username":{dumps(username)},'
+                f'"link":{dumps(PROFILE_URL_PREFIX + username)}}}\n'
+                for number, (user_id, username) in enumerate(chunk, 1)
+            ))
+            count += len(chunk)
+    return count
+
+
+# format -> (writer taking (id, username) chunks, file suffix)
+EXPORT_FORMATS: Dict[str, Tuple[Callable[[Iterator[List[Tuple[int, str]]], str], int], str]] = {
+    "xlsx": (lambda chunks, path: write_followers_xlsx(chain.from_iterable(chunks), path), ".xlsx"),
+    "csv": (write_followers_csv, ".csv"),
+    "jsonl": (write_followers_jsonl_gz, ".jsonl.gz"),
+}
+
+
+def export_followers(db_path: str, username: str, file_path: str,
+                     export_format: str = "xlsx") -> Tuple[int, Optional[int]]:
+    """
+    Export the stored followers of an account straight from the database cursor
+
+    Module level so that it can run in a process pool. Opens its own
+    read-only connection, the bot's reader pool is not tied up.
+
+    Args:
+        db_path: Path of the SQLite database
+        username: Instagram username
+        file_path: Destination path
+        export_format: One of EXPORT_FORMATS
+
+    Returns:
+        Tuple of (number of exported followers, snapshot version of the exported rows)
+    """
+    writer, _ = EXPORT_FORMATS[export_format]
+    # as_uri() escapes '?', '#' and '%' in the path, which would end the URI path
+    conn = sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        # One read transaction, so the version matches the exported rows under WAL
+        conn.execute("BEGIN")
+        row = conn.execute("SELECT snapshot_version FROM accounts WHERE username = ?", (username,)).fetchone()
+        count = writer(iter_follower_chunks(conn, username), file_path)
+        conn.execute("COMMIT")
+        return count, row[0] if row else None
+    finally:
+        conn.close()
+
+
+class ExportEngine:
+    """
+    Builds export files off the event loop.
+
+    Jobs run in a small thread pool, or a process pool when `use_processes`
+    is set, so that workbook generation does not hold the bot's GIL. Every
+    export gets its own temp file; the caller removes it after sending.
+    """
+
+    def __init__(self, db_path: str, max_workers: int = 2, use_processes: bool = False,
+                 directory: Optional[str] = None):
+        self.db_path = db_path
+        self.directory = directory
+        self._executor: Executor = (
+            ProcessPoolExecutor(max_workers=max_workers) if use_processes
+            else ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export")
+        )
+
+    def _temp_path(self, username: str, suffix: str) -> str:
+        fd, path = tempfile.mkstemp(prefix=f"{username}_followers_", suffix=suffix, dir=self.directory)
+        os.close(fd)
+        return path
+
+    async def export(self, username: str, export_format: str = "xlsx") -> Tuple[str, int, Optional[int]]:
+        """
+        Export the stored followers of an account
+
+        Args:
+            username: Instagram username
+            export_format: "xlsx", "csv" or "jsonl" (gzip-compressed)
+
+        Returns:
+            Tuple of (temp file path, number of exported followers, snapshot version)
+        """
+        path = self._temp_path(username, EXPORT_FORMATS[export_format][1])
+        loop = asyncio.get_running_loop()
+        try:
+            count, version = await loop.run_in_executor(
+                self._executor, export_followers, self.db_path, username, path, export_format
+            )
+        except BaseException:
+            remove_file(path)
+            raise
+        return path, count, version
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class ExportCache:
+    """
+    On-disk cache of export files keyed by (account, format, snapshot version).
+
+    A snapshot version only changes when the follower set changes, so a
+    cached file stays valid until the next sync. The Telegram file_id of the
+    first upload is kept as well: repeat exports are re-sent by file_id
+    without building or uploading anything. Files of superseded versions and
+    files older than `max_age` are deleted; beyond `max_bytes` the least
+    recently used files are deleted, their file_id stays usable.
+    """
+
+    def __init__(self, database: FollowersDatabase, engine: ExportEngine, directory: str,
+                 max_bytes: int = 512 * 1024 * 1024, max_age: float = 7 * 24 * 3600):
+        self.database = database
+        self.engine = engine
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._building: Dict[Tuple[str, str], asyncio.Future] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    async def get(self, username: str, export_format: str = "xlsx") -> Optional[Dict[str, Any]]:
+        """
+        Get the export of the current snapshot, building it when it is not cached
+
+        Args:
+            username: Instagram username
+            export_format: One of EXPORT_FORMATS
+
+        Returns:
+            Artifact dict ('path', 'rows', 'file_id', 'snapshot_version', ...) or
+            None if the account is not stored
+        """
+        version = await self.database.get_snapshot_version(username)
+        if version is None:
+            return None
+
+        for artifact in await self.database.get_export_artifacts(username, export_format, version):
+            if artifact['file_id'] or (artifact['path'] and os.path.exists(artifact['path'])):
+                artifact['last_used'] = time.time()
+                await self.database.store_export_artifact(artifact)
+                return artifact
+
+        return await self._build(username, export_format)
+
+    async def remember_file_id(self, artifact: Dict[str, Any], file_id: Optional[str]):
+        """Store the Telegram file_id of an uploaded artifact, None to forget a rejected one"""
+        artifact['file_id'] = file_id
+        await self.database.store_export_artifact(artifact)
+
+    async def _build(self, username: str, export_format: str) -> Dict[str, Any]:
+        # Single-flight: concurrent exports of one account and format share a build
+        key = (username, export_format)
+        future = self._building.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._building[key] = future
+        try:
+            artifact = await self._build_artifact(username, export_format)
+            future.set_result(artifact)
+            return artifact
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so that an unawaited future does not log a warning
+            future.exception()
+            raise
+        finally:
+            del self._building[key]
+
+    async def _build_artifact(self, username: str, export_format: str) -> Dict[str, Any]:
+        temp_path, rows, version = await self.engine.export(username, export_format)
+        path = os.path.join(
+            self.directory, f"{username}_v{version}{EXPORT_FORMATS[export_format][1]}"
+        )
+        os.replace(temp_path, path)
+
+        now = time.time()
+        artifact = {
+            'username': username,
+            'format': export_format,
+            'snapshot_version': version,
+            'path': path,
+            'rows': rows,
+            'size': os.path.getsize(path),
+            'file_id': None,
+            'created_at': now,
+            'last_used': now,
+        }
+        if version is not None:
+            await self.database.store_export_artifact(artifact)
+            await self._evict(artifact)
+        return artifact
+
+    async def _evict(self, fresh: Dict[str, Any]):
+        # The artifact that was just built is about to be sent and is never evicted
+        fresh_key = (fresh['username'], fresh['format'], fresh['snapshot_version'])
+        now = time.time()
+
+        kept = []
+        for artifact in await self.database.get_export_artifacts():
+            if (artifact['username'], artifact['format'], artifact['snapshot_version']) == fresh_key:
+                continue
+            superseded = artifact['snapshot_version'] < artifact['current_version']
+            if superseded or now - artifact['created_at'] > self.max_age:
+                await self._drop(artifact, keep_file_id=False)
+            elif artifact['path']:
+                kept.append(artifact)
+
+        # Artifacts are ordered by last_used, oldest first
+        total = fresh['size'] + sum(artifact['size'] for artifact in kept)
+        for artifact in kept:
+            if total <= self.max_bytes:
+                break
+            total -= artifact['size']
+            await self._drop(artifact, keep_file_id=True)
+
+    async def _drop(self, artifact: Dict[str, Any], keep_file_id: bool):
+        if artifact['path']:
+            remove_file(artifact['path'])
+        if keep_file_id and artifact['file_id']:
+            artifact['path'] = None
+            await self.database.store_export_artifact(artifact)
+        else:
+            await self.database.delete_export_artifact(
+                artifact['username'], artifact['format'], artifact['snapshot_version']
+            )
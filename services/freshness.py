@@ -0,0 +1,100 @@
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Decisions of FreshnessPolicy.decide
+SERVE = "serve"
+INCREMENTAL = "incremental"
+FULL = "full"
+
+
+def parse_hours(value: str) -> Tuple[int, int]:
+    """'1-7' -> (1, 7); the window may wrap midnight ('22-6'), equal ends mean all day"""
+    start, _, end = value.partition("-")
+    return int(start) % 24, int(end or start) % 24
+
+
+def in_hours(hours: Tuple[int, int], timestamp: float) -> bool:
+    """Whether a wall-clock timestamp falls into a local hours window"""
+    hour = time.localtime(timestamp).tm_hour
+    start, end = hours
+    if start == end:
+        return True
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+class FreshnessPolicy:
+    """
+    Decides whether a stored snapshot can be served as it is.
+
+    All ages are wall-clock (accounts.synced_at, the last finished crawl,
+    and accounts.full_synced_at, the last crawl that reached the end of the
+    list), so they survive restarts.
+
+    - FULL: no snapshot yet, the last full crawl is older than
+      `full_max_age`, the follower count dropped by more than the drift
+      threshold (only a full crawl finds who left), or it grew by more
+      than `incremental_max`.
+    - INCREMENTAL: the count grew past the drift threshold, or the snapshot
+      is older than the allowed age. The new followers are at the head of
+      the list, so the crawl stops at the first page with nothing new.
+    - SERVE: otherwise.
+
+    The drift threshold is `drift_abs` followers or `drift_ratio` of the
+    stored count, whichever is smaller. The allowed age is `max_age`,
+    or `peak_max_age` inside the local `peak_hours`, when crawls would
+    compete with interactive traffic for the quota.
+    """
+
+    def __init__(self, max_age: float = 3600, peak_max_age: float = 6 * 3600, peak_hours: Tuple[int, int] = (18, 23),
+                 full_max_age: float = 24 * 3600, drift_abs: int = 500, drift_ratio: float = 0.05,
+                 incremental_max: int = 5000, clock: Callable[[], float] = time.time):
+        self.max_age = max_age
+        self.peak_max_age = peak_max_age
+        self.peak_hours = peak_hours
+        self.full_max_age = full_max_age
+        self.drift_abs = drift_abs
+        self.drift_ratio = drift_ratio
+        self.incremental_max = incremental_max
+        # Wall clock, replaceable in tests
+        self.clock = clock
+
+    def allowed_age(self, now: Optional[float] = None) -> float:
+        now = self.clock() if now is None else now
+        return self.peak_max_age if in_hours(self.peak_hours, now) else self.max_age
+
+    def drift_threshold(self, stored_count: int) -> float:
+        return min(self.drift_abs, max(1.0, self.drift_ratio * stored_count))
+
+    def decide(self, stored: Optional[Dict[str, Any]], current: Optional[Dict[str, Any]],
+               has_snapshot: bool = True, now: Optional[float] = None) -> str:
+        """
+        Choose between serving the stored snapshot, an incremental refresh and a full crawl
+
+        Args:
+            stored: Account info from FollowersDatabase.get_account_info
+            current: Account info from the API, None when the API is not available
+            has_snapshot: Whether followers of the account are stored
+            now: Wall-clock time, the policy clock when None
+
+        Returns:
+            SERVE, INCREMENTAL or FULL
+        """
+        if not stored or not has_snapshot or not stored.get('full_synced_at'):
+            return FULL
+        now = self.clock() if now is None else now
+        if now - stored['full_synced_at'] > self.full_max_age:
+            return FULL
+
+        drift = 0
+        if current is not None:
+            drift = (current.get('followers_count') or 0) - (stored.get('followers_count') or 0)
+        threshold = self.drift_threshold(stored.get('followers_count') or 0)
+        if -drift > threshold or drift > self.incremental_max:
+            return FULL
+
+        synced_at = stored.get('synced_at') or stored['full_synced_at']
+        if drift > threshold or now - synced_at > self.allowed_age(now):
+            return INCREMENTAL
+        return SERVE
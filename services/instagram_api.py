@@ -1,17 +1,23 @@
-import json
 import aiohttp
 import asyncio
-from typing import Dict, List, Optional, Any, Tuple, Callable
+from typing import Dict, List, Optional, Any, Tuple, Callable, Awaitable, AsyncIterator, AsyncContextManager
 from aiohttp import ClientSession
 
+from services.profile_cache import ProfileCache
+from services.records import FollowerRecord
+from services.parser import parse_profile, parse_users_page
+from services.rate_limiter import (
+    AdaptiveRateLimiter, ApiKey, KeyPool, QuotaExhaustedError, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+)
+
 
 class InstagramAPI:
-    def __init__(self, api_key: str, api_host: str = "instagram-social-api.p.rapidapi.com", session_pool_size: int = 5):
-        self.api_key = api_key
+    def __init__(self, api_key: Optional[str] = None, api_host: str = "instagram-social-api.p.rapidapi.com",
+                 session_pool_size: int = 5, rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                 profile_cache: Optional[ProfileCache] = None, key_pool: Optional[KeyPool] = None):
         self.api_host = api_host
         self.base_url = f"https://{api_host}"
         self.headers = {
-            'x-rapidapi-key': api_key,
             'x-rapidapi-host': api_host
         }
         # Session pool setup
@@ -19,6 +25,10 @@ class InstagramAPI:
         self._session = None
         self._rate_limit_retry_count = 3
         self._connection_timeout = aiohttp.ClientTimeout(total=30, connect=15)
+        # Every endpoint is paced by the limiters of a pool of keys (one key without a pool)
+        self.key_pool = key_pool or KeyPool([ApiKey(api_key, rate_limiter or AdaptiveRateLimiter())])
+        # Profiles are served from cache when one is configured
+        self.profile_cache = profile_cache
 
     async def _get_session(self) -> ClientSession:
         """Get or create session pool for connection reuse"""
@@ -33,52 +43,74 @@ class InstagramAPI:
             await self._session.close()
             self._session = None
 
-    async def get_user_info(self, username: str) -> Optional[Dict[str, Any]]:
+    async def _request(self, path: str, params: Dict[str, Any],
+                       priority: int = PRIORITY_BACKGROUND) -> Tuple[int, Any]:
+        """
+        Make a rate limited GET request with a key from the pool. 429
+        responses are retried after the limiter has backed off, usually with
+        another key.
+
+        Args:
+            path: Endpoint path, e.g. /v1/info
+            params: Query parameters
+            priority: Rate limiter priority class
+
+        Returns:
+            Tuple of status code and raw body bytes (status 200, parsed by
+            services.parser) or response text
+        """
+        url = f"{self.base_url}{path}"
+        session = await self._get_session()
+
+        for attempt in range(self._rate_limit_retry_count + 1):
+            key = await self.key_pool.acquire(priority)
+            headers = dict(self.headers, **{'x-rapidapi-key': key.key})
+            async with session.get(url, headers=headers, params=params) as response:
+                self.key_pool.observe(key, response.status, response.headers)
+
+                if response.status == 429 and attempt < self._rate_limit_retry_count:
+                    print(f"Rate limit exceeded. Retrying (attempt {attempt + 1}/{self._rate_limit_retry_count})...")
+                    continue
+
+                if response.status == 200:
+                    return response.status, await response.read()
+                return response.status, await response.text()
+
+        return 429, ""
+
+    async def get_user_info(self, username: str, use_cache: bool = True) -> Optional[Dict[str, Any]]:
         """
         Get Instagram user info using Instagram Social API
 
         Args:
             username: Instagram username (without @)
+            use_cache: Serve from the profile cache if it is configured
 
         Returns:
             Dict with user info or None if error
         """
-        url = f"{self.base_url}/v1/info"
+        if self.profile_cache is not None and use_cache:
+            return await self.profile_cache.get(username, self._fetch_user_info)
+        return await self._fetch_user_info(username)
+
+    async def _fetch_user_info(self, username: str) -> Optional[Dict[str, Any]]:
         params = {"username_or_id_or_url": username}
 
-        session = await self._get_session()
         try:
-            async with session.get(url, headers=self.headers, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-
-                    # Instagram Social API response structure
-                    if "data" in data:
-                        user = data["data"]
-                        return {
-                            "id": str(user.get("id", "")),
-                            "username": user.get("username", username),
-                            "full_name": user.get("full_name", ""),
-                            "followers_count": user.get("follower_count", 0),
-                            "following_count": user.get("following_count", 0),
-                            "posts_count": user.get("media_count", 0),
-                            "bio": user.get("biography", ""),
-                            "is_verified": user.get("is_verified", False),
-                            "is_private": user.get("is_private", False),
-                            "profile_pic_url": user.get("profile_pic_url", ""),
-                            "external_url": user.get("external_url", "")
-                        }
-                    else:
-                        print(f"API response error: {data}")
-                        return None
-
-                elif response.status == 404:
-                    print(f"User {username} not found")
-                    return None
-                else:
-                    error_text = await response.text()
-                    print(f"API error: {response.status} - {error_text}")
-                    return None
+            # Interactive request: served ahead of background pagination
+            status, data = await self._request("/v1/info", params, priority=PRIORITY_INTERACTIVE)
+            if status == 200:
+                user_info = parse_profile(data, username)
+                if user_info is None:
+                    print(f"API response error: {data[:200]!r}")
+                return user_info
+
+            elif status == 404:
+                print(f"User {username} not found")
+                return None
+            else:
+                print(f"API error: {status} - {data}")
+                return None
 
         except asyncio.TimeoutError:
             print(f"Timeout error for user {username}")
@@ -98,38 +130,9 @@ class InstagramAPI:
         Returns:
             List of follower dictionaries
         """
-        url = f"{self.base_url}/v1/followers"
-        params = {"username_or_id_or_url": username_or_id}
-
-        session = await self._get_session()
-        try:
-            async with session.get(url, headers=self.headers, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    followers = []
-
-                    if "data" in data and "items" in data["data"]:
-                        for user in data["data"]["items"]:
-                            if user.get("username"):  # Only add users with valid usernames
-                                followers.append({
-                                    "username": user.get("username", ""),
-                                    "id": str(user.get("id", "")),
-                                    "full_name": user.get("full_name", ""),
-                                    "link": f"https://www.instagram.com/{user.get('username', '')}",
-                                    "is_verified": user.get("is_verified", False),
-                                    "is_private": user.get("is_private", False),
-                                    "profile_pic_url": user.get("profile_pic_url", "")
-                                })
-
-                    return followers
-                else:
-                    error_text = await response.text()
-                    print(f"API error getting followers: {response.status} - {error_text}")
-                    return []
-
-        except Exception as e:
-            print(f"Error getting followers: {e}")
-            return []
+        async for page in self.iter_follower_pages(username_or_id, max_pages=1, prefetch=0):
+            return page['followers']
+        return []
 
     async def get_user_followers_batch(self, username_or_id: str, count: int = 100, pagination_token: str = None) -> \
     Dict[str, Any]:
@@ -142,76 +145,59 @@ class InstagramAPI:
             pagination_token: Token for pagination
 
         Returns:
-            Dict with 'followers' list and 'next_max_id' for pagination
+            Dict with 'followers' list of FollowerRecord and 'next_max_id' for pagination
         """
-        url = f"{self.base_url}/v1/followers"
+        return await self._get_users_page("/v1/followers", username_or_id, pagination_token)
+
+    async def get_user_following_batch(self, username_or_id: str, count: int = 100, pagination_token: str = None) -> \
+    Dict[str, Any]:
+        """
+        Get a batch of the accounts a user follows, same shape as get_user_followers_batch
+
+        Returns:
+            Dict with 'followers' list of FollowerRecord (the followed accounts) and 'next_max_id'
+        """
+        return await self._get_users_page("/v1/following", username_or_id, pagination_token)
+
+    async def _get_users_page(self, path: str, username_or_id: str, pagination_token: Optional[str]) -> Dict[str, Any]:
         params = {"username_or_id_or_url": username_or_id}
 
         # Add pagination token if provided
         if pagination_token:
             params["pagination_token"] = pagination_token
 
-        session = await self._get_session()
-
-        # Retry mechanism for reliability
+        # Retry mechanism for reliability (429 backoff is handled by the rate limiter)
         for attempt in range(self._rate_limit_retry_count + 1):
             try:
-                async with session.get(url, headers=self.headers, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        followers = []
-
-                        if "data" in data and "items" in data["data"]:
-                            for user in data["data"]["items"]:
-                                if user.get("username"):  # Only add users with valid usernames
-                                    followers.append({
-                                        "username": user.get("username", ""),
-                                        "id": str(user.get("id", "")),
-                                        "full_name": user.get("full_name", ""),
-                                        "link": f"https://www.instagram.com/{user.get('username', '')}",
-                                        "is_verified": user.get("is_verified", False),
-                                        "is_private": user.get("is_private", False),
-                                        "profile_pic_url": user.get("profile_pic_url", "")
-                                    })
-
-                            # Extract pagination_token for next batch
-                            next_pagination_token = data.get("pagination_token")
-
-                            return {
-                                "followers": followers,
-                                "next_max_id": next_pagination_token,  # Keep this name for compatibility
-                                "has_more": bool(next_pagination_token),
-                                "count": len(followers)
-                            }
-                        else:
-                            return {
-                                "followers": [],
-                                "next_max_id": None,
-                                "has_more": False,
-                                "count": 0
-                            }
-
-                    elif response.status == 429:  # Rate limit exceeded
-                        if attempt < self._rate_limit_retry_count:
-                            backoff_time = 2 ** attempt
-                            print(f"Rate limit exceeded. Retrying in {backoff_time} seconds...")
-                            await asyncio.sleep(backoff_time)
-                            continue
-                        else:
-                            print(f"Rate limit exceeded after {attempt + 1} attempts")
-                            return {"followers": [], "next_max_id": None, "has_more": False, "count": 0}
-
-                    elif response.status == 404:
-                        print(f"User {username_or_id} not found")
-                        return {"followers": [], "next_max_id": None, "has_more": False, "count": 0}
-
-                    else:
-                        error_text = await response.text()
-                        print(f"API error: {response.status} - {error_text}")
-                        if attempt < self._rate_limit_retry_count:
-                            await asyncio.sleep(2)
-                            continue
-                        return {"followers": [], "next_max_id": None, "has_more": False, "count": 0}
+                status, data = await self._request(path, params)
+                if status == 200:
+                    # Only users with valid usernames are kept
+                    followers, next_pagination_token = parse_users_page(data)
+                    return {
+                        "followers": followers,
+                        "next_max_id": next_pagination_token,  # Keep this name for compatibility
+                        "has_more": bool(next_pagination_token),
+                        "count": len(followers)
+                    }
+
+                elif status == 429:  # Rate limit exceeded
+                    print(f"Rate limit exceeded after {self._rate_limit_retry_count + 1} attempts")
+                    return {"followers": [], "next_max_id": None, "has_more": False, "count": 0}
+
+                elif status == 404:
+                    print(f"User {username_or_id} not found")
+                    return {"followers": [], "next_max_id": None, "has_more": False, "count": 0}
+
+                else:
+                    print(f"API error: {status} - {data}")
+                    if attempt < self._rate_limit_retry_count:
+                        await asyncio.sleep(2)
+                        continue
+                    return {"followers": [], "next_max_id": None, "has_more": False, "count": 0}
+
+            except QuotaExhaustedError as e:
+                print(f"{e}")
+                return {"followers": [], "next_max_id": None, "has_more": False, "count": 0}
 
             except asyncio.TimeoutError:
                 print(f"Timeout error (attempt {attempt + 1}/{self._rate_limit_retry_count + 1})")
@@ -221,7 +207,7 @@ class InstagramAPI:
                 return {"followers": [], "next_max_id": None, "has_more": False, "count": 0}
 
             except Exception as e:
-                print(f"Unexpected error fetching followers: {e}")
+                print(f"Unexpected error fetching {path}: {e}")
                 if attempt < self._rate_limit_retry_count:
                     await asyncio.sleep(2)
                     continue
@@ -229,37 +215,175 @@ class InstagramAPI:
 
         return {"followers": [], "next_max_id": None, "has_more": False, "count": 0}
 
-    async def get_multiple_batches(self, username_or_id: str, count: int, pagination_tokens: List[str]) -> List[
-        Dict[str, Any]]:
+    async def iter_follower_pages(
+            self,
+            username_or_id: str,
+            pagination_token: Optional[str] = None,
+            max_followers: Optional[int] = None,
+            max_pages: int = 2000,
+            prefetch: int = 1,
+            page_size: int = 50,
+            page_delay: float = 0,
+            slot: Optional[Callable[[], AsyncContextManager]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
         """
-        Get multiple batches of followers in parallel
+        Stream follower pages as they are fetched
+
+        Pagination is sequential (every token comes from the previous page),
+        so fetching runs as its own stage: the next page is requested as soon
+        as the previous one is parsed, while the consumer saves and reports
+        earlier pages. At most `prefetch` fetched pages wait in a bounded
+        buffer; when the consumer is slower, fetching waits (backpressure).
+        With prefetch=0 a page is only requested when the consumer asks for
+        it. Breaking out of the loop (or aclose()) stops fetching.
 
         Args:
             username_or_id: Instagram username or user ID
-            count: Number of followers per batch
-            pagination_tokens: List of pagination tokens
+            pagination_token: Token to start from (None for the first page)
+            max_followers: Stop after this many followers (None for all)
+            max_pages: Safety limit of pages (2000 pages = ~100k followers)
+            prefetch: Size of the page buffer between fetching and the consumer
+            page_size: Followers per request (the API returns ~50 regardless)
+            page_delay: Extra pause between requests on top of the rate limiter
+            slot: Held around every page request, e.g. a CrawlScheduler slot
+
+        Yields:
+            Page dicts as returned by get_user_followers_batch, the last page
+            is trimmed to max_followers
+        """
+        pages = self._fetch_pages(self.get_user_followers_batch, username_or_id, pagination_token, max_followers,
+                                  max_pages, page_size, page_delay, slot)
+        async for page in self._prefetch_pages(pages, prefetch):
+            yield page
 
-        Returns:
-            List of batch results
+    async def iter_following_pages(
+            self,
+            username_or_id: str,
+            pagination_token: Optional[str] = None,
+            max_pages: int = 2000,
+            prefetch: int = 1,
+            page_size: int = 50,
+            page_delay: float = 0,
+            slot: Optional[Callable[[], AsyncContextManager]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream pages of the accounts a user follows, see iter_follower_pages
+
+        Yields:
+            Page dicts as returned by get_user_following_batch
         """
-        if not pagination_tokens:
-            return []
+        pages = self._fetch_pages(self.get_user_following_batch, username_or_id, pagination_token, None,
+                                  max_pages, page_size, page_delay, slot)
+        async for page in self._prefetch_pages(pages, prefetch):
+            yield page
+
+    @staticmethod
+    async def _prefetch_pages(pages: AsyncIterator[Dict[str, Any]], prefetch: int) -> AsyncIterator[Dict[str, Any]]:
+        if prefetch <= 0:
+            async for page in pages:
+                yield page
+            return
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=prefetch)
+
+        async def produce():
+            try:
+                async for page in pages:
+                    await queue.put(page)
+                await queue.put(None)
+            except Exception as e:
+                await queue.put(e)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            producer.cancel()
+            try:
+                await producer
+            except asyncio.CancelledError:
+                pass
+
+    async def _fetch_pages(self, fetch_batch: Callable[..., Awaitable[Dict[str, Any]]], username_or_id: str,
+                           pagination_token: Optional[str], max_followers: Optional[int], max_pages: int,
+                           page_size: int = 50, page_delay: float = 0,
+                           slot: Optional[Callable[[], AsyncContextManager]] = None
+                           ) -> AsyncIterator[Dict[str, Any]]:
+        fetched = 0
+        batch_count = 0
+
+        while True:
+            batch_count += 1
+            if slot is None:
+                batch_result = await fetch_batch(
+                    username_or_id=username_or_id,
+                    count=page_size,  # This API returns ~50 per batch
+                    pagination_token=pagination_token
+                )
+            else:
+                async with slot():
+                    batch_result = await fetch_batch(
+                        username_or_id=username_or_id,
+                        count=page_size,
+                        pagination_token=pagination_token
+                    )
+
+            # Check if we got any followers
+            new_followers = batch_result.get('followers') if batch_result else None
+            if not new_followers:
+                print(f"No more followers found after {batch_count} batches")
+                return
+
+            # Trim the last page to max_followers
+            if max_followers and fetched + len(new_followers) >= max_followers:
+                batch_result = dict(batch_result, followers=new_followers[:max_followers - fetched])
+                batch_result['count'] = len(batch_result['followers'])
+                yield batch_result
+                print(f"Reached follower limit of {max_followers}")
+                return
+
+            fetched += len(new_followers)
+            yield batch_result
+
+            # If no pagination token, we're done
+            pagination_token = batch_result.get('next_max_id')
+            if not pagination_token or not batch_result.get('has_more', False):
+                print(f"Reached end of followers list after {batch_count} batches")
+                return
 
-        tasks = [
-            self.get_user_followers_batch(username_or_id, count, pagination_token)
-            for pagination_token in pagination_tokens
-        ]
+            if batch_count >= max_pages:
+                print(f"Reached safety limit of {batch_count} batches")
+                return
+
+            if page_delay:
+                await asyncio.sleep(page_delay)
 
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        valid_results = []
+    async def iter_followers(
+            self,
+            username_or_id: str,
+            max_followers: Optional[int] = None,
+            prefetch: int = 1
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream followers one by one, see iter_follower_pages
 
-        for result in results:
-            if not isinstance(result, Exception) and result.get('followers'):
-                valid_results.append(result)
-            elif isinstance(result, Exception):
-                print(f"Exception in batch request: {result}")
+        Args:
+            username_or_id: Instagram username or user ID
+            max_followers: Stop after this many followers (None for all)
+            prefetch: Size of the page buffer between fetching and the consumer
 
-        return valid_results
+        Yields:
+            Follower dictionaries
+        """
+        async for page in self.iter_follower_pages(username_or_id, max_followers=max_followers, prefetch=prefetch):
+            for follower in page['followers']:
+                yield follower
 
     async def get_all_followers_with_progress(
             self,
@@ -279,11 +403,11 @@ class InstagramAPI:
             List of all followers up to the specified limit
         """
         all_followers = []
-        pagination_token = None
         batch_count = 0
 
-        while True:
+        async for page in self.iter_follower_pages(username_or_id, max_followers=max_followers):
             batch_count += 1
+            all_followers.extend(page['followers'])
 
             # Call progress callback if provided
             if progress_callback:
@@ -292,96 +416,28 @@ class InstagramAPI:
                 except Exception as e:
                     print(f"Error in progress callback: {e}")
 
-            # Get next batch
-            batch_result = await self.get_user_followers_batch(
-                username_or_id=username_or_id,
-                count=50,  # This API returns ~50 per batch
-                pagination_token=pagination_token
-            )
-
-            # Check if we got any followers
-            if not batch_result or not batch_result.get('followers'):
-                print(f"No more followers found after {batch_count} batches")
-                break
-
-            # Add followers to our list
-            new_followers = batch_result.get('followers', [])
-
-            # Check if we would exceed the max_followers limit
-            if max_followers:
-                remaining_slots = max_followers - len(all_followers)
-                if remaining_slots <= 0:
-                    break
-                if len(new_followers) > remaining_slots:
-                    new_followers = new_followers[:remaining_slots]
-
-            all_followers.extend(new_followers)
-
-            # Check if we've reached our limit
-            if max_followers and len(all_followers) >= max_followers:
-                print(f"Reached follower limit of {max_followers}")
-                break
-
-            # Get pagination token for next batch
-            pagination_token = batch_result.get('next_max_id')
-
-            # If no pagination token, we're done
-            if not pagination_token or not batch_result.get('has_more', False):
-                print(f"Reached end of followers list after {batch_count} batches")
-                break
-
-            # Add small delay to be respectful to the API
-            await asyncio.sleep(0.5)
-
-            # Safety limit to prevent infinite loops (2000 batches = ~100k followers)
-            if batch_count > 2000:
-                print(f"Reached safety limit of {batch_count} batches")
-                break
-
         print(f"Total followers fetched: {len(all_followers)} in {batch_count} batches")
         return all_followers
 
-    async def get_user_following(self, username_or_id: str) -> List[Dict[str, str]]:
+    async def get_user_following(self, username_or_id: str, max_pages: int = 200) -> List[FollowerRecord]:
         """
         Get users that the specified user is following
 
+        Instagram caps following at 7500 accounts (150 pages), so the whole
+        list is returned at once; FollowerCrawler.crawl_following stores it
+        page by page instead.
+
         Args:
             username_or_id: Instagram username or user ID
+            max_pages: Safety limit of pages
 
         Returns:
-            List of following users (if endpoint exists)
+            List of following users, empty if the endpoint is not available
         """
-        # Note: Check if this endpoint exists in the API documentation
-        url = f"{self.base_url}/v1/following"
-        params = {"username_or_id_or_url": username_or_id}
-
-        session = await self._get_session()
-        try:
-            async with session.get(url, headers=self.headers, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    following = []
-
-                    if "data" in data and "items" in data["data"]:
-                        for user in data["data"]["items"]:
-                            if user.get("username"):
-                                following.append({
-                                    "username": user.get("username", ""),
-                                    "id": str(user.get("id", "")),
-                                    "full_name": user.get("full_name", ""),
-                                    "link": f"https://www.instagram.com/{user.get('username', '')}",
-                                    "is_verified": user.get("is_verified", False),
-                                    "is_private": user.get("is_private", False)
-                                })
-
-                    return following
-                else:
-                    print(f"Following endpoint may not be available: {response.status}")
-                    return []
-
-        except Exception as e:
-            print(f"Error getting following list: {e}")
-            return []
+        following = []
+        async for page in self.iter_following_pages(username_or_id, max_pages=max_pages):
+            following.extend(page['followers'])
+        return following
 
     async def health_check(self) -> bool:
         """
@@ -408,7 +464,10 @@ class InstagramAPI:
         return {
             "api_host": self.api_host,
             "base_url": self.base_url,
-            "has_api_key": bool(self.api_key),
+            "has_api_key": any(key.key for key in self.key_pool.keys),
+            "api_keys": len(self.key_pool.keys),
             "session_pool_size": self.session_pool_size,
-            "retry_count": self._rate_limit_retry_count
+            "retry_count": self._rate_limit_retry_count,
+            "key_pool": self.key_pool.get_stats(),
+            "profile_cache": self.profile_cache.get_stats() if self.profile_cache else None
         }
\ No newline at end of file
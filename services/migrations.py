@@ -0,0 +1,305 @@
+import sqlite3
+from typing import Callable, List, Tuple
+
+
+# Schema version is stored in PRAGMA user_version. Every migration moves the
+# database exactly one version forward and runs inside its own transaction.
+
+
+def _migrate_v1(conn: sqlite3.Connection):
+    """Legacy schema: TEXT ids, one row per (follower, account) with a stored link"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS accounts (
+        username TEXT PRIMARY KEY,
+        followers_count INTEGER,
+        full_name TEXT,
+        following_count INTEGER,
+        posts_count INTEGER,
+        bio TEXT,
+        update_timestamp INTEGER
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS followers (
+        id TEXT,
+        username TEXT,
+        link TEXT,
+        account_username TEXT,
+        PRIMARY KEY (id, account_username),
+        FOREIGN KEY (account_username) REFERENCES accounts (username)
+    )
+    ''')
+
+
+def _migrate_v2(conn: sqlite3.Connection):
+    """
+    Integer ids, a users table shared across accounts and a followers edge
+    table with covering indexes. The profile link is derived from the
+    username instead of being stored per row.
+    """
+    conn.execute('''
+    CREATE TABLE accounts_v2 (
+        id INTEGER PRIMARY KEY,
+        username TEXT NOT NULL UNIQUE,
+        followers_count INTEGER,
+        full_name TEXT,
+        following_count INTEGER,
+        posts_count INTEGER,
+        bio TEXT,
+        update_timestamp INTEGER
+    )
+    ''')
+
+    # id - Instagram pk, used directly as rowid
+    conn.execute('''
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY,
+        username TEXT NOT NULL,
+        full_name TEXT
+    )
+    ''')
+
+    # position - order in which the follower was crawled (1-based)
+    conn.execute('''
+    CREATE TABLE followers_v2 (
+        account_id INTEGER NOT NULL REFERENCES accounts (id),
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        position INTEGER NOT NULL,
+        PRIMARY KEY (account_id, user_id)
+    ) WITHOUT ROWID
+    ''')
+
+    conn.execute('''
+    INSERT INTO accounts_v2 (username, followers_count, full_name, following_count, posts_count, bio, update_timestamp)
+    SELECT username, followers_count, full_name, following_count, posts_count, bio, update_timestamp
+    FROM accounts
+    ''')
+
+    # Legacy rows with non-numeric ids can not be keyed by Instagram pk and are dropped
+    conn.execute('''
+    INSERT INTO users (id, username)
+    SELECT CAST(id AS INTEGER), MAX(username)
+    FROM followers
+    WHERE id NOT GLOB '*[^0-9]*' AND id <> ''
+    GROUP BY CAST(id AS INTEGER)
+    ''')
+
+    conn.execute('''
+    INSERT OR IGNORE INTO followers_v2 (account_id, user_id, position)
+    SELECT a.id, CAST(f.id AS INTEGER),
+           ROW_NUMBER() OVER (PARTITION BY f.account_username ORDER BY f.rowid)
+    FROM followers f
+    JOIN accounts_v2 a ON a.username = f.account_username
+    WHERE f.id NOT GLOB '*[^0-9]*' AND f.id <> ''
+    ''')
+
+    conn.execute("DROP TABLE followers")
+    conn.execute("DROP TABLE accounts")
+    conn.execute("ALTER TABLE accounts_v2 RENAME TO accounts")
+    conn.execute("ALTER TABLE followers_v2 RENAME TO followers")
+
+    # Ordered snapshot reads: (account_id, position) -> user_id without touching the table
+    conn.execute('''
+    CREATE UNIQUE INDEX idx_followers_account_position
+    ON followers (account_id, position, user_id)
+    ''')
+
+
+def _migrate_v3(conn: sqlite3.Connection):
+    """
+    Tombstones for incremental sync. A follower that disappears is kept with
+    removed_at set instead of being deleted; last_seen is the last sync that
+    still saw it. Active rows are served from a partial index.
+    """
+    conn.execute("ALTER TABLE followers ADD COLUMN removed_at INTEGER")
+    conn.execute("ALTER TABLE followers ADD COLUMN last_seen INTEGER")
+    conn.execute("ALTER TABLE accounts ADD COLUMN synced_at INTEGER")
+
+    # removed_at is always NULL inside the index, it is listed only so that the
+    # planner treats the index as covering for "removed_at IS NULL" filters
+    conn.execute("DROP INDEX idx_followers_account_position")
+    conn.execute('''
+    CREATE INDEX idx_followers_active
+    ON followers (account_id, position, user_id, removed_at)
+    WHERE removed_at IS NULL
+    ''')
+
+
+def _migrate_v4(conn: sqlite3.Connection):
+    """Checkpoints of unfinished crawls, one per account"""
+    conn.execute('''
+    CREATE TABLE crawl_checkpoints (
+        account_id INTEGER PRIMARY KEY REFERENCES accounts (id),
+        pagination_token TEXT,
+        pages_done INTEGER NOT NULL,
+        rows_saved INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL
+    )
+    ''')
+
+
+def _migrate_v5(conn: sqlite3.Connection):
+    """Persistent backing of the profile cache, profile stored as JSON"""
+    conn.execute('''
+    CREATE TABLE profile_cache (
+        username TEXT PRIMARY KEY,
+        profile TEXT NOT NULL,
+        fetched_at REAL NOT NULL
+    )
+    ''')
+
+
+def _migrate_v6(conn: sqlite3.Connection):
+    """Snapshot version, bumped whenever the follower set of an account changes"""
+    conn.execute("ALTER TABLE accounts ADD COLUMN snapshot_version INTEGER NOT NULL DEFAULT 0")
+
+
+def _migrate_v7(conn: sqlite3.Connection):
+    """
+    Active follower count kept next to the snapshot version, so a draw knows
+    its range without counting, and a log of draws with their seeds.
+    """
+    conn.execute("ALTER TABLE accounts ADD COLUMN active_followers INTEGER NOT NULL DEFAULT 0")
+    conn.execute('''
+    UPDATE accounts SET active_followers = (
+        SELECT COUNT(*) FROM followers WHERE account_id = accounts.id AND removed_at IS NULL
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE draws (
+        id INTEGER PRIMARY KEY,
+        account_id INTEGER NOT NULL REFERENCES accounts (id),
+        seed INTEGER NOT NULL,
+        method TEXT NOT NULL,
+        snapshot_version INTEGER,
+        total INTEGER NOT NULL,
+        ordinal INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        drawn_at REAL NOT NULL
+    )
+    ''')
+    conn.execute("CREATE INDEX idx_draws_account ON draws (account_id, drawn_at)")
+
+
+def _migrate_v8(conn: sqlite3.Connection):
+    """Index of cached export files and their Telegram file_id"""
+    conn.execute('''
+    CREATE TABLE export_artifacts (
+        account_id INTEGER NOT NULL REFERENCES accounts (id),
+        format TEXT NOT NULL,
+        snapshot_version INTEGER NOT NULL,
+        path TEXT,
+        rows INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        file_id TEXT,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL,
+        PRIMARY KEY (account_id, format, snapshot_version)
+    )
+    ''')
+
+
+def _migrate_v9(conn: sqlite3.Connection):
+    """
+    Accounts registered by operators. Keyed by username, an account is
+    tracked before its first crawl creates the accounts row.
+    """
+    conn.execute('''
+    CREATE TABLE tracked_accounts (
+        username TEXT PRIMARY KEY,
+        weight REAL NOT NULL DEFAULT 1,
+        added_by INTEGER,
+        added_at INTEGER NOT NULL
+    )
+    ''')
+
+
+def _migrate_v10(conn: sqlite3.Connection):
+    """
+    Wall-clock account timestamps. update_timestamp used to be event loop
+    time, which starts over with every process, so old values are replaced
+    by the last sync. full_synced_at is the last crawl that reached the end
+    of the list; until now every finished sync was one.
+    """
+    conn.execute("ALTER TABLE accounts ADD COLUMN full_synced_at INTEGER")
+    conn.execute("UPDATE accounts SET update_timestamp = synced_at, full_synced_at = synced_at")
+
+
+def _migrate_v11(conn: sqlite3.Connection):
+    """
+    Accounts an account follows. Keyed like followers, so mutual follows are
+    a primary key join. synced_at is the crawl that last saw the edge; a
+    complete crawl drops edges it did not see.
+    """
+    conn.execute('''
+    CREATE TABLE following (
+        account_id INTEGER NOT NULL REFERENCES accounts (id),
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        synced_at INTEGER NOT NULL,
+        PRIMARY KEY (account_id, user_id)
+    ) WITHOUT ROWID
+    ''')
+    conn.execute("ALTER TABLE accounts ADD COLUMN following_synced_at INTEGER")
+
+
+MIGRATIONS: List[Tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+    (4, _migrate_v4),
+    (5, _migrate_v5),
+    (6, _migrate_v6),
+    (7, _migrate_v7),
+    (8, _migrate_v8),
+    (9, _migrate_v9),
+    (10, _migrate_v10),
+    (11, _migrate_v11),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Bring the database up to SCHEMA_VERSION
+
+    Args:
+        conn: Connection without an open transaction
+
+    Returns:
+        Schema version after migration
+    """
+    current = get_schema_version(conn)
+    if current > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema version {current} is newer than supported version {SCHEMA_VERSION}"
+        )
+
+    for version, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        # DDL does not open an implicit transaction, so begin explicitly.
+        # IMMEDIATE takes the write lock up front: when several bot workers
+        # start together, only the first one runs each migration.
+        conn.execute("BEGIN IMMEDIATE")
+        if get_schema_version(conn) >= version:
+            conn.rollback()
+            current = version
+            continue
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        print(f"Database migrated to schema version {version}")
+        current = version
+
+    return current
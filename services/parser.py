@@ -0,0 +1,96 @@
+"""
+Instagram Social API payload parsing.
+
+Responses are parsed from the raw body bytes with a pluggable JSON decoder
+(orjson when installed, the stdlib otherwise), and user items go straight
+into FollowerRecord with only the fields we keep.
+"""
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.records import FollowerRecord
+
+try:
+    import orjson
+except ImportError:  # optional, roughly 2x faster decoding
+    orjson = None
+
+Decoder = Callable[[bytes], Any]
+
+# json.loads accepts bytes and detects the encoding
+loads: Decoder = orjson.loads if orjson is not None else json.loads
+
+
+def set_decoder(decoder: Decoder):
+    """Replace the JSON decoder used by the parse functions"""
+    global loads
+    loads = decoder
+
+
+def _decode(body: bytes, decoder: Optional[Decoder]) -> Any:
+    return (decoder or loads)(body)
+
+
+def parse_users_page(body: bytes, decoder: Optional[Decoder] = None) -> Tuple[List[FollowerRecord], Optional[str]]:
+    """
+    Parse a /v1/followers or /v1/following page
+
+    Args:
+        body: Raw response body
+        decoder: JSON decoder, the module decoder when None
+
+    Returns:
+        Tuple of (records of the items with a username, next pagination token)
+    """
+    data = _decode(body, decoder)
+    payload = data.get("data") if isinstance(data, dict) else None
+    items = payload.get("items") if isinstance(payload, dict) else None
+    if items is None:
+        return [], None
+
+    new_record = FollowerRecord.__new__
+    record_class = FollowerRecord
+    verified = FollowerRecord.VERIFIED
+    private = FollowerRecord.PRIVATE
+    records = []
+    append = records.append
+    for user in items:
+        get = user.get
+        username = get("username")
+        if not username:
+            continue
+        # FollowerRecord.__init__ without the call and flag arguments
+        record = new_record(record_class)
+        record.id = int(get("id") or 0)
+        record.username = username
+        record.full_name = get("full_name") or ""
+        record._flags = (verified if get("is_verified") else 0) | (private if get("is_private") else 0)
+        append(record)
+    return records, data.get("pagination_token")
+
+
+def parse_profile(body: bytes, username: str, decoder: Optional[Decoder] = None) -> Optional[Dict[str, Any]]:
+    """
+    Parse a /v1/info response into the account info dict
+
+    Returns:
+        Account info, None when the response has no user
+    """
+    data = _decode(body, decoder)
+    user = data.get("data") if isinstance(data, dict) else None
+    if not isinstance(user, dict):
+        return None
+    get = user.get
+    return {
+        "id": str(get("id", "")),
+        "username": get("username", username),
+        "full_name": get("full_name", ""),
+        "followers_count": get("follower_count", 0),
+        "following_count": get("following_count", 0),
+        "posts_count": get("media_count", 0),
+        "bio": get("biography", ""),
+        "is_verified": get("is_verified", False),
+        "is_private": get("is_private", False),
+        "profile_pic_url": get("profile_pic_url", ""),
+        "external_url": get("external_url", "")
+    }
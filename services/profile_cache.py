@@ -0,0 +1,155 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Protocol, Tuple
+
+
+class ProfileStore(Protocol):
+    """Persistent backing for ProfileCache (implemented by FollowersDatabase)"""
+
+    async def load_profile(self, username: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        ...
+
+    async def store_profile(self, username: str, profile: Dict[str, Any], fetched_at: float):
+        ...
+
+
+class ProfileCache:
+    """
+    In-process TTL/LRU cache of Instagram profiles.
+
+    Entries younger than `ttl` are served as is. Entries older than `ttl` but
+    younger than `stale_ttl` are served immediately while one background
+    refresh per username runs (stale-while-revalidate). Concurrent misses for
+    the same username share one load. An optional store keeps entries across
+    restarts.
+    """
+
+    def __init__(self, ttl: float = 300, stale_ttl: float = 3600, max_size: int = 1024,
+                 store: Optional[ProfileStore] = None, clock: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self.store = store
+        # Wall clock (entries outlive restarts through the store), replaceable in tests
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    async def get(self, username: str, loader: Callable[[str], Awaitable[Optional[Dict[str, Any]]]],
+                  force_refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Get a profile, loading it with `loader` when needed
+
+        Args:
+            username: Instagram username
+            loader: Coroutine function fetching the profile, returns None on failure
+            force_refresh: Skip the cache and load a fresh profile
+
+        Returns:
+            Profile dict or None if it could not be loaded
+        """
+        key = username.lower()
+
+        if not force_refresh:
+            entry = self._entries.get(key)
+            if entry is None and self.store is not None:
+                entry = await self._load_from_store(key)
+
+            if entry is not None:
+                profile, fetched_at = entry
+                age = self.clock() - fetched_at
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return profile
+                if age < self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    self._refresh_in_background(key, username, loader)
+                    return profile
+
+        self.misses += 1
+        return await self._load(key, username, loader)
+
+    def invalidate(self, username: str):
+        self._entries.pop(username.lower(), None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 3) if lookups else 0.0,
+        }
+
+    def _put(self, key: str, profile: Dict[str, Any], fetched_at: float):
+        self._entries[key] = (profile, fetched_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def _load_from_store(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        try:
+            entry = await self.store.load_profile(key)
+        except Exception as e:
+            print(f"Profile cache store error: {e}")
+            return None
+        if entry is not None:
+            self._put(key, *entry)
+        return entry
+
+    async def _load(self, key: str, username: str, loader: Callable) -> Optional[Dict[str, Any]]:
+        # Single-flight: concurrent loads of one username share a future
+        future = self._loading.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            profile = await loader(username)
+            if profile is not None:
+                fetched_at = self.clock()
+                self._put(key, profile, fetched_at)
+                if self.store is not None:
+                    try:
+                        await self.store.store_profile(key, profile, fetched_at)
+                    except Exception as e:
+                        print(f"Profile cache store error: {e}")
+            future.set_result(profile)
+            return profile
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so that an unawaited future does not log a warning
+            future.exception()
+            raise
+        finally:
+            del self._loading[key]
+
+    def _refresh_in_background(self, key: str, username: str, loader: Callable):
+        if key in self._refreshing or key in self._loading:
+            return
+        self.refreshes += 1
+
+        async def refresh():
+            try:
+                await self._load(key, username, loader)
+            except Exception as e:
+                print(f"Profile refresh failed for {username}: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
@@ -0,0 +1,297 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Callable, List, Mapping, Optional, Tuple
+
+
+# Lower value is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+class QuotaExhaustedError(Exception):
+    """Raised when the API quota will not recover within the allowed wait"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"API quota exhausted, retry in {retry_after:.0f} seconds")
+        self.retry_after = retry_after
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket shared by every InstagramAPI endpoint.
+
+    Requests wait for a token in priority order, so an interactive request
+    overtakes queued background pagination. The refill rate adapts to the
+    API: it grows slowly while requests succeed and is halved on every 429
+    (AIMD). Retry-After and the RapidAPI x-ratelimit-requests-* headers pause
+    the bucket until the quota is back.
+    """
+
+    def __init__(self, rate: float = 2.0, burst: int = 2, min_rate: float = 0.2, max_rate: float = 10.0,
+                 increase_step: float = 0.05, max_wait: float = 60, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        # Pauses longer than this fail fast with QuotaExhaustedError
+        self.max_wait = max_wait
+        # Monotonic clock, replaceable in tests
+        self.clock = clock
+
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+        self.remaining_quota: Optional[int] = None
+        self.throttled_count = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _check_pause(self, now: float):
+        wait = self._paused_until - now
+        if wait > self.max_wait:
+            raise QuotaExhaustedError(wait)
+
+    async def acquire(self, priority: int = PRIORITY_BACKGROUND):
+        """
+        Wait for a request slot
+
+        Args:
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND (lower is served first)
+
+        Raises:
+            QuotaExhaustedError: if the API asked to pause for longer than max_wait
+        """
+        now = self.clock()
+        self._check_pause(now)
+        self._refill(now)
+
+        if not self._waiters and now >= self._paused_until and self._tokens >= 1:
+            self._tokens -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        self._wakeup.set()
+        await future
+
+    async def _dispatch(self):
+        while self._waiters:
+            now = self.clock()
+            self._refill(now)
+
+            # Drop waiters that were cancelled while queued
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+            if not self._waiters:
+                break
+
+            if now < self._paused_until:
+                if self._paused_until - now > self.max_wait:
+                    error = QuotaExhaustedError(self._paused_until - now)
+                    while self._waiters:
+                        future = heapq.heappop(self._waiters)[2]
+                        if not future.done():
+                            future.set_exception(error)
+                    break
+                delay = self._paused_until - now
+            elif self._tokens >= 1:
+                self._tokens -= 1
+                heapq.heappop(self._waiters)[2].set_result(None)
+                continue
+            else:
+                delay = (1 - self._tokens) / self.rate
+
+            # Sleep until the next token, a pause change or a new waiter
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def paused_for(self, now: Optional[float] = None) -> float:
+        """Seconds until tokens are handed out again, 0 when not paused"""
+        return max(0.0, self._paused_until - (self.clock() if now is None else now))
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for the given number of seconds"""
+        self._paused_until = max(self._paused_until, self.clock() + seconds)
+        self._tokens = min(self._tokens, 0.0)
+        self._wakeup.set()
+
+    def observe(self, status: int, headers: Mapping[str, Any]):
+        """
+        Adapt to an API response
+
+        Args:
+            status: HTTP status code of the response
+            headers: Response headers
+        """
+        remaining = _header_number(headers, "x-ratelimit-requests-remaining")
+        reset = _header_number(headers, "x-ratelimit-requests-reset")
+        retry_after = _header_number(headers, "retry-after")
+
+        if remaining is not None:
+            self.remaining_quota = int(remaining)
+
+        if status == 429:
+            self.throttled_count += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.pause(retry_after if retry_after is not None else 1 / self.rate)
+        elif 200 <= status < 300:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+        if remaining is not None and remaining <= 0 and reset is not None:
+            self.pause(reset)
+
+    def get_stats(self) -> dict:
+        return {
+            "rate": round(self.rate, 3),
+            "queued": len(self._waiters),
+            "paused_for": round(self.paused_for(), 3),
+            "remaining_quota": self.remaining_quota,
+            "throttled_count": self.throttled_count,
+        }
+
+
+class ApiKey:
+    """One RapidAPI key with its own limiter, quotas are per key"""
+
+    def __init__(self, key: str, limiter: AdaptiveRateLimiter, weight: float = 1.0):
+        self.key = key
+        self.limiter = limiter
+        self.weight = weight
+        self.requests = 0
+        self._quarantined_until = 0.0
+        # Smooth weighted round-robin state
+        self._current = 0.0
+
+    @property
+    def name(self) -> str:
+        # Never log a whole key
+        return f"...{(self.key or '')[-4:]}"
+
+    def quarantined_for(self, now: float) -> float:
+        return max(self.limiter.paused_for(now), self._quarantined_until - now)
+
+    def quarantine(self, seconds: float):
+        self._quarantined_until = max(self._quarantined_until, self.limiter.clock() + seconds)
+
+
+class KeyPool:
+    """
+    Several RapidAPI keys used in turn, so throughput grows with the keys.
+
+    Keys are picked by smooth weighted round-robin; a key's share is its
+    weight times its limiter's adaptive rate, so a key that gets 429s is
+    used less. A key is quarantined while its limiter is paused for longer
+    than `short_pause` (Retry-After, quota used up until the reset) or, when
+    the API reports no quota left without a reset time, for
+    `quarantine_time`; quarantined keys are skipped while another key is
+    usable. Shorter pauses are waited out in the key's own queue. When
+    every key is quarantined, requests go to the key that comes back first
+    and wait for it, or fail with QuotaExhaustedError like a single limiter.
+    """
+
+    def __init__(self, keys: List[ApiKey], quarantine_time: float = 300, short_pause: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic):
+        if not keys:
+            raise ValueError("KeyPool needs at least one API key")
+        self.keys = keys
+        self.quarantine_time = quarantine_time
+        self.short_pause = short_pause
+        # Same clock as the key limiters, replaceable in tests
+        self.clock = clock
+
+    @classmethod
+    def from_keys(cls, keys: List[str], quarantine_time: float = 300, **limiter_kwargs) -> "KeyPool":
+        """Pool with one AdaptiveRateLimiter(**limiter_kwargs) per key"""
+        return cls([ApiKey(key, AdaptiveRateLimiter(**limiter_kwargs)) for key in keys], quarantine_time,
+                   clock=limiter_kwargs.get("clock", time.monotonic))
+
+    def _choose(self) -> ApiKey:
+        now = self.clock()
+        available = [key for key in self.keys if key.quarantined_for(now) <= self.short_pause]
+        if not available:
+            return min(self.keys, key=lambda key: key.quarantined_for(now))
+        if len(available) == 1:
+            return available[0]
+
+        total = 0.0
+        best = None
+        for key in available:
+            weight = key.weight * key.limiter.rate
+            key._current += weight
+            total += weight
+            if best is None or key._current > best._current:
+                best = key
+        best._current -= total
+        return best
+
+    async def acquire(self, priority: int = PRIORITY_BACKGROUND) -> ApiKey:
+        """
+        Wait for a request slot on one of the keys
+
+        Returns:
+            Key to send the request with, pass the response to observe()
+
+        Raises:
+            QuotaExhaustedError: if every key is paused for longer than its max_wait
+        """
+        error = None
+        for _ in range(len(self.keys)):
+            key = self._choose()
+            try:
+                await key.limiter.acquire(priority)
+            except QuotaExhaustedError as e:
+                # The limiter stays paused, so the key remains quarantined
+                error = e if error is None or e.retry_after < error.retry_after else error
+                continue
+            key.requests += 1
+            return key
+        raise error
+
+    def observe(self, key: ApiKey, status: int, headers: Mapping[str, Any]):
+        """Adapt the key's limiter to an API response"""
+        key.limiter.observe(status, headers)
+        if key.limiter.remaining_quota is not None and key.limiter.remaining_quota <= 0 \
+                and key.limiter.paused_for() <= 0:
+            key.quarantine(self.quarantine_time)
+
+    def remaining_quota(self) -> Optional[int]:
+        """Requests left over the usable keys as last reported by the API, None if never reported"""
+        now = self.clock()
+        reported = [
+            key.limiter.remaining_quota for key in self.keys
+            if key.limiter.remaining_quota is not None and not key.quarantined_for(now)
+        ]
+        return sum(reported) if reported else None
+
+    def get_stats(self) -> List[dict]:
+        now = self.clock()
+        return [
+            dict(key.limiter.get_stats(), key=key.name, requests=key.requests,
+                 quarantined_for=round(key.quarantined_for(now), 3))
+            for key in self.keys
+        ]
+
+
+def _header_number(headers: Mapping[str, Any], name: str) -> Optional[float]:
+    value = headers.get(name) if headers else None
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
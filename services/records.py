@@ -0,0 +1,87 @@
+from typing import Any, Dict, Iterator, Optional
+
+PROFILE_URL_PREFIX = "https://www.instagram.com/"
+
+
+class FollowerRecord:
+    """
+    Compact follower record.
+
+    Uses __slots__ instead of a per-instance dict, keeps the boolean fields
+    in one small int and derives `link` from the username on access. Supports
+    the dict-style access (`follower['username']`, `.get()`) that handlers and
+    exports use on follower dicts.
+    """
+
+    __slots__ = ('id', 'username', 'full_name', '_flags')
+
+    VERIFIED = 1
+    PRIVATE = 2
+
+    KEYS = ('id', 'username', 'full_name', 'link', 'is_verified', 'is_private')
+
+    def __init__(self, id: int, username: str, full_name: str = "",
+                 is_verified: bool = False, is_private: bool = False):
+        self.id = id
+        self.username = username
+        self.full_name = full_name
+        self._flags = (self.VERIFIED if is_verified else 0) | (self.PRIVATE if is_private else 0)
+
+    @classmethod
+    def from_api(cls, user: Dict[str, Any]) -> "FollowerRecord":
+        """Build a record from an item of an Instagram Social API users list"""
+        return cls(
+            int(user.get("id") or 0),
+            user.get("username", ""),
+            user.get("full_name") or "",
+            bool(user.get("is_verified")),
+            bool(user.get("is_private"))
+        )
+
+    @property
+    def link(self) -> str:
+        return PROFILE_URL_PREFIX + self.username
+
+    @property
+    def is_verified(self) -> bool:
+        return bool(self._flags & self.VERIFIED)
+
+    @property
+    def is_private(self) -> bool:
+        return bool(self._flags & self.PRIVATE)
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Optional[Any] = None) -> Any:
+        if key not in self.KEYS:
+            return default
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.KEYS
+
+    def keys(self) -> Iterator[str]:
+        return iter(self.KEYS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self.KEYS}
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, FollowerRecord):
+            return self.id == other.id and self.username == other.username
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    def __getstate__(self):
+        return self.id, self.username, self.full_name, self._flags
+
+    def __setstate__(self, state):
+        self.id, self.username, self.full_name, self._flags = state
+
+    def __repr__(self) -> str:
+        return f"FollowerRecord(id={self.id!r}, username={self.username!r})"
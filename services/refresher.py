@@ -0,0 +1,156 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.crawler import CrawlResult, FollowerCrawler
+from services.database import FollowersDatabase
+from services.freshness import FULL, FreshnessPolicy, in_hours
+from services.instagram_api import InstagramAPI
+
+
+class SnapshotRefresher:
+    """
+    Background re-crawls that keep the snapshots of tracked accounts warm.
+
+    Every `check_interval` seconds the refresher looks for tracked accounts
+    whose last finished crawl is older than `max_age` and re-crawls them,
+    stalest first, so a user's /start is answered from a fresh snapshot
+    instead of waiting for a crawl. Refreshes only run inside the off-peak
+    `hours` window (local time) and only on spare quota: at most
+    `daily_pages` page requests a day, and never below `quota_reserve`
+    requests left on the API keys. Accounts that were never crawled are
+    warmed up at any hour, within the same budget.
+
+    With a FreshnessPolicy, a refresh is an incremental crawl unless the
+    policy asks for a full one (no full crawl for a day, many unfollows).
+    Crawls go through the FollowerCrawler, so a refresh and a user's crawl
+    of the same account are one crawl, and page requests share the crawl
+    scheduler with interactive ones.
+    """
+
+    def __init__(self, instagram_api: InstagramAPI, database: FollowersDatabase, crawler: FollowerCrawler,
+                 check_interval: float = 600, max_age: float = 6 * 3600, hours: Tuple[int, int] = (1, 7),
+                 daily_pages: int = 2000, quota_reserve: int = 500, policy: Optional[FreshnessPolicy] = None,
+                 clock: Callable[[], float] = time.time):
+        self.instagram_api = instagram_api
+        self.database = database
+        self.crawler = crawler
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.hours = hours
+        self.daily_pages = daily_pages
+        self.quota_reserve = quota_reserve
+        self.policy = policy
+        # Wall clock, replaceable in tests
+        self.clock = clock
+
+        self.pages_used = 0
+        self.refreshed = 0
+        self.skipped = 0
+        self._budget_day: Optional[Tuple[int, int]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Stop checking; a refresh crawl in progress is stopped by crawler.shutdown()"""
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Snapshot refresh failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.check_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def in_window(self, now: Optional[float] = None) -> bool:
+        """Whether `now` falls into the off-peak hours"""
+        return in_hours(self.hours, self.clock() if now is None else now)
+
+    def budget_left(self, now: Optional[float] = None) -> int:
+        """Page requests left for refreshes today"""
+        local = time.localtime(self.clock() if now is None else now)
+        day = (local.tm_year, local.tm_yday)
+        if day != self._budget_day:
+            self._budget_day = day
+            self.pages_used = 0
+        return max(0, self.daily_pages - self.pages_used)
+
+    def _has_spare_quota(self, pages: int) -> bool:
+        key_pool = getattr(self.instagram_api, "key_pool", None)
+        remaining = key_pool.remaining_quota() if key_pool is not None else None
+        # Not reported yet: only the daily budget applies
+        return remaining is None or remaining - pages >= self.quota_reserve
+
+    def _estimate_pages(self, user_info: Dict[str, Any], stored: Optional[Dict[str, Any]], incremental: bool) -> int:
+        followers = user_info.get('followers_count') or 0
+        if incremental:
+            # New followers plus the page that finds nothing new
+            followers = max(0, followers - (stored.get('followers_count') or 0))
+        return -(-followers // self.crawler.page_size) + 1
+
+    async def due_accounts(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Tracked accounts to refresh now, stalest first"""
+        now = self.clock() if now is None else now
+        off_peak = self.in_window(now)
+        due = []
+        for account in await self.database.get_tracked_accounts():
+            if self.crawler.is_crawling(account['username']):
+                continue
+            synced_at = account['synced_at']
+            if synced_at is None or (off_peak and now - synced_at >= self.max_age):
+                due.append(account)
+        due.sort(key=lambda account: account['synced_at'] or 0)
+        return due
+
+    async def run_once(self) -> List[CrawlResult]:
+        """Refresh the accounts that are due, as far as the budget allows"""
+        results = []
+        for account in await self.due_accounts():
+            if self._stopping.is_set():
+                break
+            username = account['username']
+            # Follower count for the estimate; usually served by the profile cache
+            user_info = await self.instagram_api.get_user_info(username)
+            if not user_info:
+                continue
+
+            stored = await self.database.get_account_info(username)
+            incremental = self.policy is not None and self.policy.decide(stored, user_info) != FULL
+            pages = self._estimate_pages(user_info, stored, incremental)
+            if pages > self.budget_left() or not self._has_spare_quota(pages):
+                print(f"Skipping refresh of {username}: ~{pages} pages over the spare quota")
+                self.skipped += 1
+                continue
+
+            result = await self.crawler.crawl(user_info, incremental=incremental)
+            # A resumed crawl also counts its checkpointed pages, erring on the safe side
+            self.pages_used += result.pages
+            if not result.error and not result.stopped:
+                self.refreshed += 1
+            results.append(result)
+        return results
+
+    def get_stats(self) -> dict:
+        return {
+            "refreshed": self.refreshed,
+            "skipped": self.skipped,
+            "pages_used": self.pages_used,
+            "budget_left": self.budget_left(),
+            "off_peak": self.in_window(),
+        }
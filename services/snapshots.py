@@ -0,0 +1,117 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from services.database import FollowersDatabase
+from services.records import FollowerRecord
+
+
+class Snapshot:
+    """Immutable follower list of an account at one snapshot version"""
+
+    __slots__ = ('account', 'version', 'followers')
+
+    def __init__(self, account: str, version: int, followers: List[FollowerRecord]):
+        self.account = account
+        self.version = version
+        self.followers = followers
+
+    def __len__(self) -> int:
+        return len(self.followers)
+
+    def handle(self) -> Dict[str, Any]:
+        """Small reference to keep in FSM state instead of the list itself"""
+        return {'account': self.account, 'version': self.version}
+
+
+class SnapshotStore:
+    """
+    Shared in-process cache of follower snapshots.
+
+    FSM state only keeps a handle (account, version); every user looking at
+    the same account shares one list. Snapshots are loaded from the database
+    on demand, concurrent loads of one account share a single read and the
+    least recently used snapshots are dropped beyond `max_snapshots`.
+    """
+
+    def __init__(self, database: FollowersDatabase, max_snapshots: int = 8):
+        self.database = database
+        self.max_snapshots = max_snapshots
+        self._snapshots: "OrderedDict[tuple[str, int], Snapshot]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    async def get(self, account: str, version: Optional[int] = None) -> Optional[Snapshot]:
+        """
+        Get a follower snapshot
+
+        Args:
+            account: Instagram username
+            version: Snapshot version from a handle, None for the current one.
+                A version that is no longer available falls back to the current one.
+
+        Returns:
+            Snapshot or None if the account is not stored
+        """
+        if version is not None:
+            snapshot = self._snapshots.get((account, version))
+            if snapshot is not None:
+                self._snapshots.move_to_end((account, version))
+                return snapshot
+
+        current = await self.database.get_snapshot_version(account)
+        if current is None:
+            return None
+
+        snapshot = self._snapshots.get((account, current))
+        if snapshot is not None:
+            self._snapshots.move_to_end((account, current))
+            return snapshot
+
+        return await self._load(account)
+
+    def peek(self, account: str, version: int) -> Optional[Snapshot]:
+        """Get a snapshot only if it is already in memory"""
+        return self._snapshots.get((account, version))
+
+    async def get_by_handle(self, handle: Optional[Dict[str, Any]]) -> Optional[Snapshot]:
+        """Resolve a handle stored in FSM state"""
+        if not handle:
+            return None
+        return await self.get(handle['account'], handle.get('version'))
+
+    def invalidate(self, account: str):
+        for key in [key for key in self._snapshots if key[0] == account]:
+            del self._snapshots[key]
+
+    def _put(self, snapshot: Snapshot):
+        # Older versions of the account are not needed once a newer one is loaded
+        self.invalidate(snapshot.account)
+        self._snapshots[(snapshot.account, snapshot.version)] = snapshot
+        while len(self._snapshots) > self.max_snapshots:
+            self._snapshots.popitem(last=False)
+
+    async def _load(self, account: str) -> Optional[Snapshot]:
+        # Single-flight: concurrent loads of one account share a future
+        future = self._loading.get(account)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[account] = future
+        try:
+            row = await self.database.get_snapshot(account)
+            snapshot = Snapshot(account, row[0], row[1]) if row else None
+            if snapshot is not None:
+                self._put(snapshot)
+            future.set_result(snapshot)
+            return snapshot
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so that an unawaited future does not log a warning
+            future.exception()
+            raise
+        finally:
+            del self._loading[account]
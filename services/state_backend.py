@@ -0,0 +1,247 @@
+import secrets
+from abc import ABC, abstractmethod
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+
+try:
+    from redis.asyncio import Redis
+except ImportError:  # optional, only needed with REDIS_URL
+    Redis = None
+
+
+class StateBackend(ABC):
+    """
+    State shared by every bot worker: FSM storage, throttling buckets and
+    crawl locks.
+
+    MemoryStateBackend keeps everything in the process (one worker, tests),
+    RedisStateBackend keeps it in Redis so that N workers serve the same bot
+    with the same per-user state and one crawl per account.
+    """
+
+    @abstractmethod
+    def fsm_storage(self) -> BaseStorage:
+        """aiogram FSM storage shared by the workers"""
+
+    @abstractmethod
+    async def take_tokens(self, key: str, cost: float, burst: int, interval: float) -> Tuple[bool, bool]:
+        """
+        Take tokens from a token bucket refilled at one token per `interval` seconds
+
+        Returns:
+            Tuple of (allowed, first rejection since the last allowed take)
+        """
+
+    @abstractmethod
+    async def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        """
+        Take an expiring lock
+
+        Returns:
+            Lock token to refresh and release it with, None if it is held elsewhere
+        """
+
+    @abstractmethod
+    async def refresh_lock(self, name: str, token: str, ttl: float) -> bool:
+        """Extend a held lock, False if it expired and was taken by someone else"""
+
+    @abstractmethod
+    async def release_lock(self, name: str, token: str):
+        """Release a held lock, a lock taken by someone else is left alone"""
+
+    async def claim_once(self, name: str, ttl: float) -> bool:
+        """True the first time `name` is claimed within `ttl` seconds (de-duplication)"""
+        return await self.acquire_lock(name, ttl) is not None
+
+    async def close(self):
+        pass
+
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated', 'warned')
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+        self.warned = False
+
+
+class MemoryStateBackend(StateBackend):
+    """
+    In-process backend. Buckets live in a TTL-LRU: a bucket idle long enough
+    to be full again is the same as no bucket and is dropped, and at most
+    `max_buckets` are kept.
+    """
+
+    def __init__(self, max_buckets: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.max_buckets = max_buckets
+        # Monotonic clock, replaceable in tests
+        self.clock = clock
+        self.buckets: "OrderedDict[str, Tuple[TokenBucket, float]]" = OrderedDict()
+        self.locks: Dict[str, Tuple[str, float]] = {}
+        self._sweep_locks_at = 1024
+
+    def fsm_storage(self) -> BaseStorage:
+        return MemoryStorage()
+
+    def _evict(self, now: float):
+        while self.buckets:
+            key, (bucket, idle_ttl) = next(iter(self.buckets.items()))
+            if now - bucket.updated < idle_ttl and len(self.buckets) <= self.max_buckets:
+                break
+            del self.buckets[key]
+
+    async def take_tokens(self, key: str, cost: float, burst: int, interval: float) -> Tuple[bool, bool]:
+        now = self.clock()
+        entry = self.buckets.get(key)
+        if entry is None:
+            bucket = TokenBucket(float(burst), now)
+            self.buckets[key] = (bucket, burst * interval)
+        else:
+            bucket = entry[0]
+            bucket.tokens = min(float(burst), bucket.tokens + (now - bucket.updated) / interval)
+            bucket.updated = now
+            self.buckets.move_to_end(key)
+        self._evict(now)
+
+        if bucket.tokens >= cost:
+            bucket.tokens -= cost
+            bucket.warned = False
+            return True, False
+        first_rejection = not bucket.warned
+        bucket.warned = True
+        return False, first_rejection
+
+    def _sweep_locks(self, now: float):
+        # Expired locks (and de-duplication claims) are dropped once the dict doubles
+        if len(self.locks) < self._sweep_locks_at:
+            return
+        for name in [name for name, (_, expires) in self.locks.items() if expires <= now]:
+            del self.locks[name]
+        self._sweep_locks_at = max(1024, 2 * len(self.locks))
+
+    async def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        now = self.clock()
+        self._sweep_locks(now)
+        held = self.locks.get(name)
+        if held is not None and held[1] > now:
+            return None
+        token = secrets.token_hex(8)
+        self.locks[name] = (token, now + ttl)
+        return token
+
+    async def refresh_lock(self, name: str, token: str, ttl: float) -> bool:
+        held = self.locks.get(name)
+        if held is None or held[0] != token:
+            return False
+        self.locks[name] = (token, self.clock() + ttl)
+        return True
+
+    async def release_lock(self, name: str, token: str):
+        held = self.locks.get(name)
+        if held is not None and held[0] == token:
+            del self.locks[name]
+
+
+# KEYS[1] bucket; ARGV: burst, interval, cost. Uses the Redis clock, so
+# workers with skewed clocks still share one bucket correctly.
+TAKE_TOKENS_SCRIPT = """
+local burst = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated', 'warned')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+local warned = tonumber(state[3]) or 0
+tokens = math.min(burst, tokens + (now - updated) / interval)
+
+local allowed = 0
+local first_rejection = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+    warned = 0
+elseif warned == 0 then
+    first_rejection = 1
+    warned = 1
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now), 'warned', warned)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * interval * 1000))
+return {allowed, first_rejection}
+"""
+
+REFRESH_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisStateBackend(StateBackend):
+    """
+    Redis backend. Buckets are hashes updated by a Lua script and expire once
+    they would be full again; locks are SET NX PX keys released and refreshed
+    only by the token that took them.
+    """
+
+    def __init__(self, url: Optional[str] = None, prefix: str = "followers_bot", client: Optional["Redis"] = None):
+        if client is None:
+            if Redis is None:
+                raise RuntimeError("REDIS_URL is set but the redis package is not installed (pip install redis)")
+            client = Redis.from_url(url, decode_responses=True)
+        # A client passed in (e.g. fakeredis in tests) must decode responses
+        self.redis = client
+        self.prefix = prefix
+        self._take_tokens = self.redis.register_script(TAKE_TOKENS_SCRIPT)
+        self._refresh_lock = self.redis.register_script(REFRESH_LOCK_SCRIPT)
+        self._release_lock = self.redis.register_script(RELEASE_LOCK_SCRIPT)
+
+    def _key(self, name: str) -> str:
+        return f"{self.prefix}:{name}"
+
+    def fsm_storage(self) -> BaseStorage:
+        from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisStorage
+
+        return RedisStorage(self.redis, key_builder=DefaultKeyBuilder(prefix=f"{self.prefix}:fsm"))
+
+    async def take_tokens(self, key: str, cost: float, burst: int, interval: float) -> Tuple[bool, bool]:
+        allowed, first_rejection = await self._take_tokens(keys=[self._key(key)], args=[burst, interval, cost])
+        return bool(allowed), bool(first_rejection)
+
+    async def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        token = secrets.token_hex(8)
+        if await self.redis.set(self._key(name), token, nx=True, px=int(ttl * 1000)):
+            return token
+        return None
+
+    async def refresh_lock(self, name: str, token: str, ttl: float) -> bool:
+        return bool(await self._refresh_lock(keys=[self._key(name)], args=[token, int(ttl * 1000)]))
+
+    async def release_lock(self, name: str, token: str):
+        await self._release_lock(keys=[self._key(name)], args=[token])
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def create_state_backend(redis_url: Optional[str] = None) -> StateBackend:
+    """Redis backend when a URL is configured, in-process backend otherwise"""
+    if redis_url:
+        return RedisStateBackend(redis_url)
+    return MemoryStateBackend()
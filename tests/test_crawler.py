@@ -0,0 +1,88 @@
+import asyncio
+import os
+import tempfile
+
+from services.crawler import CrawlFlight, FollowerCrawler
+from services.database import FollowersDatabase
+from services.instagram_api import InstagramAPI
+from services.records import FollowerRecord
+
+
+class StubAPI(InstagramAPI):
+    """Pages of 50 followers, ids 1..followers"""
+
+    def __init__(self, followers: int):
+        super().__init__("test", "localhost")
+        self.followers = followers
+
+    async def get_user_followers_batch(self, username_or_id: str, count: int = 100, pagination_token: str = None):
+        start = int(pagination_token or 0)
+        end = min(start + 50, self.followers)
+        next_token = str(end) if end < self.followers else None
+        followers = [
+            FollowerRecord.from_api({"id": str(user_id), "username": f"user{user_id}"})
+            for user_id in range(start + 1, end + 1)
+        ]
+        return {"followers": followers, "next_max_id": next_token, "has_more": bool(next_token), "count": len(followers)}
+
+
+class FlakyDatabase(FollowersDatabase):
+    """Fails the first save of one page"""
+
+    def __init__(self, path: str, fail_page: int):
+        super().__init__(path)
+        self.fail_page = fail_page
+
+    async def save_crawl_page(self, user_info, followers, pagination_token, pages_done, rows_saved):
+        if pages_done == self.fail_page:
+            self.fail_page = None
+            raise RuntimeError("database is locked")
+        return await super().save_crawl_page(user_info, followers, pagination_token, pages_done, rows_saved)
+
+
+async def crawl_with_failing_save(directory: str):
+    database = FlakyDatabase(os.path.join(directory, "crawl.db"), fail_page=3)
+    await database.start()
+    try:
+        user_info = {"username": "account", "followers_count": 500}
+        crawler = FollowerCrawler(StubAPI(500), database, error_delay=0)
+        first = await crawler.crawl(user_info)
+        first_followers = await database.get_followers("account")
+        second = await crawler.crawl(user_info)
+        second_followers = await database.get_followers("account")
+        return first, first_followers, second, second_followers, await database.get_account_info("account")
+    finally:
+        await database.close()
+
+
+def test_failed_save_is_retried_not_skipped():
+    with tempfile.TemporaryDirectory() as directory:
+        first, first_followers, second, second_followers, stored = asyncio.run(crawl_with_failing_save(directory))
+
+    assert first.error is None
+    assert first.fetched == 500 and first.pages == 10
+    assert len(first_followers) == 500
+    # The re-crawl finds the same followers, nobody is tombstoned
+    assert second.fetched == 500
+    assert len(second_followers) == 500
+    assert stored['full_synced_at'] is not None
+
+
+def test_late_subscriber_gets_current_progress():
+    async def check():
+        flight = CrawlFlight("account")
+        await flight.publish(100, 500, 2)
+        seen = []
+
+        async def callback(*progress):
+            seen.append(progress)
+
+        await flight.subscribe(callback)
+        # Delivered before subscribe() returns, not by a task that may never run
+        assert seen == [(100, 500, 2)]
+        await flight.publish(150, 500, 3)
+        flight.unsubscribe(callback)
+        await flight.publish(200, 500, 4)
+        return seen
+
+    assert asyncio.run(check()) == [(100, 500, 2), (150, 500, 3)]
@@ -0,0 +1,105 @@
+import asyncio
+import random
+import sqlite3
+import os
+import tempfile
+from contextlib import closing
+
+from services.crawler import FollowerCrawler
+from services.database import FollowersDatabase
+from services.draw import DrawEngine, ReservoirSampler
+from services.records import FollowerRecord
+from services.snapshots import SnapshotStore
+
+from tests.test_crawler import StubAPI
+
+SEEDS = [1, 7, 42, 2 ** 40 + 3, 123456789]
+
+
+def make_users(ids):
+    return [FollowerRecord.from_api({"id": str(user_id), "username": f"user{user_id}"}) for user_id in ids]
+
+
+async def open_database(directory: str) -> FollowersDatabase:
+    database = FollowersDatabase(os.path.join(directory, "draw.db"))
+    await database.start()
+    return database
+
+
+async def draws_on_every_path(directory: str):
+    database = await open_database(directory)
+    try:
+        user_info = {"username": "account", "followers_count": 100}
+        await database.save_crawl_page(user_info, make_users(range(1, 101)), None, 1, 100)
+        await database.finish_crawl("account", complete=True)
+        engine = DrawEngine(database, SnapshotStore(database))
+
+        results = {}
+        for tombstoned in (False, True):
+            if tombstoned:
+                # Every third follower left: positions are no longer dense, the database steps over the index
+                kept = [user_id for user_id in range(1, 101) if user_id % 3]
+                await database.save_crawl_page(user_info, make_users(kept), None, 1, len(kept))
+                await database.finish_crawl("account", complete=True)
+            snapshot = await engine.snapshots.get("account")
+            for seed in SEEDS:
+                in_memory = await engine.draw("account", snapshot.handle(), seed)
+                engine.snapshots.invalidate("account")
+                from_database = await engine.draw("account", snapshot.handle(), seed)
+                snapshot = await engine.snapshots.get("account")
+                results[(tombstoned, seed)] = (in_memory, from_database)
+        return results
+    finally:
+        await database.close()
+
+
+def test_snapshot_and_database_draws_agree():
+    with tempfile.TemporaryDirectory() as directory:
+        results = asyncio.run(draws_on_every_path(directory))
+    for (tombstoned, seed), (in_memory, from_database) in results.items():
+        assert in_memory.total == from_database.total == (67 if tombstoned else 100)
+        assert in_memory.ordinal == from_database.ordinal == DrawEngine.replay_ordinal(seed, in_memory.total)
+        assert in_memory.winner.id == from_database.winner.id
+
+
+async def stream_draws(directory: str):
+    database = await open_database(directory)
+    try:
+        # 500 followers, but a crawl keeps at most 2 pages of 50
+        crawler = FollowerCrawler(StubAPI(500), database, max_pages=2)
+        engine = DrawEngine(database, SnapshotStore(database), crawler)
+        user_info = {"username": "account", "followers_count": 500}
+        await crawler.crawl(user_info)
+        snapshot = await engine.snapshots.get("account")
+
+        draw = await engine.draw_account(user_info, snapshot.handle())
+        replay = await engine.draw_account(user_info, snapshot.handle(), draw.seed)
+        with closing(sqlite3.connect(database.path)) as conn:
+            recorded = conn.execute("SELECT seed, method, total, ordinal, user_id FROM draws ORDER BY id").fetchall()
+        return engine.needs_stream(user_info, snapshot.handle()), draw, replay, recorded
+    finally:
+        await database.close()
+
+
+def test_large_account_is_drawn_from_a_stream_and_replays():
+    with tempfile.TemporaryDirectory() as directory:
+        streamed, draw, replay, recorded = asyncio.run(stream_draws(directory))
+    assert streamed
+    assert draw.method == 'stream' and draw.total == 500
+    assert (replay.ordinal, replay.winner.id) == (draw.ordinal, draw.winner.id)
+    assert int(draw.winner.id) == draw.ordinal
+    assert recorded == [(draw.seed, 'stream', 500, draw.ordinal, int(draw.winner.id))] * 2
+
+
+def test_reservoir_is_uniform_and_page_independent():
+    counts = [0] * 10
+    for seed in range(3000):
+        one_by_one = ReservoirSampler(1, random.Random(seed))
+        for item in range(10):
+            one_by_one.add(item)
+        by_page = ReservoirSampler(1, random.Random(seed))
+        by_page.extend(list(range(4)))
+        by_page.extend(list(range(4, 10)))
+        assert by_page.items == one_by_one.items and by_page.ordinals == one_by_one.ordinals
+        counts[one_by_one.items[0]] += 1
+    assert min(counts) > 220 and max(counts) < 380
@@ -0,0 +1,47 @@
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+
+from openpyxl import load_workbook
+
+from services.database import FollowersDatabase
+from services.export import ExportEngine, write_followers_xlsx
+from services.records import FollowerRecord, PROFILE_URL_PREFIX
+
+
+async def export_jsonl(directory: str):
+    db_path = os.path.join(directory, "followers?v=1#main.db")
+    database = FollowersDatabase(db_path)
+    await database.start()
+    engine = ExportEngine(db_path, directory=directory)
+    try:
+        followers = [FollowerRecord.from_api({"id": str(i), "username": f"user{i}"}) for i in range(1, 11)]
+        await database.save_followers({"username": "account", "followers_count": 10}, followers)
+        path, count, version = await engine.export("account", "jsonl")
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            rows = [json.loads(line) for line in file]
+        return count, version, rows
+    finally:
+        engine.close()
+        await database.close()
+
+
+def test_export_from_database_path_with_uri_characters():
+    with tempfile.TemporaryDirectory() as directory:
+        count, version, rows = asyncio.run(export_jsonl(directory))
+    assert count == 10 and version is not None
+    assert {row["username"] for row in rows} == {f"user{i}" for i in range(1, 11)}
+
+
+def test_xlsx_columns_fit_a_long_username_late_in_the_list():
+    rows = [(user_id, f"u{user_id}") for user_id in range(1, 3000)] + [(2 ** 62, "x" * 30)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "followers.xlsx")
+        assert write_followers_xlsx(iter(rows), path) == 3000
+        sheet = load_workbook(path).active
+        widths = {column: sheet.column_dimensions[column].width for column in "ABCD"}
+        last = [cell.value for cell in sheet[3001]]
+    assert last == [3000, "x" * 30, PROFILE_URL_PREFIX + "x" * 30, 2 ** 62]
+    assert all(widths[column] > len(str(value)) for column, value in zip("ABCD", last))
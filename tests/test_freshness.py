@@ -0,0 +1,72 @@
+import asyncio
+import os
+import tempfile
+
+from services.crawler import FollowerCrawler
+from services.database import FollowersDatabase
+from services.freshness import FULL, INCREMENTAL, SERVE, FreshnessPolicy
+
+from tests.test_crawler import StubAPI
+
+NOW = 1_700_000_000
+
+
+def make_policy():
+    # Same allowed age in and out of peak hours, the local time zone does not matter
+    return FreshnessPolicy(max_age=3600, peak_max_age=3600, full_max_age=24 * 3600, drift_abs=500, drift_ratio=0.05)
+
+
+def stored(followers_count=10_000, synced_ago=60, full_synced_ago=60):
+    return {
+        'followers_count': followers_count,
+        'synced_at': NOW - synced_ago,
+        'full_synced_at': None if full_synced_ago is None else NOW - full_synced_ago,
+    }
+
+
+def test_fresh_snapshot_is_served():
+    assert make_policy().decide(stored(), {'followers_count': 10_010}, now=NOW) == SERVE
+
+
+def test_stale_or_grown_snapshot_is_refreshed_incrementally():
+    policy = make_policy()
+    assert policy.decide(stored(synced_ago=2 * 3600), {'followers_count': 10_000}, now=NOW) == INCREMENTAL
+    assert policy.decide(stored(), {'followers_count': 10_600}, now=NOW) == INCREMENTAL
+
+
+def test_full_crawl_when_no_full_sync_or_followers_left():
+    policy = make_policy()
+    assert policy.decide(None, {'followers_count': 10}, now=NOW) == FULL
+    assert policy.decide(stored(), {'followers_count': 10_000}, has_snapshot=False, now=NOW) == FULL
+    assert policy.decide(stored(full_synced_ago=None), {'followers_count': 10_000}, now=NOW) == FULL
+    assert policy.decide(stored(full_synced_ago=2 * 24 * 3600), {'followers_count': 10_000}, now=NOW) == FULL
+    assert policy.decide(stored(), {'followers_count': 9_000}, now=NOW) == FULL
+
+
+async def crawl_and_decide(directory: str, followers: int, max_pages: int):
+    database = FollowersDatabase(os.path.join(directory, "freshness.db"))
+    await database.start()
+    try:
+        user_info = {"username": "account", "followers_count": followers}
+        crawler = FollowerCrawler(StubAPI(500), database, max_pages=max_pages)
+        result = await crawler.crawl(user_info)
+        account = await database.get_account_info("account")
+        return result, account, make_policy().decide(account, user_info, now=account['synced_at'])
+    finally:
+        await database.close()
+
+
+def test_only_a_crawl_to_the_end_of_the_list_is_a_full_sync():
+    with tempfile.TemporaryDirectory() as directory:
+        result, account, decision = asyncio.run(crawl_and_decide(directory, 500, 2000))
+    assert result.complete and account['full_synced_at'] is not None
+    assert decision == SERVE
+
+    # Stopped at the page limit, or at a follower count lower than the list:
+    # nobody was tombstoned, the snapshot still needs a full crawl
+    for followers, max_pages in ((500, 2), (200, 2000)):
+        with tempfile.TemporaryDirectory() as directory:
+            result, account, decision = asyncio.run(crawl_and_decide(directory, followers, max_pages))
+        assert not result.complete and result.error is None
+        assert account['full_synced_at'] is None
+        assert decision == FULL
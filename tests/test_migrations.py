@@ -0,0 +1,19 @@
+import sqlite3
+
+from services.migrations import SCHEMA_VERSION, _migrate_v1, migrate
+
+
+def test_v2_keeps_only_all_digit_ids():
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    _migrate_v1(conn)
+    conn.execute("PRAGMA user_version = 1")
+    conn.execute("INSERT INTO accounts (username, followers_count) VALUES ('account', 4)")
+    conn.executemany(
+        "INSERT INTO followers (id, username, link, account_username) VALUES (?, ?, '', 'account')",
+        [("101", "kept"), ("12abc", "prefix"), ("", "empty"), ("102", "kept_too")]
+    )
+
+    assert migrate(conn) == SCHEMA_VERSION
+    assert conn.execute("SELECT id, username FROM users ORDER BY id").fetchall() == [(101, "kept"), (102, "kept_too")]
+    assert conn.execute("SELECT user_id FROM followers ORDER BY user_id").fetchall() == [(101,), (102,)]
+    conn.close()
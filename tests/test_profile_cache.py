@@ -0,0 +1,78 @@
+import asyncio
+
+from services.profile_cache import ProfileCache
+
+from tests.test_rate_limiter import FakeClock
+
+
+class Loader:
+    """Counts loads; every load waits for `release` so that overlapping calls can be checked"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self, username: str):
+        self.calls += 1
+        await self.release.wait()
+        return {"username": username, "followers_count": self.calls}
+
+
+def test_stale_entry_is_served_while_one_refresh_runs():
+    async def check():
+        clock = FakeClock()
+        cache = ProfileCache(ttl=300, stale_ttl=3600, clock=clock)
+        loader = Loader()
+        loader.release.set()
+        assert (await cache.get("Account", loader))["followers_count"] == 1
+
+        clock.advance(600)
+        loader.release.clear()
+        # Stale: served at once, however many callers, with a single refresh behind them
+        profiles = [await cache.get("account", loader) for _ in range(5)]
+        assert [profile["followers_count"] for profile in profiles] == [1] * 5
+        await asyncio.sleep(0)
+        assert loader.calls == 2 and cache.refreshes == 1
+
+        loader.release.set()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert (await cache.get("account", loader))["followers_count"] == 2
+        assert cache.get_stats()["stale_hits"] == 5
+
+        # Past stale_ttl the entry is not served any more
+        clock.advance(3601)
+        assert (await cache.get("account", loader))["followers_count"] == 3
+
+    asyncio.run(check())
+
+
+def test_concurrent_misses_share_one_load():
+    async def check():
+        cache = ProfileCache(clock=FakeClock())
+        loader = Loader()
+        tasks = [asyncio.create_task(cache.get("account", loader)) for _ in range(5)]
+        await asyncio.sleep(0)
+        loader.release.set()
+        profiles = await asyncio.gather(*tasks)
+        assert loader.calls == 1
+        assert all(profile is profiles[0] for profile in profiles)
+
+    asyncio.run(check())
+
+
+def test_least_recently_used_entry_is_evicted():
+    async def check():
+        cache = ProfileCache(max_size=2, clock=FakeClock())
+        loader = Loader()
+        loader.release.set()
+        for username in ("a", "b", "a", "c"):
+            await cache.get(username, loader)
+        assert loader.calls == 3 and cache.get_stats()["size"] == 2
+        # "a" was read again before "c" came in, "b" was used least recently
+        await cache.get("a", loader)
+        assert loader.calls == 3
+        await cache.get("b", loader)
+        assert loader.calls == 4
+
+    asyncio.run(check())
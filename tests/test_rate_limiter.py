@@ -0,0 +1,122 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from services.rate_limiter import (
+    AdaptiveRateLimiter, ApiKey, KeyPool, QuotaExhaustedError, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+)
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def test_429_with_retry_after_pauses_the_bucket():
+    async def check():
+        clock = FakeClock()
+        limiter = AdaptiveRateLimiter(rate=2, burst=2, max_wait=10, clock=clock)
+        limiter.observe(429, {"retry-after": "30"})
+        assert limiter.rate == 1
+        assert limiter.paused_for() == 30
+        # Longer than max_wait: fail fast instead of queueing
+        with pytest.raises(QuotaExhaustedError):
+            await limiter.acquire()
+
+        clock.advance(31)
+        assert limiter.paused_for() == 0
+        await asyncio.wait_for(limiter.acquire(), timeout=1)
+
+    asyncio.run(check())
+
+
+def test_quota_headers_pause_until_the_reset():
+    clock = FakeClock()
+    limiter = AdaptiveRateLimiter(clock=clock)
+    limiter.observe(200, {"x-ratelimit-requests-remaining": "5", "x-ratelimit-requests-reset": "100"})
+    assert limiter.remaining_quota == 5 and limiter.paused_for() == 0
+    limiter.observe(200, {"x-ratelimit-requests-remaining": "0", "x-ratelimit-requests-reset": "100"})
+    assert limiter.paused_for() == 100
+
+
+def test_rate_is_aimd():
+    limiter = AdaptiveRateLimiter(rate=2, min_rate=0.5, max_rate=2.2, increase_step=0.1, clock=FakeClock())
+    for _ in range(5):
+        limiter.observe(200, {})
+    assert limiter.rate == pytest.approx(2.2)
+    for _ in range(5):
+        limiter.observe(429, {})
+    assert limiter.rate == 0.5 and limiter.throttled_count == 5
+
+
+def test_interactive_requests_overtake_queued_background_ones():
+    async def check():
+        # Real clock: the dispatcher sleeps until the next token
+        limiter = AdaptiveRateLimiter(rate=50, burst=1)
+        await limiter.acquire()
+        order = []
+
+        async def request(name, priority):
+            await limiter.acquire(priority)
+            order.append(name)
+
+        tasks = [asyncio.create_task(request(f"page{i}", PRIORITY_BACKGROUND)) for i in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("profile", PRIORITY_INTERACTIVE)))
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(check()) == ["profile", "page0", "page1", "page2"]
+
+
+def make_pool(clock, *keys):
+    return KeyPool([
+        ApiKey(name, AdaptiveRateLimiter(rate=rate, burst=10_000, clock=clock), weight)
+        for name, weight, rate in keys
+    ], clock=clock)
+
+
+def take(pool: KeyPool, count: int) -> Counter:
+    async def run():
+        return Counter([(await pool.acquire()).key for _ in range(count)])
+
+    return asyncio.run(run())
+
+
+def test_weighted_round_robin_splits_by_weight_times_rate():
+    clock = FakeClock()
+    pool = make_pool(clock, ("a", 1, 2), ("b", 3, 2), ("c", 1, 4))
+    # Shares 2 : 6 : 4
+    assert take(pool, 1200) == {"a": 200, "b": 600, "c": 400}
+
+
+def test_quarantined_key_is_skipped_until_it_is_back():
+    clock = FakeClock()
+    pool = make_pool(clock, ("a", 1, 2), ("b", 1, 2), ("c", 1, 2))
+    # Quota used up without a reset time, and a long Retry-After
+    pool.observe(pool.keys[0], 200, {"x-ratelimit-requests-remaining": "0"})
+    pool.observe(pool.keys[1], 429, {"retry-after": "120"})
+    assert take(pool, 10) == {"c": 10}
+    assert pool.remaining_quota() is None
+
+    clock.advance(pool.quarantine_time + 1)
+    assert set(take(pool, 30)) == {"a", "b", "c"}
+
+
+def test_every_key_quarantined_fails_fast():
+    async def check():
+        clock = FakeClock()
+        pool = KeyPool([ApiKey(name, AdaptiveRateLimiter(max_wait=60, clock=clock)) for name in "ab"], clock=clock)
+        for key in pool.keys:
+            pool.observe(key, 429, {"retry-after": "600"})
+        with pytest.raises(QuotaExhaustedError):
+            await pool.acquire()
+
+    asyncio.run(check())
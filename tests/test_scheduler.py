@@ -0,0 +1,46 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+from services.crawler import FollowerCrawler
+from services.database import FollowersDatabase
+from services.scheduler import CrawlScheduler
+
+from tests.test_crawler import StubAPI
+
+
+def test_load_weights_replaces_and_reset_restores_default():
+    scheduler = CrawlScheduler()
+    scheduler.set_weight("old", 5)
+    scheduler.load_weights({"big": 3, "small": 0.5})
+    assert scheduler.get_weight("old") == 1.0
+    assert scheduler.get_weight("big") == 3
+    scheduler.reset_weight("big")
+    assert scheduler.get_weight("big") == 1.0
+    with pytest.raises(ValueError):
+        scheduler.load_weights({"bad": 0})
+
+
+async def crawl_with_tracked_weights(directory: str):
+    database = FollowersDatabase(os.path.join(directory, "weights.db"))
+    await database.start()
+    try:
+        # Another worker tracked and untracked accounts, this one never saw the commands
+        await database.track_account("big", 3)
+        await database.track_account("gone", 2)
+        await database.untrack_account("gone")
+        crawler = FollowerCrawler(StubAPI(100), database)
+        crawler.scheduler.set_weight("gone", 2)
+        await crawler.crawl({"username": "small", "followers_count": 100})
+        return crawler.scheduler
+    finally:
+        await database.close()
+
+
+def test_crawl_takes_weights_from_tracked_accounts():
+    with tempfile.TemporaryDirectory() as directory:
+        scheduler = asyncio.run(crawl_with_tracked_weights(directory))
+    assert scheduler.get_weight("big") == 3
+    assert scheduler.get_weight("gone") == 1.0
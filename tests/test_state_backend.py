@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from services.state_backend import MemoryStateBackend, RedisStateBackend, StateBackend
+
+
+def test_state_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StateBackend()
+
+
+async def check_locks(backend: StateBackend):
+    token = await backend.acquire_lock("crawl:account", ttl=60)
+    assert token is not None
+    assert await backend.acquire_lock("crawl:account", ttl=60) is None
+    assert await backend.refresh_lock("crawl:account", token, ttl=60)
+    assert not await backend.refresh_lock("crawl:account", "other", ttl=60)
+
+    # Only the holder releases the lock
+    await backend.release_lock("crawl:account", "other")
+    assert await backend.acquire_lock("crawl:account", ttl=60) is None
+    await backend.release_lock("crawl:account", token)
+    assert not await backend.refresh_lock("crawl:account", token, ttl=60)
+    assert await backend.acquire_lock("crawl:account", ttl=60) is not None
+
+    assert await backend.claim_once("update:1", ttl=60)
+    assert not await backend.claim_once("update:1", ttl=60)
+
+
+async def check_buckets(backend: StateBackend):
+    # Burst of 3, one token per minute: nothing refills during the test
+    assert [await backend.take_tokens("user:1", 1, 3, 60) for _ in range(3)] == [(True, False)] * 3
+    assert await backend.take_tokens("user:1", 1, 3, 60) == (False, True)
+    assert await backend.take_tokens("user:1", 1, 3, 60) == (False, False)
+    assert await backend.take_tokens("user:1", 4, 3, 60) == (False, False)
+    assert await backend.take_tokens("user:2", 3, 3, 60) == (True, False)
+
+
+async def check_backend(backend: StateBackend):
+    try:
+        await check_locks(backend)
+        await check_buckets(backend)
+    finally:
+        await backend.close()
+
+
+def test_memory_backend():
+    asyncio.run(check_backend(MemoryStateBackend()))
+
+
+def test_memory_backend_expired_lock_is_free():
+    async def check():
+        backend = MemoryStateBackend()
+        token = await backend.acquire_lock("crawl:account", ttl=0)
+        assert await backend.acquire_lock("crawl:account", ttl=60) not in (None, token)
+
+    asyncio.run(check())
+
+
+def test_memory_backend_drops_idle_buckets():
+    async def check():
+        backend = MemoryStateBackend(max_buckets=2)
+        for user_id in range(5):
+            await backend.take_tokens(f"user:{user_id}", 1, 3, 60)
+        return list(backend.buckets)
+
+    assert asyncio.run(check()) == ["user:3", "user:4"]
+
+
+def test_redis_backend_scripts():
+    fakeredis = pytest.importorskip("fakeredis")
+    # The scripts need fakeredis' Lua support
+    pytest.importorskip("lupa")
+
+    async def check():
+        await check_backend(RedisStateBackend(client=fakeredis.FakeAsyncRedis(decode_responses=True)))
+
+    asyncio.run(check())
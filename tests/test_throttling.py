@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import AnswerCallbackQuery, SendMessage
+from aiogram.types import CallbackQuery, Chat, Message, User
+
+from middlewares.throttling import THROTTLED_TEXT, ThrottlingMiddleware
+from services.state_backend import MemoryStateBackend
+
+from tests.test_rate_limiter import FakeClock
+
+
+class RecordingSession(BaseSession):
+    """Keeps the Telegram requests instead of sending them"""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests.append(method)
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+USER = User(id=1, is_bot=False, first_name="User")
+
+
+def make_message(bot: Bot) -> Message:
+    return Message(message_id=1, date=datetime.now(), chat=Chat(id=1, type="private"), from_user=USER,
+                   text="/start").as_(bot)
+
+
+def make_callback(bot: Bot) -> CallbackQuery:
+    return CallbackQuery(id="1", from_user=USER, chat_instance="1", data="select_winner").as_(bot)
+
+
+async def send(middleware: ThrottlingMiddleware, event, cost: int = 1) -> bool:
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event)
+
+    await middleware(handler, event, {"handler": SimpleNamespace(flags={"throttling_cost": cost})})
+    return bool(handled)
+
+
+def test_event_over_the_window_is_rejected_and_warned_once():
+    async def check():
+        session = RecordingSession()
+        bot = Bot("42:TEST", session=session)
+        clock = FakeClock()
+        middleware = ThrottlingMiddleware(rate_limit=2, burst=5, backend=MemoryStateBackend(clock=clock))
+        message = make_message(bot)
+
+        assert [await send(middleware, message) for _ in range(5)] == [True] * 5
+        assert not await send(middleware, message)
+        assert not await send(middleware, message)
+        warnings = [request for request in session.requests if isinstance(request, SendMessage)]
+        assert [warning.text for warning in warnings] == [THROTTLED_TEXT]
+
+        # One token back after rate_limit seconds
+        clock.advance(2)
+        assert await send(middleware, message)
+        assert not await send(middleware, message)
+        assert len([request for request in session.requests if isinstance(request, SendMessage)]) == 2
+
+    asyncio.run(check())
+
+
+def test_handler_cost_is_taken_from_its_flag():
+    async def check():
+        session = RecordingSession()
+        bot = Bot("42:TEST", session=session)
+        middleware = ThrottlingMiddleware(rate_limit=60, burst=5, backend=MemoryStateBackend(clock=FakeClock()))
+        callback = make_callback(bot)
+
+        assert await send(middleware, callback, cost=3)
+        assert not await send(middleware, callback, cost=3)
+        # A cheaper event still fits in the two tokens left
+        assert await send(middleware, callback, cost=1)
+        answers = [request for request in session.requests if isinstance(request, AnswerCallbackQuery)]
+        assert [answer.show_alert for answer in answers] == [True]
+
+        # Costs above the burst are capped, they pass with a full bucket
+        middleware = ThrottlingMiddleware(rate_limit=60, burst=5, backend=MemoryStateBackend(clock=FakeClock()))
+        assert await send(middleware, callback, cost=10)
+
+    asyncio.run(check())